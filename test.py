@@ -1,37 +1,4161 @@
+import time
+STARTUP_TIME = time.perf_counter()  # reference point for the time-to-first-frame measurement
 import tkinter as tk
 from tkinter import messagebox, ttk
 import cv2
 from PIL import Image, ImageTk
-import face_recognition
 import os
 import csv
-from datetime import datetime
+from datetime import datetime, timedelta
 import numpy as np
-import requests
 import json
 import threading
-from urllib.parse import urlencode
-import pyautogui
-import time
+import importlib.metadata
+import sys
+import contextlib
+import queue
+import socket
+import base64
+import http.client
+import sqlite3
 import tkinter.filedialog 
+import hashlib
+import pickle
+import shutil
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Heavy modules are imported on first use so the window and the camera preview come up first
+face_recognition = None  # see face_recognition_module()
+pyautogui = None  # see pyautogui_module()
+
+
+def face_recognition_module():
+    """Import face_recognition (and load the dlib models) the first time it is needed"""
+    global face_recognition
+    if face_recognition is None:
+        with METRICS.timer('import_face_recognition'):
+            import face_recognition as module
+        face_recognition = module
+    return face_recognition
+
+
+def pyautogui_module():
+    """Import pyautogui the first time something is typed, installing it if it is missing"""
+    global pyautogui
+    if pyautogui is None:
+        try:
+            import pyautogui as module
+        except ImportError:
+            print("Installing pyautogui...")
+            import subprocess
+            subprocess.check_call([sys.executable, "-m", "pip", "install", "pyautogui"])
+            import pyautogui as module
+        module.FAILSAFE = True
+        module.PAUSE = 0.1
+        pyautogui = module
+    return pyautogui
+
+
+def package_version(name):
+    """Installed version of a package without importing it"""
+    try:
+        return importlib.metadata.version(name)
+    except Exception:
+        return 'unknown'
+
+# Encodings cache settings
+ENCODING_CACHE_FILE = 'known_faces_cache.pkl'
+ENCODING_CACHE_VERSION = 1
+ENCODING_MODEL_TAG = f"face_recognition-{package_version('face_recognition')}/hog/small/jitter1"
+
+# Performance settings, overridden by performance_config.json
+DEFAULT_PERFORMANCE_SETTINGS = {
+    'enrollment_workers': 0,  # 0 = one process per CPU core
+    'gallery_index': 'exact',  # 'exact', 'ivf' for very large galleries or 'mmap' to match on the gallery store
+    'gallery_store': 'known_faces_store',  # memory-mapped gallery directory used by 'mmap', one per backend
+    'gallery_store_dtype': 'float32',  # 'float32', 'float16' or 'int8' embeddings in the gallery store
+    'gallery_store_compact_ratio': 0.25,  # rewrite the store once this fraction of its rows was deleted
+    'identity_prototypes': 0,  # match against at most N medoids per person instead of every photo, 0 = off
+    'prototype_min_cluster_fraction': 0.1,  # smaller clusters of a person's photos are dropped as outliers
+    'ivf_nlist': 0,  # 0 = about 4 * sqrt(gallery size)
+    'ivf_nprobe': 8,
+    'inference_workers': 1,
+    'adaptive_scheduler': True,  # tune scale/upsample/interval at runtime to meet the targets below
+    'target_latency_ms': 150,  # maximum time for one detection pass
+    'target_fps': 15,  # processed frames per second
+    'detection_scale': 0.5,  # fixed settings used when the adaptive scheduler is off
+    'detection_upsample': 1,
+    'detection_interval': 3,  # run the detector every N frames, tracks carry boxes in between
+    'reverify_seconds': 2.0,  # re-encode a tracked face this often to confirm its identity
+    'tracker_iou_threshold': 0.3,
+    'tracker_max_missed': 5,
+    'tracker_optical_flow': True,
+    'motion_gating': True,  # skip detection on static scenes, otherwise detect only around motion and tracks
+    'motion_threshold': 25,  # gray level change that counts as motion
+    'motion_min_area': 0.002,  # smallest motion blob as a fraction of the frame
+    'roi_padding': 0.5,  # grow motion/track boxes by this fraction of their size before detecting
+    'roi_detection_scale': 1.0,  # regions are detected at this scale instead of detection_scale
+    'motion_full_detection_seconds': 5.0,  # full-frame pass at least this often, 0 = never
+    'quality_gating': True,  # hold back tiny, blurred, badly lit or turned faces from the encoder, 0 turns a check off
+    'quality_min_face_px': 32,  # smallest face side in the pixels the encoder sees
+    'quality_min_sharpness': 50,  # Laplacian variance of the face normalized to 64x64
+    'quality_min_brightness': 40,
+    'quality_max_brightness': 220,
+    'quality_max_yaw': 0.35,  # nose offset from the eye midpoint, in eye distances
+    'quality_max_defer_seconds': 2.0,  # then encode the best crop of the track seen so far
+    'upload_tile_size': 1024,  # uploaded images larger than this are detected in tiles over an image pyramid
+    'upload_tile_overlap': 256,  # pixels shared by neighbouring tiles, larger than the biggest face per level
+    'upload_tile_upsample': -1,  # upsampling of the full-resolution tiles, -1 = the backend's default
+    'upload_workers': 0,  # worker processes for tiled uploads, 0 = one per CPU
+    'bulk_results_folder': 'bulk_results',  # one JSONL file per bulk run
+    'bulk_cache_folder': 'bulk_results_cache',  # per-file results keyed by content hash, '' = off
+    'bulk_workers': 0,  # 0 = one per CPU
+    'bulk_stride': 1,  # process every N-th video frame
+    'bulk_scale': 0.5,
+    'bulk_upsample': 1,
+    'recognition_service_url': '',  # e.g. http://127.0.0.1:9200 to run as a thin client of --serve
+    'recognition_service_timeout': 5.0,
+    'upload_service_timeout': 60.0,  # a thin client's wait for the service to recognize a whole uploaded image
+    'service_port': 9200,
+    'service_batch_window_ms': 10,  # how long the service waits to batch faces from several clients
+    'service_max_batch': 32,
+    'service_max_pending': 128,  # waiting faces before the service answers 503
+    'service_detect_workers': 0,  # concurrent detections, 0 = one per CPU
+    'service_timeout_seconds': 10,
+    'camera_sources': [0],  # webcam indices, video files or stream URLs, one preview tile each
+    'recognition_backend': 'hog',  # 'hog' or 'cnn' (dlib) or 'yunet' (OpenCV YuNet + SFace)
+    'match_tolerance': 0,  # 0 = the backend's default distance threshold
+    'yunet_model': 'face_detection_yunet_2023mar.onnx',
+    'sface_model': 'face_recognition_sface_2021dec.onnx',
+    'yunet_score_threshold': 0.6,
+    'sface_cosine_threshold': 0.363,
+    'metrics_enabled': True,  # always-on stage timings
+    'metrics_export_seconds': 10,  # how often the Prometheus text file is rewritten
+    'metrics_prometheus_file': 'metrics.prom',  # '' disables the file export
+    'metrics_http_port': 9109,  # local /metrics and /metrics.json endpoint, 0 disables it
+    'profile_seconds': 10,  # length of a profiler capture started from the UI
+    'first_frame_budget_seconds': 2.0,  # warn when the first preview frame takes longer than this
+    'watch_known_people': True,  # apply added, changed and removed gallery images without a reload
+    'watch_poll_seconds': 2.0,  # folder scan interval when watchdog (inotify) is not installed
+    'watch_reload_delay_seconds': 2.0,  # with prototypes, rebuild the gallery once changes stop for this long
+    'attendance_batch_size': 50,  # rows written per batch by the attendance writer
+    'attendance_flush_seconds': 1.0,  # maximum time a row waits before it is written
+    'attendance_rotate': 'day',  # 'day', 'size' or 'none'
+    'attendance_max_bytes': 10 * 1024 * 1024,  # size limit when rotating by size
+    'attendance_db': 'attendance.db',  # indexed SQLite copy of the attendance log
+    'cooldown_seconds': 30  # minimum time between two logs of the same person
+}
+
+
+def file_content_hash(path, files):
+    """SHA-1 of a file's content, memoized in files as path -> (size, mtime, hash)"""
+    stat = os.stat(path)
+    cached = files.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+        return cached[2]
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    content_hash = sha.hexdigest()
+    files[path] = (stat.st_size, stat.st_mtime, content_hash)
+    return content_hash
+
+
+class EncodingCache:
+    """On-disk cache of face encodings keyed by image content hash and model tag"""
+
+    def __init__(self, cache_file=ENCODING_CACHE_FILE, model_tag=ENCODING_MODEL_TAG):
+        self.cache_file = cache_file
+        self.model_tag = model_tag
+        self.files = {}      # path -> (size, mtime, content hash)
+        self.encodings = {}  # content hash -> list of encodings
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        """Load the cache file, discarding it if it was built with another model"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'rb') as f:
+                data = pickle.load(f)
+            if data.get('version') != ENCODING_CACHE_VERSION or data.get('model') != self.model_tag:
+                print("Encoding cache was built with a different model, rebuilding")
+                return
+            self.files = data.get('files', {})
+            self.encodings = data.get('encodings', {})
+        except Exception as e:
+            print(f"Error loading encoding cache: {e}")
+            self.files = {}
+            self.encodings = {}
+
+    def save(self):
+        """Write the cache atomically so a crash never leaves a half-written file"""
+        data = {
+            'version': ENCODING_CACHE_VERSION,
+            'model': self.model_tag,
+            'files': self.files,
+            'encodings': self.encodings
+        }
+        tmp_file = self.cache_file + '.tmp'
+        try:
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"Error saving encoding cache: {e}")
+
+    def file_hash(self, path):
+        """Return the content hash of a file, reusing the stored one if size and mtime are unchanged"""
+        return file_content_hash(path, self.files)
+
+    def get(self, path):
+        """Return cached encodings for an image, or None if it must be encoded"""
+        content_hash = self.file_hash(path)
+        encodings = self.encodings.get(content_hash)
+        if encodings is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return encodings
+
+    def put(self, path, encodings):
+        """Store the encodings of an image (an empty list means no face was found)"""
+        content_hash = self.file_hash(path)
+        self.encodings[content_hash] = list(encodings)
+
+    def prune(self, existing_paths):
+        """Evict entries for files that no longer exist"""
+        existing_paths = set(existing_paths)
+        for path in list(self.files):
+            if path not in existing_paths:
+                del self.files[path]
+        live_hashes = {entry[2] for entry in self.files.values()}
+        for content_hash in list(self.encodings):
+            if content_hash not in live_hashes:
+                del self.encodings[content_hash]
+
+
+class RollingHistogram:
+    """Cumulative Prometheus-style buckets plus a ring of recent samples for rolling percentiles"""
+
+    BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self, window=1024):
+        self.bucket_counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        index = 0
+        while index < len(self.BUCKETS_MS) and ms > self.BUCKETS_MS[index]:
+            index += 1
+        self.bucket_counts[index] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        self.recent.append(ms)
+
+    def percentiles(self):
+        if not self.recent:
+            return None
+        p50, p95, p99 = np.percentile(np.fromiter(self.recent, dtype=np.float64), [50, 95, 99])
+        return {'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3)}
+
+
+class Metrics:
+    """Always-on, low-overhead stage timings and gauges shared by every part of the app"""
+
+    def __init__(self):
+        self.enabled = True
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        """Record one duration for a stage"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram()
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """Context manager that records how long its block took"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        """Rolling percentiles and totals of every stage, used for JSON export and the overlay"""
+        with self.lock:
+            stages = {}
+            for stage, histogram in sorted(self.histograms.items()):
+                stages[stage] = {
+                    'count': histogram.count,
+                    'mean_ms': round(histogram.total_seconds * 1000 / histogram.count, 3) if histogram.count else 0,
+                    **(histogram.percentiles() or {})
+                }
+            gauges = dict(self.gauges)
+        return {'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'stages': stages, 'gauges': gauges}
+
+    def to_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = ["# HELP face_stage_seconds Time spent in each pipeline stage",
+                 "# TYPE face_stage_seconds histogram"]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(RollingHistogram.BUCKETS_MS, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'face_stage_seconds_bucket{{stage="{stage}",le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'face_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'face_stage_seconds_sum{{stage="{stage}"}} {histogram.total_seconds:.6f}')
+                lines.append(f'face_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            gauges = sorted(self.gauges.items())
+        for name, value in gauges:
+            metric = "face_" + "".join(c if c.isalnum() else "_" for c in name)
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the Prometheus text file atomically so scrapers never read a partial file"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+# Process-wide metrics registry
+METRICS = Metrics()
+
+
+class MetricsExporter:
+    """Periodically writes the Prometheus file and serves /metrics and /metrics.json on localhost"""
+
+    def __init__(self, metrics, prometheus_file='metrics.prom', interval_seconds=10, http_port=9109):
+        self.metrics = metrics
+        self.prometheus_file = prometheus_file
+        self.interval_seconds = interval_seconds
+        self.http_port = http_port
+        self.stop_event = threading.Event()
+        self.server = None
+
+    def start(self):
+        if self.prometheus_file:
+            threading.Thread(target=self.export_loop, name="metrics-export", daemon=True).start()
+        if self.http_port:
+            metrics = self.metrics
+            
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.startswith('/metrics.json'):
+                        body = json.dumps(metrics.snapshot(), indent=2).encode()
+                        content_type = 'application/json'
+                    elif self.path.startswith('/metrics'):
+                        body = metrics.to_prometheus().encode()
+                        content_type = 'text/plain; version=0.0.4'
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                
+                def log_message(self, format, *args):
+                    pass
+            
+            try:
+                self.server = ThreadingHTTPServer(('127.0.0.1', self.http_port), MetricsHandler)
+                threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+                print(f"Metrics served on http://127.0.0.1:{self.http_port}/metrics.json")
+            except OSError as e:
+                print(f"Error starting metrics server: {e}")
+
+    def export_loop(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                self.metrics.write_prometheus(self.prometheus_file)
+            except Exception as e:
+                print(f"Error exporting metrics: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread for a while and writes a report of where time went
+
+    cProfile only sees the thread it runs in; sampling sys._current_frames covers the
+    capture, inference and GUI threads at once.
+    """
+
+    def __init__(self, seconds=10, interval=0.005, output_prefix='profile'):
+        self.seconds = seconds
+        self.interval = interval
+        self.output_prefix = output_prefix
+        self.running = False
+
+    def start(self, on_done=None):
+        """Start a capture in the background; on_done(report_path) is called when it finishes"""
+        if self.running:
+            return False
+        self.running = True
+        threading.Thread(target=self.run, args=(on_done,), name="sampling-profiler", daemon=True).start()
+        return True
+
+    def run(self, on_done):
+        own_id = threading.get_ident()
+        thread_names = {}
+        stacks = {}
+        self_counts = {}
+        samples = 0
+        end = time.perf_counter() + self.seconds
+        while time.perf_counter() < end:
+            thread_names.update({t.ident: t.name for t in threading.enumerate()})
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if not names:
+                    continue
+                self_counts[names[0]] = self_counts.get(names[0], 0) + 1
+                key = ";".join([thread_names.get(thread_id, str(thread_id))] + names[::-1])
+                stacks[key] = stacks.get(key, 0) + 1
+            samples += 1
+            time.sleep(self.interval)
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        report_path = f"{self.output_prefix}_{timestamp}.txt"
+        try:
+            # Collapsed stacks can be fed straight into flamegraph tools
+            with open(f"{self.output_prefix}_{timestamp}.folded", 'w') as f:
+                for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                    f.write(f"{stack} {count}\n")
+            with open(report_path, 'w') as f:
+                total = sum(self_counts.values()) or 1
+                f.write(f"{samples} samples over {self.seconds}s\n\nTop functions by self time:\n")
+                for name, count in sorted(self_counts.items(), key=lambda item: -item[1])[:40]:
+                    f.write(f"{100 * count / total:6.2f}%  {count:6d}  {name}\n")
+            print(f"Profile written to {report_path}")
+        except Exception as e:
+            print(f"Error writing profile: {e}")
+            report_path = None
+        self.running = False
+        if on_done:
+            on_done(report_path)
+
+
+class DropOldestQueue:
+    """Bounded queue between pipeline stages that drops the oldest item when full"""
+
+    def __init__(self, maxsize=1):
+        self.items = deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        """Add an item, evicting the oldest one if the queue is full"""
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, or None if nothing arrived within timeout"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items, timeout):
+                return None
+            return self.items.popleft()
+
+    def get_latest(self):
+        """Return the newest item without blocking and discard anything older"""
+        with self.condition:
+            if not self.items:
+                return None
+            item = self.items.pop()
+            self.dropped += len(self.items)
+            self.items.clear()
+            return item
+
+
+def box_iou(box_a, box_b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top = max(box_a[0], box_b[0])
+    right = min(box_a[1], box_b[1])
+    bottom = min(box_a[2], box_b[2])
+    left = max(box_a[3], box_b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    area_a = (box_a[1] - box_a[3]) * (box_a[2] - box_a[0])
+    area_b = (box_b[1] - box_b[3]) * (box_b[2] - box_b[0])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    """One face followed across frames together with its last known identity"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = tuple(float(v) for v in box)   # smoothed box shown on screen
+        self.detection_box = tuple(box)            # last raw detector box, used for encoding
+        self.name = "Unknown"
+        self.distance = float('inf')
+        self.confidence = 0
+        self.last_verified = None
+        self.missed = 0
+        # Face quality gating
+        self.best_score = -1.0
+        self.best_crop = None                      # (image, box) of the best face seen so far
+        self.deferred_since = None
+
+    def int_box(self):
+        return tuple(int(round(v)) for v in self.box)
+
+    def centroid(self):
+        top, right, bottom, left = self.box
+        return (left + right) / 2, (top + bottom) / 2
+
+    def width(self):
+        return self.box[1] - self.box[3]
+
+
+class FaceTracker:
+    """IoU/centroid tracker that keeps identity per face so only new or stale tracks get encoded"""
+
+    def __init__(self, iou_threshold=0.3, max_missed=5, reverify_seconds=2.0, optical_flow=True, smoothing=0.6):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.reverify_seconds = reverify_seconds
+        self.optical_flow = optical_flow
+        self.smoothing = smoothing
+        self.tracks = []
+        self.next_track_id = 1
+        self.prev_gray = None
+        self.last_frame_id = -1
+        self.last_detection_frame = -1
+        self.lock = threading.Lock()
+        # Statistics
+        self.detected_faces = 0
+        self.encoder_calls = 0
+
+    def update(self, detections, gray=None):
+        """Associate detector boxes with tracks and return the tracks that need a fresh encoding"""
+        self.detected_faces += len(detections)
+        unmatched_tracks = set(range(len(self.tracks)))
+        unmatched_detections = set(range(len(detections)))
+        
+        # Greedy assignment, best overlap first
+        pairs = sorted(((box_iou(track.box, det), t, d)
+                        for t, track in enumerate(self.tracks)
+                        for d, det in enumerate(detections)), reverse=True)
+        assignments = []
+        for iou, t, d in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in unmatched_tracks and d in unmatched_detections:
+                assignments.append((t, d))
+                unmatched_tracks.discard(t)
+                unmatched_detections.discard(d)
+        
+        # Fast movers may not overlap their previous box, fall back to centroid distance
+        for t in sorted(unmatched_tracks):
+            track = self.tracks[t]
+            cx, cy = track.centroid()
+            best_d, best_dist = None, track.width() * 0.5
+            for d in unmatched_detections:
+                top, right, bottom, left = detections[d]
+                dist = np.hypot((left + right) / 2 - cx, (top + bottom) / 2 - cy)
+                if dist < best_dist:
+                    best_d, best_dist = d, dist
+            if best_d is not None:
+                assignments.append((t, best_d))
+                unmatched_tracks.discard(t)
+                unmatched_detections.discard(best_d)
+        
+        for t, d in assignments:
+            track = self.tracks[t]
+            a = self.smoothing
+            track.box = tuple(a * new + (1 - a) * old for new, old in zip(detections[d], track.box))
+            track.detection_box = tuple(detections[d])
+            track.missed = 0
+        for t in unmatched_tracks:
+            self.tracks[t].missed += 1
+        for d in sorted(unmatched_detections):
+            self.tracks.append(FaceTrack(self.next_track_id, detections[d]))
+            self.next_track_id += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        self.prev_gray = gray
+        
+        now = time.time()
+        return [track for track in self.tracks
+                if track.missed == 0 and (track.last_verified is None
+                                          or now - track.last_verified >= self.reverify_seconds)]
+
+    def propagate(self, gray, scale=1.0):
+        """Move track boxes along sparse optical flow between the previous and current frame
+
+        Track boxes are in full frame coordinates, gray is the frame downscaled by scale.
+        """
+        if not self.optical_flow or self.prev_gray is None or gray is None or self.prev_gray.shape != gray.shape:
+            self.prev_gray = gray
+            return
+        height, width = gray.shape[:2]
+        for track in self.tracks:
+            top, right, bottom, left = (int(round(v * scale)) for v in track.box)
+            top, left = max(0, top), max(0, left)
+            bottom, right = min(height, bottom), min(width, right)
+            if bottom - top < 8 or right - left < 8:
+                continue
+            mask = np.zeros_like(self.prev_gray)
+            mask[top:bottom, left:right] = 255
+            points = cv2.goodFeaturesToTrack(self.prev_gray, maxCorners=30, qualityLevel=0.01,
+                                             minDistance=3, mask=mask)
+            if points is None:
+                continue
+            new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, points, None)
+            good = status.ravel() == 1
+            if good.sum() < 3:
+                continue
+            dx, dy = np.median((new_points[good] - points[good]).reshape(-1, 2), axis=0)
+            dx, dy = float(dx) / scale, float(dy) / scale
+            t, r, b, l = track.box
+            track.box = (t + dy, r + dx, b + dy, l + dx)
+        self.prev_gray = gray
+
+    def set_identity(self, track, match):
+        """Store a fresh (name, distance, confidence) match on a track"""
+        track.name, track.distance, track.confidence = match
+        track.last_verified = time.time()
+
+    def invalidate(self):
+        """Force every track to be re-encoded, e.g. after the gallery changed"""
+        with self.lock:
+            for track in self.tracks:
+                track.last_verified = None
+
+
+class MotionDetector:
+    """Cheap motion stage: differences a small blurred copy of the frame against a running-average background
+
+    update costs well under a millisecond, so it can decide on every detection frame
+    whether the detector has to run at all and where.
+    """
+
+    def __init__(self, width=160, threshold=25, min_area=0.002, learning_rate=0.05):
+        self.width = width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.learning_rate = learning_rate
+        self.background = None
+        self.motion_fraction = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, frame):
+        """Motion boxes (top, right, bottom, left) in frame coordinates, or None while the background is learned"""
+        height, width = frame.shape[:2]
+        scale = self.width / width
+        small = cv2.resize(frame, (self.width, max(1, int(round(height * scale)))), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        with self.lock:
+            if self.background is None or self.background.shape != gray.shape:
+                self.background = gray.astype(np.float32)
+                return None
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+            cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+        _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, None, iterations=2)
+        self.motion_fraction = np.count_nonzero(mask) / mask.size
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_pixels = self.min_area * mask.size
+        boxes = []
+        for contour in contours:
+            if cv2.contourArea(contour) < min_pixels:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((int(y / scale), int((x + w) / scale), int((y + h) / scale), int(x / scale)))
+        return boxes
+
+    def reset(self):
+        with self.lock:
+            self.background = None
+
+
+def detection_regions(boxes, height, width, padding=0.5):
+    """Pad boxes by a fraction of their size, merge the ones that overlap and clip them to the frame"""
+    regions = []
+    for top, right, bottom, left in boxes:
+        pad_y = int((bottom - top) * padding)
+        pad_x = int((right - left) * padding)
+        regions.append([max(0, top - pad_y), min(width, right + pad_x), min(height, bottom + pad_y), max(0, left - pad_x)])
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[3] < b[1] and b[3] < a[1] and a[0] < b[2] and b[0] < a[2]:
+                    regions[i] = [min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(region) for region in regions if region[2] > region[0] and region[1] > region[3]]
+
+
+def face_quality(face, landmarks=None):
+    """Sharpness, brightness and rough yaw of one BGR face crop
+
+    The crop is normalized to 64x64 first so sharpness does not depend on the face size.
+    Yaw is the horizontal offset of the nose tip from the eye midpoint in eye distances:
+    about 0 for a frontal face and 0.5 or more in profile.
+    """
+    if face.size == 0:
+        return {'sharpness': 0.0, 'brightness': 0.0, 'yaw': 1.0}
+    patch = cv2.resize(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY), (64, 64), interpolation=cv2.INTER_AREA)
+    yaw = 0.0
+    if landmarks is not None:
+        (eye_ax, eye_ay), (eye_bx, eye_by), (nose_x, _) = landmarks
+        eye_distance = np.hypot(eye_bx - eye_ax, eye_by - eye_ay)
+        yaw = abs(nose_x - (eye_ax + eye_bx) / 2) / eye_distance if eye_distance > 0 else 1.0
+    return {
+        'sharpness': float(cv2.Laplacian(patch, cv2.CV_32F).var()),
+        'brightness': float(patch.mean()),
+        'yaw': float(yaw)
+    }
+
+
+def crop_face(image, box, padding=0.25):
+    """Copy a padded face region out of an image, returns the crop and the box inside it"""
+    top, right, bottom, left = box
+    pad_y = int((bottom - top) * padding)
+    pad_x = int((right - left) * padding)
+    height, width = image.shape[:2]
+    y0, x0 = max(0, top - pad_y), max(0, left - pad_x)
+    y1, x1 = min(height, bottom + pad_y), min(width, right + pad_x)
+    return image[y0:y1, x0:x1].copy(), (top - y0, right - x0, bottom - y0, left - x0)
+
+
+def embed_items(backend, items):
+    """Encodings for (image, box) pairs, with one embed call per distinct image and results in input order"""
+    groups = {}
+    for i, (image, box) in enumerate(items):
+        group = groups.setdefault(id(image), (image, [], []))
+        group[1].append(i)
+        group[2].append(box)
+    encodings = [None] * len(items)
+    for image, positions, boxes in groups.values():
+        for i, encoding in zip(positions, backend.embed(image, boxes)):
+            encodings[i] = encoding
+    return encodings
+
+
+class QualityGate:
+    """Scores stale tracks before encoding and holds back faces that are not worth an encoder call
+
+    A face below any threshold is deferred to a later detection frame. Every track keeps
+    its best crop so far; when a track stays below the thresholds for max_defer_seconds
+    that crop is encoded instead, so poor conditions delay a name but never suppress it.
+    A threshold of 0 turns its check off.
+    """
+
+    def __init__(self, min_face_px=32, min_sharpness=50, min_brightness=40, max_brightness=220,
+                 max_yaw=0.35, max_defer_seconds=2.0):
+        self.min_face_px = min_face_px
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_yaw = max_yaw
+        self.max_defer_seconds = max_defer_seconds
+        # Statistics
+        self.checked = 0
+        self.skipped = 0
+        self.best_crop_encodes = 0
+        self.reasons = Counter()
+        self.encode_seconds = 0.0
+        self.encoded_faces = 0
+
+    def failures(self, quality):
+        reasons = []
+        if quality['size'] < self.min_face_px:
+            reasons.append('size')
+        if quality['sharpness'] < self.min_sharpness:
+            reasons.append('blur')
+        if (quality['brightness'] < self.min_brightness
+                or (self.max_brightness and quality['brightness'] > self.max_brightness)):
+            reasons.append('light')
+        if self.max_yaw and quality['yaw'] > self.max_yaw:
+            reasons.append('pose')
+        return reasons
+
+    def score(self, quality):
+        """0..1, used to pick the best crop of a track"""
+        # A disabled check does not rank crops either
+        size = min(1.0, quality['size'] / (2 * self.min_face_px)) if self.min_face_px > 0 else 1.0
+        sharpness = min(1.0, quality['sharpness'] / (2 * self.min_sharpness)) if self.min_sharpness > 0 else 1.0
+        light = max(0.0, 1 - abs(quality['brightness'] - 128) / 128)
+        pose = max(0.0, 1 - quality['yaw'] / (2 * self.max_yaw)) if self.max_yaw > 0 else 1.0
+        return size * sharpness * light * pose
+
+    def select(self, backend, tracks, sources):
+        """Split stale tracks into the ones to encode now, returns (tracks, [(image, box)])"""
+        now = time.time()
+        selected, items = [], []
+        for track in tracks:
+            image, box = sources[track.detection_box]
+            top, right, bottom, left = box
+            height, width = image.shape[:2]
+            face = backend.to_bgr(image[max(0, top):min(height, bottom), max(0, left):min(width, right)])
+            quality = face_quality(face, backend.landmarks(image, box))
+            quality['size'] = min(bottom - top, right - left)
+            score = self.score(quality)
+            reasons = self.failures(quality)
+            self.checked += 1
+            if score > track.best_score:
+                track.best_score = score
+                track.best_crop = backend.crop(image, box)
+            if not reasons:
+                track.deferred_since = None
+                selected.append(track)
+                items.append((image, box))
+                continue
+            if track.deferred_since is None:
+                track.deferred_since = now
+            if now - track.deferred_since < self.max_defer_seconds:
+                self.skipped += 1
+                self.reasons.update(reasons)
+                continue
+            # Waited long enough, settle for the best crop seen so far
+            track.deferred_since = None
+            self.best_crop_encodes += 1
+            selected.append(track)
+            items.append(track.best_crop)
+        return selected, items
+
+    def record_encode(self, faces, seconds):
+        self.encoded_faces += faces
+        self.encode_seconds += seconds
+
+    def saved_seconds(self):
+        """Encoder time not spent, estimated from the average cost of one encoded face"""
+        if not self.encoded_faces:
+            return 0.0
+        return self.skipped * self.encode_seconds / self.encoded_faces
+
+    def describe(self):
+        rate = self.skipped / self.checked * 100 if self.checked else 0
+        reasons = ", ".join(f"{reason} {count}" for reason, count in self.reasons.most_common())
+        return (f"quality: {self.skipped}/{self.checked} skipped ({rate:.0f}%"
+                f"{'; ' + reasons if reasons else ''}), {self.saved_seconds():.1f}s encoder saved")
+
+
+class AdaptiveScheduler:
+    """Picks the detection scale, upsample count and detection interval at runtime to meet a latency/fps budget"""
+
+    # Ordered from cheapest to most accurate
+    OPERATING_POINTS = [
+        {'scale': 0.25, 'upsample': 1, 'interval': 6},
+        {'scale': 0.5, 'upsample': 0, 'interval': 4},
+        {'scale': 0.35, 'upsample': 1, 'interval': 4},
+        {'scale': 0.5, 'upsample': 1, 'interval': 3},  # the original fixed settings
+        {'scale': 0.5, 'upsample': 1, 'interval': 2},
+        {'scale': 0.75, 'upsample': 1, 'interval': 2},
+        {'scale': 1.0, 'upsample': 1, 'interval': 1}
+    ]
+    DEFAULT_LEVEL = 3
+
+    def __init__(self, enabled=True, target_latency_ms=150, target_fps=15, fixed_point=None,
+                 window_seconds=2.0, smoothing=0.2):
+        self.enabled = enabled
+        self.target_latency_ms = target_latency_ms
+        self.target_fps = target_fps
+        self.fixed_point = fixed_point or self.OPERATING_POINTS[self.DEFAULT_LEVEL]
+        self.window_seconds = window_seconds
+        self.smoothing = smoothing
+        self.level = self.DEFAULT_LEVEL
+        self.stage_ms = {}  # exponential moving average per stage
+        self.fps = 0.0
+        self.lock = threading.Lock()
+        self.window_start = time.perf_counter()
+        self.window_frames = 0
+
+    def current(self):
+        """The operating point to use for the next frame"""
+        if not self.enabled:
+            return self.fixed_point
+        return self.OPERATING_POINTS[self.level]
+
+    def record(self, stage, seconds):
+        """Add a latency sample for a pipeline stage"""
+        with self.lock:
+            self._record(stage, seconds)
+
+    def _record(self, stage, seconds):
+        ms = seconds * 1000
+        previous = self.stage_ms.get(stage)
+        self.stage_ms[stage] = ms if previous is None else previous + self.smoothing * (ms - previous)
+
+    def record_frame(self, frame_seconds, detect_seconds=None):
+        """Record one processed frame and adjust the operating point; returns True when it changed"""
+        with self.lock:
+            self._record('frame', frame_seconds)
+            if detect_seconds is not None:
+                self._record('detect', detect_seconds)
+            self.window_frames += 1
+            elapsed = time.perf_counter() - self.window_start
+            if elapsed < self.window_seconds:
+                return False
+            self.fps = self.window_frames / elapsed
+            self.window_start = time.perf_counter()
+            self.window_frames = 0
+            if not self.enabled:
+                return False
+            
+            detect_ms = self.stage_ms.get('detect', 0)
+            new_level = self.level
+            if detect_ms > self.target_latency_ms or self.fps < self.target_fps * 0.9:
+                new_level = max(0, self.level - 1)
+            elif detect_ms < self.target_latency_ms * 0.6 and self.fps >= self.target_fps:
+                new_level = min(len(self.OPERATING_POINTS) - 1, self.level + 1)
+            if new_level == self.level:
+                return False
+            self.level = new_level
+            # Measurements from the old operating point no longer apply
+            self.stage_ms.pop('detect', None)
+            self.stage_ms.pop('encode', None)
+            return True
+
+    def describe(self):
+        """Short text of the operating point and measured latencies for the UI and logs"""
+        point = self.current()
+        text = f"scale {point['scale']:.2f}, upsample {point['upsample']}, detect every {point['interval']} frames"
+        with self.lock:
+            timings = ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in sorted(self.stage_ms.items()))
+            fps = self.fps
+        mode = "adaptive" if self.enabled else "fixed"
+        return f"{text} ({mode}, {fps:.1f} fps{', ' + timings if timings else ''})"
+
+
+class AttendanceStore:
+    """Indexed SQLite attendance store (WAL mode) for cooldown checks and fast queries
+
+    One connection per thread: the attendance writer inserts, the GUI and CLI only read.
+    """
+
+    TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, db_file='attendance.db'):
+        self.db_file = db_file
+        is_new = not os.path.exists(db_file)
+        self.conn = sqlite3.connect(db_file, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS attendance (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                ts TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_attendance_name_ts ON attendance(name, ts);
+            CREATE INDEX IF NOT EXISTS idx_attendance_ts ON attendance(ts);
+            CREATE TABLE IF NOT EXISTS imports (
+                path TEXT PRIMARY KEY,
+                rows INTEGER NOT NULL,
+                imported_at TEXT NOT NULL
+            );
+        """)
+        self.is_new = is_new
+
+    def close(self):
+        self.conn.close()
+
+    def add_many(self, rows):
+        """Insert (name, timestamp) rows in one transaction"""
+        with self.conn:
+            self.conn.executemany("INSERT INTO attendance (name, ts) VALUES (?, ?)", rows)
+
+    def last_seen(self, name):
+        """Most recent log time of a person, or None"""
+        row = self.conn.execute("SELECT MAX(ts) FROM attendance WHERE name = ?", (name,)).fetchone()
+        return datetime.strptime(row[0], self.TIMESTAMP_FORMAT) if row and row[0] else None
+
+    def last_seen_since(self, since):
+        """Most recent log time of everyone logged at or after since, as {name: datetime}"""
+        rows = self.conn.execute("SELECT name, MAX(ts) FROM attendance WHERE ts >= ? GROUP BY name",
+                                 (since.strftime(self.TIMESTAMP_FORMAT),)).fetchall()
+        return {name: datetime.strptime(ts, self.TIMESTAMP_FORMAT) for name, ts in rows}
+
+    def first_seen(self, name, day=None):
+        """First log time of a person on the given day (default today), or None"""
+        start, end = self.day_range(day)
+        row = self.conn.execute("SELECT MIN(ts) FROM attendance WHERE name = ? AND ts >= ? AND ts < ?",
+                                (name, start, end)).fetchone()
+        return datetime.strptime(row[0], self.TIMESTAMP_FORMAT) if row and row[0] else None
+
+    def present(self, day=None):
+        """Everyone logged on the given day (default today) as (name, first, last, count) rows"""
+        start, end = self.day_range(day)
+        return self.conn.execute("""
+            SELECT name, MIN(ts), MAX(ts), COUNT(*) FROM attendance
+            WHERE ts >= ? AND ts < ? GROUP BY name ORDER BY MIN(ts)
+        """, (start, end)).fetchall()
+
+    def history(self, name, limit=100):
+        """Most recent log times of a person, newest first"""
+        rows = self.conn.execute("SELECT ts FROM attendance WHERE name = ? ORDER BY ts DESC LIMIT ?",
+                                 (name, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def day_range(self, day=None):
+        day = day or datetime.now().date()
+        if isinstance(day, str):
+            day = datetime.strptime(day, '%Y-%m-%d').date()
+        start = datetime.combine(day, datetime.min.time())
+        return start.strftime(self.TIMESTAMP_FORMAT), (start + timedelta(days=1)).strftime(self.TIMESTAMP_FORMAT)
+
+    def import_csv(self, csv_file, batch_size=50000):
+        """One-time import of an existing attendance CSV; returns the number of imported rows"""
+        key = os.path.abspath(csv_file)
+        if self.conn.execute("SELECT 1 FROM imports WHERE path = ?", (key,)).fetchone():
+            print(f"{csv_file} was already imported")
+            return 0
+        imported = 0
+        with open(csv_file, newline='') as f:
+            reader = csv.reader(f)
+            batch = []
+            for row in reader:
+                if len(row) < 2 or row[0] == 'Name':
+                    continue
+                batch.append((row[0], row[1]))
+                if len(batch) >= batch_size:
+                    self.add_many(batch)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                self.add_many(batch)
+                imported += len(batch)
+        with self.conn:
+            self.conn.execute("INSERT INTO imports (path, rows, imported_at) VALUES (?, ?, ?)",
+                              (key, imported, datetime.now().strftime(self.TIMESTAMP_FORMAT)))
+        print(f"Imported {imported} attendance rows from {csv_file}")
+        return imported
+
+
+class AttendanceWriter:
+    """Single background writer that batches attendance rows into the CSV log
+
+    With a database, the people logged within the last recent_seconds before start are
+    read once into recent (name -> last log time) so cooldowns survive a restart.
+    """
+
+    def __init__(self, log_file='Attendance_log.csv', batch_size=50, flush_seconds=1.0,
+                 rotate='day', max_bytes=10 * 1024 * 1024, db_file=None, recent_seconds=0):
+        self.log_file = log_file
+        self.db_file = db_file
+        self.recent_seconds = recent_seconds
+        self.recent = {}
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.rotate = rotate
+        self.max_bytes = max_bytes
+        self.queue = queue.Queue()
+        self.rows_written = 0
+        self.file_date = None
+        if os.path.exists(log_file):
+            self.file_date = datetime.fromtimestamp(os.path.getmtime(log_file)).date()
+        self.thread = threading.Thread(target=self.run, name="attendance-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, name, timestamp):
+        """Queue one attendance row, returns immediately"""
+        self.queue.put([name, timestamp])
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def run(self):
+        """Collect rows until the batch is full or the oldest row has waited flush_seconds"""
+        self.store = None
+        if self.db_file:
+            try:
+                self.store = AttendanceStore(self.db_file)
+                if self.store.is_new and os.path.exists(self.log_file):
+                    self.store.import_csv(self.log_file)
+                if self.recent_seconds:
+                    self.recent = self.store.last_seen_since(datetime.now() - timedelta(seconds=self.recent_seconds))
+            except Exception as e:
+                print(f"Error opening attendance database: {e}")
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                row = self.queue.get(timeout=timeout)
+                if row is None:
+                    stopping = True
+                else:
+                    batch.append(row)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_seconds
+            except queue.Empty:
+                pass
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self.flush(batch)
+                batch = []
+                deadline = None
+        if self.store:
+            self.store.close()
+
+    def flush(self, rows):
+        """Append rows to the log and fsync so a crash can lose at most the rows still queued"""
+        flush_start = time.perf_counter()
+        try:
+            self.rotate_if_needed()
+            write_header = not os.path.exists(self.log_file) or os.path.getsize(self.log_file) == 0
+            with open(self.log_file, mode='a', newline='') as file:
+                writer = csv.writer(file)
+                if write_header:
+                    writer.writerow(['Name', 'Timestamp'])
+                writer.writerows(rows)
+                file.flush()
+                os.fsync(file.fileno())
+            if self.store:
+                self.store.add_many(rows)
+            if self.file_date is None:
+                self.file_date = datetime.now().date()
+            self.rows_written += len(rows)
+            for name, timestamp in rows:
+                print(f"Logged to CSV: {name} at {timestamp}")
+        except Exception as e:
+            print(f"Error logging to CSV: {e}")
+        METRICS.observe('attendance_flush', time.perf_counter() - flush_start)
+        METRICS.set_gauge('attendance_rows_written', self.rows_written)
+
+    def rotate_if_needed(self):
+        """Move the current log aside when the day changed or it grew past max_bytes"""
+        if self.rotate not in ('day', 'size') or not os.path.exists(self.log_file):
+            return
+        today = datetime.now().date()
+        if self.rotate == 'day':
+            if self.file_date is None or self.file_date == today:
+                return
+            suffix = self.file_date.strftime('%Y-%m-%d')
+        else:
+            if os.path.getsize(self.log_file) < self.max_bytes:
+                return
+            suffix = datetime.now().strftime('%Y-%m-%d_%H%M%S')
+        base, ext = os.path.splitext(self.log_file)
+        rotated = f"{base}_{suffix}{ext}"
+        counter = 1
+        while os.path.exists(rotated):
+            rotated = f"{base}_{suffix}_{counter}{ext}"
+            counter += 1
+        os.replace(self.log_file, rotated)
+        self.file_date = today
+        print(f"Rotated attendance log to {rotated}")
+
+    def close(self, timeout=5):
+        """Write every pending row and stop the writer thread"""
+        self.queue.put(None)
+        self.thread.join(timeout=timeout)
+
+
+class KeyboardDispatcher:
+    """Single worker that serializes auto-typing and types queued names in bursts
+
+    Every entry waits delay_seconds from when it was queued so the user can focus the
+    target window; entries that arrive meanwhile are typed in the same burst. A name that
+    is already waiting is not queued again, and the queue is bounded so a crowd cannot
+    build up minutes of pending keystrokes.
+    """
+
+    def __init__(self, settings, max_pending=20, max_burst=10, interval=0.05):
+        self.settings = settings  # the app's keyboard settings, read when a burst is typed
+        self.max_burst = max_burst
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.waiting_names = set()
+        self.lock = threading.Lock()
+        self.merged = 0
+        self.dropped = 0
+        self.typed = 0
+        self.last_latency = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="keyboard-dispatcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, name, timestamp, settings=None):
+        """Queue one entry, returns False if it was merged into a waiting entry or dropped
+
+        settings overrides the app settings for this entry (used by Test Typing); such
+        entries are typed on their own.
+        """
+        with self.lock:
+            if settings is None and name in self.waiting_names:
+                self.merged += 1
+                return False
+            try:
+                self.queue.put_nowait((name, timestamp, settings, time.perf_counter()))
+            except queue.Full:
+                self.dropped += 1
+                print(f"Keyboard queue full, not typing {name}")
+                return False
+            if settings is None:
+                self.waiting_names.add(name)
+        METRICS.set_gauge('keyboard_queue_depth', self.queue.qsize())
+        return True
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def run(self):
+        held = None  # a test entry taken off the queue while collecting a burst
+        while not self.stop_event.is_set():
+            if held is not None:
+                entry, held = held, None
+            else:
+                try:
+                    entry = self.queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            settings = entry[2] or self.settings
+            remaining = entry[3] + float(settings['delay_seconds']) - time.perf_counter()
+            if remaining > 0 and self.stop_event.wait(remaining):
+                break
+            burst = [entry]
+            if entry[2] is None:
+                # Everyone else who arrived while waiting is typed in the same burst
+                while len(burst) < self.max_burst:
+                    try:
+                        queued = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if queued[2] is not None:
+                        held = queued  # test entries keep their own settings
+                        break
+                    burst.append(queued)
+            with self.lock:
+                for queued in burst:
+                    if queued[2] is None:
+                        self.waiting_names.discard(queued[0])
+            self.type_burst(burst, settings)
+            METRICS.set_gauge('keyboard_queue_depth', self.queue.qsize())
+
+    def type_burst(self, burst, settings):
+        """Type every entry of a burst with the format template and the configured keys"""
+        try:
+            pyautogui = pyautogui_module()
+            with METRICS.timer('keyboard_type'):
+                for name, timestamp, _, queued_at in burst:
+                    text_to_type = format_keyboard_text(settings['format_template'], name, timestamp)
+                    pyautogui.typewrite(text_to_type, interval=self.interval)
+                    if settings['add_tab']:
+                        pyautogui.press('tab')
+                    if settings['add_enter']:
+                        pyautogui.press('enter')
+                    print(f"Auto-typed: {text_to_type}")
+            now = time.perf_counter()
+            for entry in burst:
+                METRICS.observe('keyboard_latency', now - entry[3])
+            self.last_latency = now - burst[0][3]
+            self.typed += len(burst)
+        except Exception as e:
+            print(f"Error in auto-typing: {e}")
+
+    def describe(self):
+        return (f"{self.pending()} queued, {self.typed} typed, {self.merged} merged, "
+                f"last {self.last_latency:.1f} s")
+
+    def close(self, timeout=1):
+        """Stop the worker; entries still waiting for their delay are not typed"""
+        self.stop_event.set()
+        self.thread.join(timeout=timeout)
+
+
+def format_keyboard_text(template, name, timestamp):
+    """Fill the keyboard format template for one person"""
+    return template.format(
+        name=name,
+        timestamp=timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        date=timestamp.strftime('%Y-%m-%d'),
+        time=timestamp.strftime('%H:%M:%S')
+    )
+
+
+class DlibBackend:
+    """face_recognition (dlib) HOG or CNN detector with the 128-d ResNet encoder"""
+
+    metric = 'euclidean'
+    dim = 128
+    default_upsample = 1
+
+    def __init__(self, model='hog', options=None):
+        self.name = model
+        self.model = model
+        if model == 'hog':
+            # Keep the original cache file so existing HOG galleries stay valid
+            self.model_tag = ENCODING_MODEL_TAG
+            self.cache_file = ENCODING_CACHE_FILE
+        else:
+            self.model_tag = f"face_recognition-{package_version('face_recognition')}/{model}/small/jitter1"
+            self.cache_file = f"known_faces_cache_{model}.pkl"
+        self.tolerance = 0.5
+
+    def load_image(self, path):
+        return face_recognition_module().load_image_file(path)
+
+    def prepare(self, frame):
+        """Convert a BGR frame to the color order this backend works in"""
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def to_bgr(self, image):
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+    def detect(self, image, upsample=1):
+        return face_recognition_module().face_locations(image, model=self.model, number_of_times_to_upsample=upsample)
+
+    def embed(self, image, locations):
+        return face_recognition_module().face_encodings(image, locations)
+
+    def landmarks(self, image, box):
+        """Both eye centers and the nose tip from the 5-point model, as used for rough pose"""
+        points = face_recognition_module().face_landmarks(image, [box], model='small')
+        if not points:
+            return None
+        points = points[0]
+        return (np.mean(points['left_eye'], axis=0), np.mean(points['right_eye'], axis=0), points['nose_tip'][0])
+
+    def crop(self, image, box):
+        return crop_face(image, box)
+
+    def confidence(self, distance):
+        return 1 - distance
+
+
+class YuNetSFaceBackend:
+    """OpenCV YuNet detector with the SFace recognizer, matched by cosine similarity
+
+    SFace features are L2-normalized, so the Euclidean distance used by the matcher
+    maps directly onto cosine similarity: distance**2 = 2 - 2 * cosine.
+    """
+
+    name = 'yunet'
+    metric = 'cosine'
+    dim = 128
+    default_upsample = 0
+
+    def __init__(self, options=None):
+        options = options or {}
+        self.detector_model = options.get('yunet_model', 'face_detection_yunet_2023mar.onnx')
+        self.recognizer_model = options.get('sface_model', 'face_recognition_sface_2021dec.onnx')
+        self.score_threshold = float(options.get('yunet_score_threshold', 0.6))
+        self.cosine_threshold = float(options.get('sface_cosine_threshold', 0.363))
+        self.tolerance = float(np.sqrt(2 - 2 * self.cosine_threshold))
+        self.model_tag = (f"opencv-{cv2.__version__}/{os.path.basename(self.detector_model)}"
+                          f"/{os.path.basename(self.recognizer_model)}")
+        self.cache_file = "known_faces_cache_yunet.pkl"
+        # OpenCV model objects keep per-call state, so every thread gets its own
+        self.local = threading.local()
+
+    def models(self):
+        if not hasattr(self.local, 'detector'):
+            self.local.detector = cv2.FaceDetectorYN_create(self.detector_model, "", (320, 320),
+                                                            score_threshold=self.score_threshold,
+                                                            backend_id=cv2.dnn.DNN_BACKEND_OPENCV,
+                                                            target_id=cv2.dnn.DNN_TARGET_CPU)
+            self.local.recognizer = cv2.FaceRecognizerSF_create(self.recognizer_model, "")
+            self.local.detections = {}
+        return self.local.detector, self.local.recognizer
+
+    def load_image(self, path):
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"could not read image {path}")
+        return image
+
+    def prepare(self, frame):
+        return frame
+
+    def to_bgr(self, image):
+        return image
+
+    def detect(self, image, upsample=0):
+        detector, _ = self.models()
+        original = image
+        factor = 2 ** upsample
+        if factor > 1:
+            image = cv2.resize(image, (0, 0), fx=factor, fy=factor)
+        height, width = image.shape[:2]
+        detector.setInputSize((width, height))
+        _, faces = detector.detect(image)
+        locations = []
+        # Remember the landmarks so embed can align the crop of the same box; several images
+        # (one per detection region) can be pending at once, so they are keyed by image too
+        for face in (faces if faces is not None else []):
+            face = face.copy()
+            face[:14] /= factor
+            x, y, w, h = face[:4]
+            box = (max(0, int(y)), int(x + w), int(y + h), max(0, int(x)))
+            locations.append(box)
+            self.remember(original, box, face)
+        return locations
+
+    def remember(self, image, box, face):
+        """Keep the detection row of a box for later calls on this very image object
+
+        Entries are keyed by id() and hold a weak reference to their image: ids and buffer
+        addresses are reused once an image is freed, and a later frame must never be aligned
+        with the landmarks of an earlier one.
+        """
+        detections = self.local.detections
+        entry = detections.get(id(image))
+        if entry is None or entry[0]() is not image:
+            if len(detections) > 256:
+                for key in [key for key, (ref, _) in detections.items() if ref() is None]:
+                    del detections[key]
+            entry = detections[id(image)] = (weakref.ref(image), {})
+        entry[1][tuple(box)] = face
+
+    def detection(self, image, box):
+        """The remembered detection row of a box in this image object, or None"""
+        entry = self.local.detections.get(id(image))
+        if entry is None or entry[0]() is not image:
+            return None
+        return entry[1].get(tuple(box))
+
+    def embed(self, image, locations):
+        _, recognizer = self.models()
+        encodings = []
+        for box in locations:
+            face = self.detection(image, box)
+            if face is None:
+                face = self.find_landmarks(image, box)
+            if face is not None:
+                crop = recognizer.alignCrop(image, face)
+            else:
+                top, right, bottom, left = box
+                crop = cv2.resize(image[max(0, top):bottom, max(0, left):right], (112, 112))
+            feature = recognizer.feature(crop).reshape(-1).astype(np.float32)
+            encodings.append(feature / (np.linalg.norm(feature) or 1.0))
+        return encodings
+
+    def find_landmarks(self, image, box):
+        """Re-detect around a box this thread did not detect itself (e.g. a crop sent by a thin client)"""
+        crop, crop_box = crop_face(image, box)
+        if crop.size == 0:
+            return None
+        detector, _ = self.models()
+        detector.setInputSize((crop.shape[1], crop.shape[0]))
+        _, faces = detector.detect(crop)
+        best, best_iou = None, 0.3
+        for face in (faces if faces is not None else []):
+            x, y, w, h = face[:4]
+            iou = box_iou(crop_box, (y, x + w, y + h, x))
+            if iou > best_iou:
+                best, best_iou = face.copy(), iou
+        if best is not None:
+            offset_x, offset_y = box[3] - crop_box[3], box[0] - crop_box[0]
+            best[[0, 4, 6, 8, 10, 12]] += offset_x
+            best[[1, 5, 7, 9, 11, 13]] += offset_y
+        return best
+
+    def landmarks(self, image, box):
+        """Both eyes and the nose tip straight from the YuNet detection"""
+        face = self.detection(image, box)
+        if face is None:
+            return None
+        return face[4:6], face[6:8], face[8:10]
+
+    def crop(self, image, box):
+        """Padded crop that keeps its landmarks, so it can still be aligned when encoded later"""
+        crop, crop_box = crop_face(image, box)
+        face = self.detection(image, box)
+        if face is not None:
+            face = face.copy()
+            offset_x, offset_y = crop_box[3] - box[3], crop_box[0] - box[0]
+            face[[0, 4, 6, 8, 10, 12]] += offset_x
+            face[[1, 5, 7, 9, 11, 13]] += offset_y
+            self.remember(crop, crop_box, face)
+        return crop, crop_box
+
+    def confidence(self, distance):
+        return max(0.0, 1 - distance ** 2 / 2)  # cosine similarity
+
+
+# Available detector/recognizer backends, selected with 'recognition_backend' in performance_config.json
+RECOGNITION_BACKENDS = {
+    'hog': lambda options: DlibBackend('hog', options),
+    'cnn': lambda options: DlibBackend('cnn', options),
+    'yunet': lambda options: YuNetSFaceBackend(options)
+}
+BACKEND_INSTANCES = {}
+
+
+def get_backend(name='hog', options=None):
+    """Shared backend instance for this process, created on first use"""
+    if name not in RECOGNITION_BACKENDS:
+        print(f"Unknown recognition backend '{name}', using hog")
+        name = 'hog'
+    if name not in BACKEND_INSTANCES:
+        BACKEND_INSTANCES[name] = RECOGNITION_BACKENDS[name](options or {})
+    return BACKEND_INSTANCES[name]
+
+
+def encode_image_file(image_path, backend_name='hog', options=None):
+    """Decode and encode one image in an enrollment worker process"""
+    try:
+        backend = get_backend(backend_name, options)
+        image = backend.load_image(image_path)
+        locations = backend.detect(image, backend.default_upsample)
+        return image_path, backend.embed(image, locations), None
+    except Exception as e:
+        return image_path, None, str(e)
+
+
+def squared_distances(queries, vectors, vector_sq_norms=None):
+    """Squared Euclidean distances between two sets of float32 rows, shape (queries, vectors)"""
+    if vector_sq_norms is None:
+        vector_sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+    sq_dist = (np.einsum('ij,ij->i', queries, queries)[:, None]
+               + vector_sq_norms[None, :]
+               - 2.0 * (queries @ vectors.T))
+    np.maximum(sq_dist, 0.0, out=sq_dist)
+    return sq_dist
+
+
+def nearest_rows(queries, vectors, chunk_size=16384):
+    """Index of the nearest row of vectors for every query, computed in chunks to bound memory"""
+    vector_sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+    nearest = np.empty(len(queries), dtype=np.int64)
+    for start in range(0, len(queries), chunk_size):
+        block = queries[start:start + chunk_size]
+        nearest[start:start + chunk_size] = np.argmin(squared_distances(block, vectors, vector_sq_norms), axis=1)
+    return nearest
+
+
+class ExactIndex:
+    """Brute force gallery index, the reference backend every other index is measured against"""
+
+    kind = 'exact'
+
+    def __init__(self, dim=128):
+        self.dim = dim
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.sq_norms = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def build(self, vectors, ids=None):
+        """Build the index from scratch"""
+        self.vectors = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        self.ids = np.arange(len(self.vectors), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+
+    def add(self, vectors, ids):
+        """Append vectors with the given ids"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        self.vectors = np.ascontiguousarray(np.concatenate([self.vectors, vectors]))
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.sq_norms = np.concatenate([self.sq_norms, np.einsum('ij,ij->i', vectors, vectors)])
+
+    def remove(self, ids):
+        """Remove every vector whose id is in ids"""
+        keep = ~np.isin(self.ids, np.asarray(list(ids), dtype=np.int64))
+        self.vectors = np.ascontiguousarray(self.vectors[keep])
+        self.ids = self.ids[keep]
+        self.sq_norms = self.sq_norms[keep]
+        return keep
+
+    def search(self, queries, k=1):
+        """Return (distances, ids) of the k nearest vectors for each query, shape (queries, k)"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(queries) == 0 or len(self.ids) == 0:
+            return distances, ids
+        sq_dist = squared_distances(queries, self.vectors, self.sq_norms)
+        kk = min(k, len(self.ids))
+        if kk == 1:
+            top = np.argmin(sq_dist, axis=1)[:, None]
+        else:
+            top = np.argpartition(sq_dist, kk - 1, axis=1)[:, :kk]
+            order = np.argsort(np.take_along_axis(sq_dist, top, axis=1), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+        distances[:, :kk] = np.sqrt(np.take_along_axis(sq_dist, top, axis=1))
+        ids[:, :kk] = self.ids[top]
+        return distances, ids
+
+    def copy(self):
+        """Copy that can be changed with add/remove without affecting this index
+
+        add and remove always replace arrays instead of writing into them, so the copy
+        can share every array with the original.
+        """
+        index = type(self).__new__(type(self))
+        index.__dict__.update(self.__dict__)
+        return index
+
+    def state(self):
+        """Arrays that fully describe the index, used by save"""
+        return {'vectors': self.vectors, 'ids': self.ids}
+
+    def restore(self, state):
+        """Rebuild the index from the arrays written by save"""
+        self.build(state['vectors'], state['ids'])
+
+    def save(self, path):
+        """Save the index to a .npz file"""
+        np.savez(path, kind=np.array(self.kind), dim=np.array(self.dim), **self.state())
+
+    @staticmethod
+    def load(path):
+        """Load an index of any backend from a file written by save"""
+        with np.load(path, allow_pickle=False) as data:
+            state = {key: data[key] for key in data.files}
+        index = GALLERY_INDEX_BACKENDS[str(state.pop('kind'))](dim=int(state.pop('dim')))
+        index.restore(state)
+        return index
+
+
+class IVFIndex(ExactIndex):
+    """Inverted file index: k-means coarse quantizer, only the nprobe closest lists are scanned"""
+
+    kind = 'ivf'
+
+    def __init__(self, dim=128, nlist=0, nprobe=8, train_iterations=10, seed=0):
+        super().__init__(dim)
+        self.nlist = nlist          # 0 = about 4 * sqrt(gallery size)
+        self.nprobe = nprobe        # more probes = higher recall, lower speed
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self.centroids = np.zeros((0, dim), dtype=np.float32)
+        self.assignments = np.zeros(0, dtype=np.int64)
+        self.list_rows = np.zeros(0, dtype=np.int64)
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+
+    def train(self, vectors):
+        """Fit the coarse quantizer with k-means on a sample of the vectors"""
+        nlist = self.nlist or max(1, int(4 * np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), nlist * 64)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            nearest = nearest_rows(sample, centroids)
+            counts = np.bincount(nearest, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        self.centroids = np.ascontiguousarray(centroids)
+
+    def build(self, vectors, ids=None):
+        super().build(vectors, ids)
+        if len(self.vectors) == 0:
+            self.centroids = np.zeros((0, self.dim), dtype=np.float32)
+            self.assignments = np.zeros(0, dtype=np.int64)
+        else:
+            self.train(self.vectors)
+            self.assignments = nearest_rows(self.vectors, self.centroids)
+        self.rebuild_lists()
+
+    def rebuild_lists(self):
+        """Group row numbers by their list so each list is one contiguous slice"""
+        self.list_rows = np.argsort(self.assignments, kind='stable')
+        self.list_offsets = np.searchsorted(self.assignments[self.list_rows],
+                                            np.arange(len(self.centroids) + 1))
+
+    def add(self, vectors, ids):
+        if len(self.centroids) == 0:
+            vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+            self.build(np.concatenate([self.vectors, vectors]),
+                       np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)]))
+            return
+        start = len(self.vectors)
+        super().add(vectors, ids)
+        self.assignments = np.concatenate([self.assignments, nearest_rows(self.vectors[start:], self.centroids)])
+        self.rebuild_lists()
+
+    def remove(self, ids):
+        keep = super().remove(ids)
+        self.assignments = self.assignments[keep]
+        self.rebuild_lists()
+        return keep
+
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(queries) == 0 or len(self.ids) == 0:
+            return distances, ids
+        nprobe = min(self.nprobe, len(self.centroids))
+        centroid_dist = squared_distances(queries, self.centroids)
+        probes = np.argpartition(centroid_dist, nprobe - 1, axis=1)[:, :nprobe]
+        best_sq = np.full((len(queries), k), np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        # Visit each probed list once and score every query that probes it in one block
+        probe_lists = probes.ravel()
+        probe_queries = np.repeat(np.arange(len(queries)), nprobe)
+        order = np.argsort(probe_lists, kind='stable')
+        probe_lists = probe_lists[order]
+        probe_queries = probe_queries[order]
+        bounds = np.flatnonzero(np.diff(probe_lists)) + 1
+        for group in np.split(np.arange(len(probe_lists)), bounds):
+            list_id = probe_lists[group[0]]
+            rows = self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]
+            if len(rows) == 0:
+                continue
+            query_ids = probe_queries[group]
+            sq_dist = squared_distances(queries[query_ids], self.vectors[rows], self.sq_norms[rows])
+            candidate_sq = np.concatenate([best_sq[query_ids], sq_dist], axis=1)
+            candidate_rows = np.concatenate([best_rows[query_ids],
+                                             np.broadcast_to(rows, sq_dist.shape)], axis=1)
+            if k == 1:
+                top = np.argmin(candidate_sq, axis=1)[:, None]
+            else:
+                top = np.argpartition(candidate_sq, k - 1, axis=1)[:, :k]
+            best_sq[query_ids] = np.take_along_axis(candidate_sq, top, axis=1)
+            best_rows[query_ids] = np.take_along_axis(candidate_rows, top, axis=1)
+        order = np.argsort(best_sq, axis=1)
+        best_sq = np.take_along_axis(best_sq, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        found = best_rows >= 0
+        distances[found] = np.sqrt(best_sq[found])
+        ids[found] = self.ids[best_rows[found]]
+        return distances, ids
+
+    def state(self):
+        state = super().state()
+        state.update({
+            'centroids': self.centroids,
+            'assignments': self.assignments,
+            'nprobe': np.array(self.nprobe)
+        })
+        return state
+
+    def restore(self, state):
+        ExactIndex.build(self, state['vectors'], state['ids'])
+        self.centroids = np.ascontiguousarray(state['centroids'], dtype=np.float32)
+        self.nlist = len(self.centroids)
+        self.assignments = state['assignments'].astype(np.int64)
+        self.nprobe = int(state['nprobe'])
+        self.rebuild_lists()
+
+
+class GalleryStore:
+    """Compact on-disk gallery: memory-mapped embedding rows plus interned name and path tables
+
+    Files in the store directory:
+      meta.json     dtype, dim, row count, model tag, folder signature, int8 scales, name table
+      vectors.bin   row-major embeddings as float32, float16 or int8
+      norms.bin     float32 squared norm of every (dequantized) row
+      name_ids.bin  int32 position of every row's name in the name table
+      path_ids.bin  int32 position of every row's image in paths.json
+      removed.bin   int64 rows deleted since the last compaction
+      paths.json    image path table, only read when rows are mapped back to files
+    Opening maps the files without reading them, so a million-row gallery opens in
+    milliseconds and every process mapping the same store shares its pages. Rows are only
+    appended; removals are tombstones until compact() rewrites the files.
+    
+    Everything but meta.json lives in a generation directory (gen1, gen2, ...) named by
+    meta.json. Rewrites go into a new generation and switch to it by replacing meta.json,
+    so no file or directory another map still uses is ever renamed or truncated, which
+    Windows refuses; old generations are deleted once nothing maps them any more.
+    """
+
+    VERSION = 1
+    DTYPES = ('float32', 'float16', 'int8')
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != self.VERSION:
+            raise ValueError(f"unsupported gallery store version {self.meta.get('version')}")
+        self.dim = int(self.meta['dim'])
+        self.dtype = np.dtype(self.meta['dtype'])
+        self.scales = np.asarray(self.meta['scales'], dtype=np.float32) if self.meta.get('scales') else None
+        self.name_table = list(self.meta['names'])
+        self.name_index = {name: i for i, name in enumerate(self.name_table)}
+        self.path_table = None  # loaded on demand
+        self.map()
+
+    def file(self, name):
+        """Path of a data file of the current generation (stores without generations keep them at the top)"""
+        generation = self.meta.get('generation')
+        if generation is None:
+            return os.path.join(self.path, name)
+        return os.path.join(self.path, f"gen{generation}", name)
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, 'meta.json'))
+
+    def __len__(self):
+        return self.count
+
+    def map(self):
+        """Memory-map the rows listed in meta.json, bytes past them are leftovers of an interrupted append"""
+        self.count = int(self.meta['count'])
+        self.vectors = self.map_file('vectors.bin', self.dtype, (self.count, self.dim))
+        self.norms = self.map_file('norms.bin', np.float32, (self.count,))
+        self.name_ids = self.map_file('name_ids.bin', np.int32, (self.count,))
+        self.path_ids = self.map_file('path_ids.bin', np.int32, (self.count,))
+        self.removed = np.fromfile(self.file('removed.bin'), dtype=np.int64, count=int(self.meta['removed']))
+
+    def map_file(self, name, dtype, shape):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.file(name), dtype=dtype, mode='r', shape=shape)
+
+    def quantize(self, vectors):
+        """Convert float32 rows to the stored representation"""
+        if self.dtype == np.int8:
+            return np.clip(np.rint(vectors / self.scales), -127, 127).astype(np.int8)
+        return vectors.astype(self.dtype)
+
+    def dequantize(self, rows):
+        """float32 copy of stored rows"""
+        if self.dtype == np.int8:
+            return rows.astype(np.float32) * self.scales
+        return rows.astype(np.float32)
+
+    def names(self):
+        """Name of every row as an object array whose entries share the interned strings"""
+        return np.array(self.name_table, dtype=object)[np.asarray(self.name_ids)]
+
+    def paths(self):
+        """Image path of every row"""
+        if self.path_table is None:
+            with open(self.file('paths.json'), 'r') as f:
+                self.path_table = json.load(f)
+        return [self.path_table[i] for i in np.asarray(self.path_ids)]
+
+    @classmethod
+    def create(cls, path, encodings, names, paths, dim=128, dtype='float32', model_tag='', signature=''):
+        """Write a new store from a whole gallery, replacing any store at path, and open it"""
+        if dtype not in cls.DTYPES:
+            raise ValueError(f"unknown gallery store dtype '{dtype}', expected one of {cls.DTYPES}")
+        vectors = np.asarray(encodings, dtype=np.float32).reshape(-1, dim)
+        scales = None
+        if dtype == 'int8':
+            # Per-dimension scale with headroom for faces appended later
+            peak = np.abs(vectors).max(axis=0) if len(vectors) else np.ones(dim, dtype=np.float32)
+            scales = np.maximum(peak * 1.25, 1e-6).astype(np.float32) / 127
+        name_table, name_ids = intern_strings(names)
+        path_table, path_ids = intern_strings(paths)
+        meta = {
+            'version': cls.VERSION,
+            'dim': dim,
+            'dtype': dtype,
+            'count': len(vectors),
+            'removed': 0,
+            'model': model_tag,
+            'signature': signature,
+            'scales': scales.tolist() if scales is not None else None,
+            'names': name_table
+        }
+        store = cls.__new__(cls)
+        store.dtype = np.dtype(dtype)
+        store.scales = scales
+        stored = store.quantize(vectors)
+        restored = store.dequantize(stored)
+        meta = cls.write_files(path, meta, path_table, {
+            'vectors.bin': stored,
+            'norms.bin': np.einsum('ij,ij->i', restored, restored).astype(np.float32),
+            'name_ids.bin': name_ids,
+            'path_ids.bin': path_ids
+        })
+        return cls(path)
+
+    @staticmethod
+    def write_files(path, meta, path_table, arrays):
+        """Write a complete store as a new generation and switch meta.json to it, returns the new meta"""
+        meta_file = os.path.join(path, 'meta.json')
+        generation = 1
+        if os.path.exists(meta_file):
+            try:
+                with open(meta_file, 'r') as f:
+                    generation = int(json.load(f).get('generation') or 0) + 1
+            except (OSError, ValueError):
+                pass
+        generation_path = os.path.join(path, f"gen{generation}")
+        shutil.rmtree(generation_path, ignore_errors=True)
+        os.makedirs(generation_path)
+        for name, array in arrays.items():
+            np.ascontiguousarray(array).tofile(os.path.join(generation_path, name))
+        open(os.path.join(generation_path, 'removed.bin'), 'wb').close()
+        with open(os.path.join(generation_path, 'paths.json'), 'w') as f:
+            json.dump(path_table, f)
+        meta = dict(meta, generation=generation)
+        GalleryStore.write_meta_file(path, meta)
+        # Processes that still map an old generation keep reading it until they reopen; on Windows
+        # its files cannot be deleted until then and are retried on the next rewrite
+        for entry in os.listdir(path):
+            entry_path = os.path.join(path, entry)
+            if entry.startswith('gen') and entry != f"gen{generation}" and os.path.isdir(entry_path):
+                shutil.rmtree(entry_path, ignore_errors=True)
+            elif entry.endswith(('.bin', 'paths.json')):
+                try:
+                    os.remove(entry_path)  # files of a store written before generations
+                except OSError:
+                    pass
+        return meta
+
+    @staticmethod
+    def write_meta_file(path, meta):
+        tmp_file = os.path.join(path, 'meta.json.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, os.path.join(path, 'meta.json'))
+
+    def write_meta(self):
+        self.write_meta_file(self.path, self.meta)
+
+    def append(self, encodings, names, paths):
+        """Append rows and return their row numbers; meta.json is updated last so readers never see partial rows"""
+        vectors = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self.path_table is None:
+            self.paths()
+        path_index = {image_path: i for i, image_path in enumerate(self.path_table)}
+        name_ids = np.array([self.name_index.setdefault(name, len(self.name_index)) for name in names], dtype=np.int32)
+        path_ids = np.array([path_index.setdefault(image_path, len(path_index)) for image_path in paths], dtype=np.int32)
+        self.name_table = list(self.name_index)
+        self.path_table = list(path_index)
+        stored = self.quantize(vectors)
+        restored = self.dequantize(stored)
+        start = self.count
+        for name, array in (('vectors.bin', stored),
+                            ('norms.bin', np.einsum('ij,ij->i', restored, restored).astype(np.float32)),
+                            ('name_ids.bin', name_ids),
+                            ('path_ids.bin', path_ids)):
+            with open(self.file(name), 'r+b') as f:
+                # Overwrite leftovers of an interrupted append instead of truncating: the file is mapped
+                f.seek(start * array[:1].nbytes)
+                f.write(np.ascontiguousarray(array).tobytes())
+        with open(self.file('paths.json'), 'w') as f:
+            json.dump(self.path_table, f)
+        self.meta.update({'count': start + len(vectors), 'names': self.name_table, 'signature': ''})
+        self.write_meta()
+        self.map()
+        return np.arange(start, start + len(vectors), dtype=np.int64)
+
+    def remove(self, rows):
+        """Mark rows as deleted"""
+        rows = np.asarray(list(rows), dtype=np.int64)
+        if len(rows) == 0:
+            return
+        with open(self.file('removed.bin'), 'r+b') as f:
+            f.truncate(int(self.meta['removed']) * 8)
+            f.seek(0, os.SEEK_END)
+            f.write(rows.tobytes())
+        self.meta.update({'removed': int(self.meta['removed']) + len(rows), 'signature': ''})
+        self.write_meta()
+        self.map()
+
+    def removed_fraction(self):
+        return len(np.unique(self.removed)) / self.count if self.count else 0.0
+
+    def set_signature(self, signature):
+        self.meta['signature'] = signature
+        self.write_meta()
+
+    def compact(self):
+        """Rewrite the store without deleted rows, returns the new row of every old row (-1 if deleted)"""
+        alive = np.ones(self.count, dtype=bool)
+        alive[self.removed[self.removed < self.count]] = False
+        mapping = np.full(self.count, -1, dtype=np.int64)
+        mapping[alive] = np.arange(int(alive.sum()))
+        if self.path_table is None:
+            self.paths()
+        meta = dict(self.meta, count=int(alive.sum()), removed=0)
+        meta = self.write_files(self.path, meta, self.path_table, {
+            'vectors.bin': self.vectors[alive],
+            'norms.bin': self.norms[alive],
+            'name_ids.bin': self.name_ids[alive],
+            'path_ids.bin': self.path_ids[alive]
+        })
+        self.meta = meta
+        self.map()
+        return mapping
+
+
+def intern_strings(values):
+    """(table of distinct strings in first-seen order, int32 position of every value in it)"""
+    index = {}
+    ids = np.array([index.setdefault(value, len(index)) for value in values], dtype=np.int32)
+    return list(index), ids
+
+
+class MappedIndex(ExactIndex):
+    """Exact search straight over a GalleryStore's memory-mapped rows, scanned in chunks
+
+    Rows added after the store was mapped live in the in-memory arrays of ExactIndex, rows
+    removed from it are masked out. Without a store it behaves like ExactIndex.
+    """
+
+    kind = 'mmap'
+
+    def __init__(self, dim=128, store=None, chunk_size=16384):
+        super().__init__(dim)
+        self.chunk_size = chunk_size
+        self.store = None
+        self.base_count = 0
+        self.base_alive = np.zeros(0, dtype=bool)
+        self.base_live = 0
+        if store is not None:
+            self.attach(store)
+
+    def attach(self, store):
+        """Search the rows of store, their ids are the store row numbers"""
+        self.store = store
+        self.base_count = len(store)
+        alive = np.ones(self.base_count, dtype=bool)
+        alive[store.removed[store.removed < self.base_count]] = False
+        self.base_alive = alive
+        self.base_live = int(alive.sum())
+
+    def __len__(self):
+        return self.base_live + len(self.ids)
+
+    def remove(self, ids):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        base_ids = ids[ids < self.base_count]
+        if len(base_ids):
+            alive = self.base_alive.copy()  # copies never modify arrays a live matcher is using
+            alive[base_ids] = False
+            self.base_alive = alive
+            self.base_live = int(alive.sum())
+        return super().remove(ids[ids >= self.base_count])
+
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        distances, ids = super().search(queries, k)
+        if self.base_live == 0 or len(queries) == 0:
+            return distances, ids
+        store = self.store
+        best_sq = distances ** 2
+        best_ids = ids
+        query_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        # int8 rows are dequantized by scaling the queries instead of every chunk
+        scaled = queries * store.scales if store.scales is not None else queries
+        for start in range(0, self.base_count, self.chunk_size):
+            end = min(start + self.chunk_size, self.base_count)
+            alive = self.base_alive[start:end]
+            if not alive.any():
+                continue
+            rows = np.asarray(store.vectors[start:end], dtype=np.float32)
+            sq_dist = query_sq_norms[:, None] + store.norms[start:end][None, :] - 2.0 * (scaled @ rows.T)
+            np.maximum(sq_dist, 0.0, out=sq_dist)
+            sq_dist[:, ~alive] = np.inf
+            kk = min(k, end - start)
+            top = np.argpartition(sq_dist, kk - 1, axis=1)[:, :kk] if kk > 1 else np.argmin(sq_dist, axis=1)[:, None]
+            candidate_sq = np.concatenate([best_sq, np.take_along_axis(sq_dist, top, axis=1)], axis=1)
+            candidate_ids = np.concatenate([best_ids, top + start], axis=1)
+            order = np.argsort(candidate_sq, axis=1)[:, :k]
+            best_sq = np.take_along_axis(candidate_sq, order, axis=1)
+            best_ids = np.take_along_axis(candidate_ids, order, axis=1)
+        best_ids[~np.isfinite(best_sq)] = -1
+        return np.sqrt(best_sq).astype(np.float32), best_ids
+
+
+# Available gallery index backends, selected with 'gallery_index' in performance_config.json
+GALLERY_INDEX_BACKENDS = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex,
+    'mmap': MappedIndex
+}
+
+
+def benchmark_gallery_index(gallery_size=200000, query_count=1000, nprobes=(1, 4, 8, 16, 32), seed=0):
+    """Compare recall@1 and queries/sec of the IVF index against exact search on a synthetic gallery"""
+    rng = np.random.default_rng(seed)
+    # Face encodings cluster by identity, mimic that with noisy copies of random identity centres
+    identities = rng.normal(0, 0.1, (max(1, gallery_size // 4), 128)).astype(np.float32)
+    gallery = identities[rng.integers(0, len(identities), gallery_size)]
+    gallery = gallery + rng.normal(0, 0.03, gallery.shape).astype(np.float32)
+    queries = gallery[rng.integers(0, gallery_size, query_count)]
+    queries = queries + rng.normal(0, 0.03, queries.shape).astype(np.float32)
+
+    results = {'gallery_size': gallery_size, 'queries': query_count, 'backends': []}
+
+    exact = ExactIndex()
+    exact.build(gallery)
+    start = time.perf_counter()
+    truth = np.concatenate([exact.search(queries[i:i + 256])[1][:, 0] for i in range(0, query_count, 256)])
+    elapsed = time.perf_counter() - start
+    results['backends'].append({'backend': 'exact', 'recall@1': 1.0, 'qps': query_count / elapsed})
+
+    ivf = IVFIndex()
+    start = time.perf_counter()
+    ivf.build(gallery)
+    results['ivf_build_seconds'] = time.perf_counter() - start
+    results['ivf_nlist'] = len(ivf.centroids)
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        start = time.perf_counter()
+        found = ivf.search(queries)[1][:, 0]
+        elapsed = time.perf_counter() - start
+        results['backends'].append({
+            'backend': 'ivf',
+            'nprobe': nprobe,
+            'recall@1': float(np.mean(found == truth)),
+            'qps': query_count / elapsed
+        })
+
+    for row in results['backends']:
+        probe_text = f" nprobe={row['nprobe']}" if 'nprobe' in row else ""
+        print(f"{row['backend']}{probe_text}: recall@1={row['recall@1']:.3f}, {row['qps']:.0f} queries/sec")
+    return results
+
+
+class FaceMatcher:
+    """Known face gallery kept as one contiguous float32 matrix with a names array beside it"""
+
+    def __init__(self, encodings=(), names=(), tolerance=0.5, confidence=None, index_backend='exact', **index_options):
+        self.tolerance = tolerance
+        self.confidence = confidence or (lambda distance: 1 - distance)
+        self.index_backend = index_backend
+        self.index_options = index_options
+        self.set_gallery(encodings, names)
+
+    def set_gallery(self, encodings, names):
+        """Replace the gallery with the given encodings and names"""
+        self.names = np.array(list(names), dtype=object)
+        self.index = GALLERY_INDEX_BACKENDS[self.index_backend](**self.index_options)
+        self.index.build(encodings)
+        self.matrix = self.index.vectors
+
+    def set_store(self, store):
+        """Match directly against the memory-mapped rows of a GalleryStore"""
+        self.names = store.names()
+        self.index = MappedIndex(dim=store.dim, store=store)
+        self.matrix = store.vectors
+
+    def __len__(self):
+        return len(self.index)
+
+    def updated(self, remove_ids=(), encodings=(), names=()):
+        """Copy of this matcher with some gallery ids removed and new encodings appended
+
+        The copy reuses the trained index instead of rebuilding it, so small gallery edits
+        are cheap, and it can be swapped in while this matcher keeps serving. New
+        encodings get the ids following the current names array.
+        """
+        matcher = FaceMatcher.__new__(FaceMatcher)
+        matcher.tolerance = self.tolerance
+        matcher.confidence = self.confidence
+        matcher.index_backend = self.index_backend
+        matcher.index_options = self.index_options
+        matcher.index = self.index.copy()
+        # Removed ids keep their (unused) slot in names so every other id stays valid
+        if len(remove_ids):
+            matcher.index.remove(remove_ids)
+        names = list(names)
+        if names:
+            matcher.index.add(encodings, np.arange(len(self.names), len(self.names) + len(names)))
+        matcher.names = np.concatenate([self.names, np.array(names, dtype=object)])
+        matcher.matrix = matcher.index.vectors
+        return matcher
+
+    def match(self, face_encodings):
+        """Match all faces of a frame at once, returning (name, distance, confidence) per face"""
+        if len(face_encodings) == 0:
+            return []
+        if len(self.index) == 0:
+            return [("Unknown", float('inf'), 0) for _ in face_encodings]
+        distances, ids = self.index.search(face_encodings, k=1)
+        results = []
+        for best_id, distance in zip(ids[:, 0], distances[:, 0]):
+            distance = float(distance)
+            if best_id >= 0 and distance <= self.tolerance:
+                results.append((self.names[best_id], distance, self.confidence(distance)))
+            else:
+                results.append(("Unknown", distance, 0))
+        return results
+
+
+def load_performance_settings(config_file='performance_config.json'):
+    """Default performance settings updated with the values from config_file"""
+    settings = dict(DEFAULT_PERFORMANCE_SETTINGS)
+    if os.path.exists(config_file):
+        try:
+            with open(config_file, 'r') as f:
+                settings.update(json.load(f))
+        except Exception as e:
+            print(f"Error loading performance config: {e}")
+    return settings
+
+
+def resolve_workers(workers):
+    """Number of worker processes to use (0 or less means one per CPU)"""
+    workers = int(workers)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def load_gallery(known_people_folder, workers=0, progress=None, settings=None, partial=None, partial_seconds=1.0,
+                 return_paths=False):
+    """Encode every image under known_people_folder, returning parallel lists of encodings and names
+
+    Each recognition backend keeps its own encoding cache, so switching backends never mixes galleries.
+    partial(encodings, names) is called with the gallery built so far once the cache hits are
+    resolved and then at most every partial_seconds while new images are encoded.
+    With return_paths the image path of every encoding is returned as a third list.
+    """
+    settings = settings or DEFAULT_PERFORMANCE_SETTINGS
+    backend_name = settings.get('recognition_backend', 'hog')
+    backend = get_backend(backend_name, settings)
+    
+    cache = EncodingCache(backend.cache_file, backend.model_tag)
+    image_files = gallery_image_files(known_people_folder)
+    one_identity = bool(int(settings.get('identity_prototypes', 0)))
+    
+    # Resolve cache hits first, only new or modified images go to the pool
+    encodings_by_path = {}
+    pending = []
+    for root_dir, filename in image_files:
+        image_path = os.path.join(root_dir, filename)
+        try:
+            encodings = cache.get(image_path)
+        except Exception as e:
+            print(f"Error loading {filename}: {e}")
+            continue
+        if encodings is None:
+            pending.append(image_path)
+        else:
+            encodings_by_path[image_path] = encodings
+    
+    if partial and encodings_by_path:
+        partial(*build_gallery(known_people_folder, image_files, encodings_by_path, verbose=False,
+                               one_identity=one_identity)[:2])
+    
+    if pending:
+        workers = min(resolve_workers(workers), len(pending))
+        print(f"Encoding {len(pending)} images with {workers} worker processes")
+        last_partial = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(encode_image_file, path, backend_name, settings) for path in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    image_path, encodings, error = future.result()
+                except Exception as e:
+                    print(f"Error in enrollment worker: {e}")
+                    continue
+                if error:
+                    print(f"Error loading {os.path.basename(image_path)}: {error}")
+                else:
+                    cache.put(image_path, encodings)
+                    encodings_by_path[image_path] = encodings
+                if progress:
+                    progress(done, len(pending))
+                if partial and done < len(pending) and time.perf_counter() - last_partial >= partial_seconds:
+                    last_partial = time.perf_counter()
+                    partial(*build_gallery(known_people_folder, image_files, encodings_by_path, verbose=False,
+                                           one_identity=one_identity)[:2])
+    
+    known_encodings, known_names, known_paths = build_gallery(known_people_folder, image_files, encodings_by_path,
+                                                              one_identity=one_identity)
+    cache.prune(os.path.join(root_dir, filename) for root_dir, filename in image_files)
+    cache.save()
+    print(f"Encoding cache: {cache.hits} reused, {cache.misses} encoded")
+    print(f"Loaded {len(known_encodings)} known faces")
+    if return_paths:
+        return known_encodings, known_names, known_paths
+    return known_encodings, known_names
+
+
+def build_gallery(known_people_folder, image_files, encodings_by_path, verbose=True, one_identity=False):
+    """Gallery lists (encodings, names, image paths) of the encoded images, in walk order so names are stable"""
+    known_encodings = []
+    known_names = []
+    known_paths = []
+    for root_dir, filename in image_files:
+        image_path = os.path.join(root_dir, filename)
+        if image_path not in encodings_by_path:
+            continue
+        encodings = encodings_by_path[image_path]
+        if encodings:
+            names = gallery_face_names(known_people_folder, image_path, len(encodings), one_identity)
+            for encoding, name in zip(encodings, names):
+                known_encodings.append(encoding)
+                known_names.append(name)
+                known_paths.append(image_path)
+                if verbose:
+                    print(f"Loaded face: {name}")
+        elif verbose:
+            print(f"Warning: No face detected in {filename}")
+    return known_encodings, known_names, known_paths
+
+
+def gallery_face_names(known_people_folder, image_path, count, one_identity=False):
+    """Names of the faces found in one gallery image: its subfolder, or its file name at the top level
+
+    Several faces in one image get numbered names. With one_identity (prototype matching)
+    every face in a person's subfolder belongs to that person instead.
+    """
+    # Extract name from folder structure or filename
+    root_dir, filename = os.path.split(image_path)
+    relative_path = os.path.relpath(root_dir, known_people_folder)
+    name = os.path.splitext(filename)[0]
+    if relative_path != ".":
+        if one_identity:
+            return [relative_path] * count
+        name = f"{relative_path}"
+    if count > 1:
+        return [f"{name}_{i+1}" for i in range(count)]
+    return [name] * count
+
+
+def gallery_image_files(known_people_folder):
+    """(directory, file name) of every gallery image under the folder, in walk order"""
+    image_files = []
+    for root_dir, dirs, files in os.walk(known_people_folder):
+        for filename in files:
+            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                image_files.append((root_dir, filename))
+    return image_files
+
+
+def identity_prototypes(encodings, names, paths=None, per_identity=3, min_cluster_fraction=0.1, iterations=10):
+    """Reduce the encodings of every identity to at most per_identity prototypes
+
+    Encodings are grouped by name and clustered with k-means; each cluster is represented
+    by its mean, which sits closer to new photos of the person than any single photo does,
+    and takes the path of its medoid (the member closest to the mean). Once an identity
+    has enough encodings to tell, clusters holding less than min_cluster_fraction of them
+    are dropped as outliers (someone else in a group photo, a bad crop).
+    Returns the encodings, names and paths of the prototypes.
+    """
+    if len(names) == 0:
+        return [], [], []
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(len(names), -1)
+    paths = list(paths) if paths is not None else [None] * len(names)
+    rows_by_name = {}
+    for row, name in enumerate(names):
+        rows_by_name.setdefault(name, []).append(row)
+    
+    prototypes = []  # (row used for ordering, encoding, row whose name and path it takes)
+    for rows in rows_by_name.values():
+        rows = np.asarray(rows)
+        if len(rows) <= per_identity:
+            prototypes.extend((row, encodings[row], row) for row in rows)
+            continue
+        vectors = encodings[rows]
+        # Deterministic farthest-point initialisation starting from the encoding nearest the mean
+        first = int(np.argmin(squared_distances(vectors.mean(axis=0, keepdims=True), vectors)[0]))
+        centers = vectors[[first]]
+        for _ in range(per_identity - 1):
+            farthest = int(np.argmax(squared_distances(vectors, centers).min(axis=1)))
+            centers = np.concatenate([centers, vectors[[farthest]]])
+        for _ in range(iterations):
+            assignments = np.argmin(squared_distances(vectors, centers), axis=1)
+            for c in range(len(centers)):
+                members = vectors[assignments == c]
+                if len(members):
+                    centers[c] = members.mean(axis=0)
+        assignments = np.argmin(squared_distances(vectors, centers), axis=1)
+        min_size = min_cluster_fraction * len(rows) if len(rows) * min_cluster_fraction >= 1 else 0
+        for c in range(len(centers)):
+            members = np.flatnonzero(assignments == c)
+            if len(members) == 0 or len(members) < min_size:
+                continue
+            medoid = rows[members[np.argmin(squared_distances(centers[[c]], vectors[members])[0])]]
+            prototypes.append((medoid, centers[c].copy(), medoid))
+    
+    prototypes.sort(key=lambda prototype: prototype[0])
+    return ([encoding for _, encoding, _ in prototypes], [names[row] for _, _, row in prototypes],
+            [paths[row] for _, _, row in prototypes])
+
+
+def prototype_report(encodings, names, per_identity=3, tolerance=0.5, holdout_every=5):
+    """Top-1 accuracy and matching cost of identity prototypes against the full gallery
+
+    Every holdout_every-th encoding of an identity with at least two encodings is held out
+    as a query; the remaining encodings form the full gallery the prototypes are built from.
+    """
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(len(names), -1)
+    seen = {}
+    query_rows, gallery_rows = [], []
+    counts = {name: names.count(name) for name in set(names)}
+    for row, name in enumerate(names):
+        seen[name] = seen.get(name, 0) + 1
+        if counts[name] >= 2 and seen[name] % holdout_every == 0:
+            query_rows.append(row)
+        else:
+            gallery_rows.append(row)
+    gallery_names = [names[row] for row in gallery_rows]
+    proto_encodings, proto_names, _ = identity_prototypes(encodings[gallery_rows], gallery_names,
+                                                          per_identity=per_identity)
+    full = FaceMatcher(encodings[gallery_rows], gallery_names, tolerance=tolerance)
+    prototypes = FaceMatcher(proto_encodings, proto_names, tolerance=tolerance)
+    queries = encodings[query_rows]
+    truth = [names[row] for row in query_rows]
+    
+    results = {}
+    for label, matcher in (('full', full), ('prototypes', prototypes)):
+        start = time.perf_counter()
+        matches = matcher.match(queries)
+        elapsed = time.perf_counter() - start
+        results[label] = {
+            'entries': len(matcher),
+            'accuracy': round(float(np.mean([m[0] == t for m, t in zip(matches, truth)])), 4) if truth else None,
+            'match_ms_per_query': round(elapsed * 1000 / max(1, len(queries)), 4),
+            'names': [m[0] for m in matches]
+        }
+    agreement = np.mean([a == b for a, b in zip(results['full'].pop('names'), results['prototypes'].pop('names'))])
+    return {
+        'identities': len(counts),
+        'encodings': len(names),
+        'queries': len(query_rows),
+        'per_identity': per_identity,
+        'tolerance': tolerance,
+        'reduction': round(len(full) / max(1, len(prototypes)), 2),
+        'agreement': round(float(agreement), 4) if truth else None,
+        **results
+    }
+
+
+def scan_gallery(known_people_folder):
+    """(size, mtime) of every gallery image, keyed by path"""
+    snapshot = {}
+    for root_dir, filename in gallery_image_files(known_people_folder):
+        path = os.path.join(root_dir, filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue  # removed while scanning
+        snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def gallery_signature(snapshot):
+    """Hash of a scan_gallery snapshot, a gallery store is current when its signature matches"""
+    sha = hashlib.sha1()
+    for path, (size, mtime) in sorted(snapshot.items()):
+        sha.update(f"{path}\0{size}\0{mtime}\n".encode())
+    return sha.hexdigest()
+
+
+def open_gallery_store(settings):
+    """The configured GalleryStore, or None if there is none built with the current backend"""
+    backend = get_backend(settings.get('recognition_backend', 'hog'), settings)
+    path = f"{settings.get('gallery_store', 'known_faces_store')}_{backend.name}"
+    if not GalleryStore.exists(path):
+        return None
+    try:
+        store = GalleryStore(path)
+    except Exception as e:
+        print(f"Error opening gallery store: {e}")
+        return None
+    if store.meta.get('model') != backend.model_tag or store.dim != backend.dim:
+        print("Gallery store was built with a different model, rebuilding")
+        return None
+    return store
+
+
+def create_gallery_store(settings, encodings, names, paths, signature):
+    """Write the whole gallery to the configured GalleryStore, which also compacts it"""
+    backend = get_backend(settings.get('recognition_backend', 'hog'), settings)
+    path = f"{settings.get('gallery_store', 'known_faces_store')}_{backend.name}"
+    return GalleryStore.create(path, encodings, names, paths, dim=backend.dim,
+                               dtype=settings.get('gallery_store_dtype', 'float32'),
+                               model_tag=backend.model_tag, signature=signature)
+
+
+class GalleryWatcher:
+    """Watches the known_people folder and reports which image files changed
+
+    Uses watchdog (inotify on Linux) to notice changes immediately when it is installed
+    and otherwise polls the folder. Either way the folder is rescanned and compared with
+    the previous scan by size and mtime, so a rename shows up as a removal plus an
+    addition and bursts of events are handled in one go.
+    """
+
+    def __init__(self, folder, on_change, poll_seconds=2.0, settle_seconds=0.5):
+        self.folder = folder
+        self.on_change = on_change  # on_change(changed_paths, removed_paths)
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.event = threading.Event()
+        self.stop_event = threading.Event()
+        self.observer = None
+        self.snapshot = self.scan()
+
+    def scan(self):
+        return scan_gallery(self.folder)
+
+    def start(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+            
+            watcher = self
+            
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    watcher.event.set()
+            
+            self.observer = Observer()
+            self.observer.schedule(Handler(), self.folder, recursive=True)
+            self.observer.start()
+            print(f"Watching {self.folder} for changes")
+        except Exception:
+            self.observer = None
+            print(f"Polling {self.folder} for changes every {self.poll_seconds:g} s")
+        threading.Thread(target=self.run, name="gallery-watcher", daemon=True).start()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            # With watchdog the poll is only a safety net for missed events
+            timeout = self.poll_seconds * 10 if self.observer else self.poll_seconds
+            if self.event.wait(timeout):
+                # Let copies and editors finish writing before the files are read
+                if self.stop_event.wait(self.settle_seconds):
+                    break
+                self.event.clear()
+            snapshot = self.scan()
+            changed = [path for path, signature in snapshot.items() if self.snapshot.get(path) != signature]
+            removed = [path for path in self.snapshot if path not in snapshot]
+            self.snapshot = snapshot
+            if changed or removed:
+                try:
+                    self.on_change(changed, removed)
+                except Exception as e:
+                    print(f"Error applying gallery changes: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+        self.event.set()
+        if self.observer:
+            self.observer.stop()
+
+
+def create_matcher(settings):
+    """Create an empty matcher using the gallery index backend configured in settings"""
+    backend = settings.get('gallery_index', 'exact')
+    if backend not in GALLERY_INDEX_BACKENDS:
+        print(f"Unknown gallery index '{backend}', using exact search")
+        backend = 'exact'
+    index_options = {}
+    if backend == 'ivf':
+        index_options = {
+            'nlist': int(settings.get('ivf_nlist', 0)),
+            'nprobe': int(settings.get('ivf_nprobe', 8))
+        }
+    recognizer = get_backend(settings.get('recognition_backend', 'hog'), settings)
+    # The matching threshold depends on the backend's embedding space unless overridden
+    tolerance = float(settings.get('match_tolerance', 0)) or recognizer.tolerance
+    return FaceMatcher(tolerance=tolerance, confidence=recognizer.confidence,
+                       index_backend=backend, **index_options)
+
+
+def detect_and_encode(frame, scale=1.0, upsample=1, backend_name='hog', options=None):
+    """Detect and encode all faces in a BGR frame, returning full-size locations and encodings"""
+    backend = get_backend(backend_name, options)
+    small_frame = frame if scale == 1.0 else cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    image = backend.prepare(small_frame)
+    face_locations = backend.detect(image, upsample)
+    face_encodings = backend.embed(image, face_locations)
+    face_locations = [tuple(int(round(v / scale)) for v in box) for box in face_locations]
+    return face_locations, face_encodings
+
+
+def detect_and_encode_image_file(image_path, scale=1.0, upsample=1, backend_name='hog', options=None):
+    """Worker entry point: load an image file from disk and detect/encode its faces"""
+    frame = cv2.imread(image_path)
+    if frame is None:
+        raise ValueError(f"could not read image {image_path}")
+    return detect_and_encode(frame, scale, upsample, backend_name, options)
+
+
+def detect_tile(tile, upsample=0, backend_name='hog', options=None):
+    """Worker entry point: detect the faces in one BGR tile, boxes in tile coordinates
+
+    A negative upsample uses the backend's default.
+    """
+    backend = get_backend(backend_name, options)
+    if upsample < 0:
+        upsample = backend.default_upsample
+    return backend.detect(backend.prepare(tile), upsample)
+
+
+def encode_face_crops(crops, backend_name='hog', options=None):
+    """Worker entry point: encode a list of (BGR crop, box in the crop) faces"""
+    backend = get_backend(backend_name, options)
+    return embed_items(backend, [(backend.prepare(crop), box) for crop, box in crops])
+
+
+def tile_plan(height, width, tile_size=1024, overlap=256):
+    """(scale, top, left, bottom, right) tiles of an image pyramid, coordinates at that scale
+
+    The pyramid halves the image until it fits in one tile: full-resolution tiles find the
+    small faces in the back rows, the coarse levels find faces too large for one tile.
+    Tiles overlap so a face cut by one tile border lies whole inside its neighbour.
+    """
+    tiles = []
+    scale = 1.0
+    while True:
+        scaled_height, scaled_width = int(height * scale), int(width * scale)
+        step = tile_size - overlap
+        for top in range(0, max(1, scaled_height - overlap), step):
+            for left in range(0, max(1, scaled_width - overlap), step):
+                tiles.append((scale, top, left, min(scaled_height, top + tile_size), min(scaled_width, left + tile_size)))
+        if max(scaled_height, scaled_width) <= tile_size:
+            return tiles
+        scale /= 2
+
+
+def non_max_suppression(boxes, scores, iou_threshold=0.4, containment=0.8):
+    """Indices of the boxes to keep, best score first
+
+    A box is a duplicate when it overlaps a kept box by iou_threshold or lies mostly
+    (containment of its area) inside it, which catches the same face found at two scales.
+    """
+    keep = []
+    for i in sorted(range(len(boxes)), key=lambda i: scores[i], reverse=True):
+        top, right, bottom, left = boxes[i]
+        area = max(1, (right - left) * (bottom - top))
+        duplicate = False
+        for j in keep:
+            k_top, k_right, k_bottom, k_left = boxes[j]
+            intersection = (max(0, min(right, k_right) - max(left, k_left)) *
+                            max(0, min(bottom, k_bottom) - max(top, k_top)))
+            k_area = max(1, (k_right - k_left) * (k_bottom - k_top))
+            if (box_iou(boxes[i], boxes[j]) >= iou_threshold
+                    or intersection >= containment * min(area, k_area)):
+                duplicate = True
+                break
+        if not duplicate:
+            keep.append(i)
+    return keep
+
+
+def detect_and_encode_tiled(image, executor, backend_name='hog', options=None, tile_size=1024, overlap=256,
+                            upsample=-1, encode_size=300, encode_chunk=8):
+    """Tiled multi-scale detection and parallel encoding of one large BGR image
+
+    Tiles and face crops are spread over the executor's worker processes. Only the
+    full-resolution tiles are upsampled (a negative upsample is the backend's default),
+    the small faces of a coarser level are found by the finer one below it. Faces are
+    encoded from padded crops shrunk to at most encode_size pixels, which is all the
+    encoder needs. Returns (locations, encodings, stats) with locations in image coordinates.
+    """
+    height, width = image.shape[:2]
+    stats = {}
+    start = time.perf_counter()
+    tiles = tile_plan(height, width, tile_size, overlap)
+    levels = {}
+    futures = []
+    for tile in tiles:
+        scale, top, left, bottom, right = tile
+        if scale not in levels:
+            levels[scale] = image if scale == 1.0 else cv2.resize(image, (int(width * scale), int(height * scale)),
+                                                                 interpolation=cv2.INTER_AREA)
+        futures.append((tile, executor.submit(detect_tile, levels[scale][top:bottom, left:right],
+                                              upsample if scale == 1.0 else 0, backend_name, options)))
+    boxes, scores = [], []
+    for (scale, top, left, bottom, right), future in futures:
+        level_height, level_width = levels[scale].shape[:2]
+        for b_top, b_right, b_bottom, b_left in future.result():
+            # Faces cut by an inner tile border are partial, prefer their whole copy from the neighbour tile
+            cut = ((b_top <= 1 and top > 0) or (b_left <= 1 and left > 0)
+                   or (b_bottom >= bottom - top - 1 and bottom < level_height)
+                   or (b_right >= right - left - 1 and right < level_width))
+            box = (int((top + b_top) / scale), int((left + b_right) / scale),
+                   int((top + b_bottom) / scale), int((left + b_left) / scale))
+            boxes.append(box)
+            scores.append((box[1] - box[3]) * (box[2] - box[0]) * (0.25 if cut else 1.0))
+    locations = [boxes[i] for i in non_max_suppression(boxes, scores)]
+    stats['tiles'] = len(tiles)
+    stats['scales'] = len(levels)
+    stats['detect_seconds'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    crops = []
+    for box in locations:
+        crop, crop_box = crop_face(image, box)
+        factor = encode_size / max(crop.shape[:2])
+        if factor < 1:
+            crop = cv2.resize(crop, (0, 0), fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            crop_box = tuple(int(v * factor) for v in crop_box)
+        crops.append((crop, crop_box))
+    chunks = [executor.submit(encode_face_crops, crops[i:i + encode_chunk], backend_name, options)
+              for i in range(0, len(crops), encode_chunk)]
+    encodings = [encoding for chunk in chunks for encoding in chunk.result()]
+    stats['encode_seconds'] = time.perf_counter() - start
+    return locations, encodings, stats
+
+
+def face_color(index, is_known=False):
+    """Get a unique color for each face"""
+    if is_known:
+        colors = [(0, 255, 0), (0, 200, 50), (50, 255, 50), (0, 255, 100), (100, 255, 0)]
+    else:
+        colors = [(0, 0, 255), (50, 0, 200), (100, 0, 255), (0, 50, 255), (200, 0, 100)]
+    
+    return colors[index % len(colors)]
+
+
+def draw_face_boxes(frame, face_locations, face_names):
+    """Draw a box and a name label for every face onto a BGR frame"""
+    face_count = len(face_locations)
+    for i, ((top, right, bottom, left), (name, confidence)) in enumerate(zip(face_locations, face_names)):
+        # Always use red for unknown faces, other colors for known faces
+        if name == "Unknown":
+            color = (0, 0, 255)  # Red for unknown faces
+        else:
+            color = face_color(i, is_known=True)  # Other colors for known faces
+        
+        cv2.rectangle(frame, (left, top), (right, bottom), color, 3)
+        
+        label_height = 40
+        cv2.rectangle(frame, (left, bottom - label_height), (right, bottom), color, cv2.FILLED)
+        
+        display_text = f"{name}"
+        if name != "Unknown" and confidence > 0:
+            display_text = f"{name} ({confidence:.2f})"
+        
+        if face_count > 1:
+            display_text = f"#{i+1} {display_text}"
+        
+        font = cv2.FONT_HERSHEY_DUPLEX
+        cv2.putText(frame, display_text, (left + 6, bottom - 10), font, 0.6, (255, 255, 255), 2)
+        cv2.putText(frame, display_text, (left + 6, bottom - 10), font, 0.6, (0, 0, 0), 1)
+    
+    if face_count > 0:
+        count_text = f"Faces: {face_count}"
+        cv2.putText(frame, count_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 3)
+        cv2.putText(frame, count_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+
+
+def draw_caption(frame, text):
+    """Draw one line of outlined text at the bottom left of a BGR or RGB frame"""
+    height = frame.shape[0]
+    cv2.putText(frame, text, (10, height - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 3)
+    cv2.putText(frame, text, (10, height - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+
+
+class OverlayLayer:
+    """Overlay pixels drawn once onto a keyed background and blended into frames until it changes"""
+
+    KEY = (1, 2, 3)  # background color of the layer, never used by the drawing code
+
+    def __init__(self, height, width, draw):
+        layer = np.empty((height, width, 3), dtype=np.uint8)
+        layer[:] = self.KEY
+        draw(layer)
+        self.shape = (height, width)
+        # Boxes and labels cover a small part of the frame, so only those pixels are kept
+        pixels = layer.reshape(-1, 3)
+        self.indices = np.flatnonzero(np.any(pixels != self.KEY, axis=1))
+        self.values = pixels[self.indices][:, ::-1]  # BGR to RGB
+
+    def apply(self, rgb):
+        """Copy the overlay pixels into a contiguous RGB image of the same size in place"""
+        if len(self.indices):
+            rgb.reshape(-1, 3)[self.indices] = self.values
+
+
+class FrameRenderer:
+    """Renders BGR frames into one Tk PhotoImage through buffers allocated once per output size
+
+    The RGB buffer, the per-tile scaling buffers and the PIL image are reused every
+    frame and the PhotoImage is updated in place with paste(), so steady-state rendering
+    does not allocate full-frame buffers or Tk images.
+    """
+
+    def __init__(self, width=800, height=600):
+        self.width = width
+        self.height = height
+        self.rgb = None
+        self.image = None
+        self.photo = None
+        self.tile_buffers = {}
+
+    def ensure_buffers(self, height, width):
+        if self.rgb is not None and self.rgb.shape[:2] == (height, width):
+            return
+        self.rgb = np.zeros((height, width, 3), dtype=np.uint8)
+        self.image = Image.new('RGB', (width, height))
+        self.photo = None
+        self.tile_buffers = {}
+
+    def layout(self, count):
+        """Tile size and (top, left) corner of every source in the grid"""
+        cols = int(np.ceil(np.sqrt(count)))
+        rows = int(np.ceil(count / cols))
+        tile_width, tile_height = self.width // cols, self.height // rows
+        corners = [(i // cols * tile_height, i % cols * tile_width) for i in range(count)]
+        return tile_width, tile_height, rows, cols, corners
+
+    def compose(self, frames, overlays=None, captions=None):
+        """Convert the frames into the RGB buffer, scaling them into a grid when there are several
+
+        overlays[i] is an OverlayLayer drawn for the size of tile i, or None.
+        captions[i] is a line of text drawn straight onto tile i, for counters that change every frame.
+        Returns the RGB buffer.
+        """
+        overlays = overlays or [None] * len(frames)
+        captions = captions or [""] * len(frames)
+        if len(frames) == 1 and frames[0] is not None:
+            height, width = frames[0].shape[:2]
+            self.ensure_buffers(height, width)
+            cv2.cvtColor(frames[0], cv2.COLOR_BGR2RGB, dst=self.rgb)
+            if overlays[0] is not None:
+                overlays[0].apply(self.rgb)
+            if captions[0]:
+                draw_caption(self.rgb, captions[0])
+            return self.rgb
+        
+        tile_width, tile_height, rows, cols, corners = self.layout(len(frames))
+        self.ensure_buffers(tile_height * rows, tile_width * cols)
+        for i, (frame, (top, left)) in enumerate(zip(frames, corners)):
+            region = self.rgb[top:top + tile_height, left:left + tile_width]
+            if frame is None:
+                region[:] = 0
+                continue
+            buffers = self.tile_buffers.get(i)
+            if buffers is None:
+                buffers = self.tile_buffers[i] = (np.empty((tile_height, tile_width, 3), dtype=np.uint8),
+                                                  np.empty((tile_height, tile_width, 3), dtype=np.uint8))
+            scaled, converted = buffers
+            cv2.resize(frame, (tile_width, tile_height), dst=scaled, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(scaled, cv2.COLOR_BGR2RGB, dst=converted)
+            if overlays[i] is not None:
+                overlays[i].apply(converted)
+            if captions[i]:
+                draw_caption(converted, captions[i])
+            region[:] = converted
+        return self.rgb
+
+    def present(self):
+        """Copy the RGB buffer into the PhotoImage; returns (photo, created) so callers attach new ones"""
+        self.image.frombytes(self.rgb)
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(image=self.image)
+            return self.photo, True
+        self.photo.paste(self.image)
+        return self.photo, False
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None if it cannot be measured"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def latency_summary(samples):
+    """p50/p95/p99/mean latency in ms and throughput per second for a list of durations in seconds"""
+    if not samples:
+        return {'count': 0}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'count': len(samples),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+        'throughput_per_sec': round(1000 / float(ms.mean()), 2) if ms.mean() > 0 else None
+    }
+
+
+def grid_face_boxes(width, height, count):
+    """count evenly spread (top, right, bottom, left) boxes, used when a clip has no real faces"""
+    cols = int(np.ceil(np.sqrt(count)))
+    rows = int(np.ceil(count / cols))
+    size = max(20, min(width // cols, height // rows) - 10)
+    boxes = []
+    for i in range(count):
+        row, col = divmod(i, cols)
+        top, left = row * (height // rows) + 5, col * (width // cols) + 5
+        boxes.append((top, left + size, top + size, left))
+    return boxes
+
+
+def benchmark_pipeline(clip=None, frames=100, settings=None, gallery_sizes=(100, 1000, 10000, 100000),
+                       faces_per_frame=(1, 5, 10, 30), match_repeats=50, seed=0):
+    """Time every stage of the recognition pipeline offline and return the results as a dict
+
+    Stages: decode, resize/color-convert, detect, encode, match, overlay drawing and
+    PhotoImage conversion. Matching is swept over gallery size and faces per frame on a
+    synthetic gallery; encoding is swept over faces per frame.
+    """
+    settings = settings or load_performance_settings()
+    backend_name = settings.get('recognition_backend', 'hog')
+    backend = get_backend(backend_name, settings)
+    scale = float(settings.get('detection_scale', 0.5))
+    upsample = int(settings.get('detection_upsample', 1))
+    rng = np.random.default_rng(seed)
+    timings = {stage: [] for stage in ('decode', 'preprocess', 'detect', 'encode', 'match',
+                                       'overlay', 'display_convert', 'photoimage')}
+    
+    # Source frames: a recorded clip, or a synthetic 800x600 sequence
+    cap = cv2.VideoCapture(clip) if clip else None
+    if cap is not None and not cap.isOpened():
+        raise ValueError(f"could not open clip {clip}")
+    synthetic = rng.integers(0, 255, (600, 800, 3), dtype=np.uint8)
+    
+    # PhotoImage conversion needs a Tk interpreter; skip it on machines without a display
+    tk_root = None
+    try:
+        tk_root = tk.Tk()
+        tk_root.withdraw()
+    except tk.TclError:
+        print("No display available, skipping PhotoImage conversion timings", file=sys.stderr)
+    
+    matcher = create_matcher(settings)
+    gallery = rng.normal(0, 0.1, (1000, backend.dim)).astype(np.float32)
+    matcher.set_gallery(gallery, [f"person_{i}" for i in range(len(gallery))])
+    
+    renderer = FrameRenderer()
+    sample_frame = None
+    for _ in range(frames):
+        start = time.perf_counter()
+        if cap is not None:
+            ret, frame = cap.read()
+            if not ret:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = cap.read()
+                if not ret:
+                    break
+        else:
+            frame = synthetic.copy()
+        timings['decode'].append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+        image = backend.prepare(small_frame)
+        timings['preprocess'].append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        locations = backend.detect(image, upsample)
+        timings['detect'].append(time.perf_counter() - start)
+        
+        if not locations:
+            locations = grid_face_boxes(image.shape[1], image.shape[0], 1)
+        start = time.perf_counter()
+        encodings = backend.embed(image, locations)
+        timings['encode'].append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        matches = matcher.match(encodings)
+        timings['match'].append(time.perf_counter() - start)
+        
+        full_locations = [tuple(int(round(v / scale)) for v in box) for box in locations]
+        start = time.perf_counter()
+        draw_face_boxes(frame, full_locations, [(name, confidence) for name, distance, confidence in matches])
+        timings['overlay'].append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        renderer.compose([frame])
+        timings['display_convert'].append(time.perf_counter() - start)
+        if tk_root is not None:
+            start = time.perf_counter()
+            renderer.present()
+            timings['photoimage'].append(time.perf_counter() - start)
+        sample_frame = small_frame
+    if cap is not None:
+        cap.release()
+    if tk_root is not None:
+        tk_root.destroy()
+    
+    # Encoding cost as the number of faces in view grows
+    encode_sweep = []
+    if sample_frame is not None:
+        image = backend.prepare(sample_frame)
+        for faces in faces_per_frame:
+            boxes = grid_face_boxes(image.shape[1], image.shape[0], faces)
+            samples = []
+            for _ in range(max(1, frames // 10)):
+                start = time.perf_counter()
+                backend.embed(image, boxes)
+                samples.append(time.perf_counter() - start)
+            encode_sweep.append({'faces': faces, **latency_summary(samples)})
+    
+    # Matching cost over gallery size x faces per frame
+    match_sweep = []
+    for gallery_size in gallery_sizes:
+        gallery = rng.normal(0, 0.1, (gallery_size, backend.dim)).astype(np.float32)
+        matcher = create_matcher(settings)
+        matcher.set_gallery(gallery, [f"person_{i}" for i in range(gallery_size)])
+        for faces in faces_per_frame:
+            queries = gallery[rng.integers(0, gallery_size, faces)] + rng.normal(0, 0.01, (faces, backend.dim)).astype(np.float32)
+            samples = []
+            for _ in range(match_repeats):
+                start = time.perf_counter()
+                matcher.match(queries)
+                samples.append(time.perf_counter() - start)
+            match_sweep.append({'gallery_size': gallery_size, 'faces': faces, **latency_summary(samples)})
+    
+    commit = None
+    try:
+        import subprocess
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        pass
+    
+    return {
+        'commit': commit,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'clip': clip,
+        'frames': len(timings['decode']),
+        'backend': backend_name,
+        'gallery_index': settings.get('gallery_index', 'exact'),
+        'scale': scale,
+        'upsample': upsample,
+        'stages': {stage: latency_summary(samples) for stage, samples in timings.items()},
+        'encode_sweep': encode_sweep,
+        'match_sweep': match_sweep,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+class ResultCache:
+    """Per-file bulk recognition results on disk, keyed by file content hash and detection settings
+
+    An entry keeps the boxes and encodings of every processed frame of one file, plus the
+    matches and the version of the gallery they were made against. A changed gallery only
+    costs a re-match of the stored encodings; nothing is decoded or detected again.
+    """
+
+    def __init__(self, directory='bulk_results_cache', tag=''):
+        self.directory = directory
+        self.tag = tag  # model and detection settings, results made with other settings never match
+        self.index_file = os.path.join(directory, 'files.pkl')
+        self.files = {}  # path -> (size, mtime, content hash)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'rb') as f:
+                    self.files = pickle.load(f)
+            except Exception as e:
+                print(f"Error loading result cache index: {e}", file=sys.stderr)
+
+    def entry_file(self, path):
+        key = hashlib.sha1(f"{file_content_hash(path, self.files)}/{self.tag}".encode()).hexdigest()
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, path):
+        """Cached {'gallery_version', 'frames': [(frame_index, locations, encodings, matches)]} or None"""
+        entry_file = self.entry_file(path)
+        entry = None
+        if os.path.exists(entry_file):
+            try:
+                with open(entry_file, 'rb') as f:
+                    entry = pickle.load(f)
+            except Exception as e:
+                print(f"Error loading cached results of {path}: {e}", file=sys.stderr)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, path, frames, gallery_version):
+        write_pickle_atomic(self.entry_file(path), {'gallery_version': gallery_version, 'frames': frames})
+
+    def save(self):
+        write_pickle_atomic(self.index_file, self.files)
+
+
+def write_pickle_atomic(path, data):
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, path)
+
+
+def gallery_version(matcher):
+    """Content hash of a matcher's gallery and threshold, cached matches are redone when it changes"""
+    sha = hashlib.sha1(f"{matcher.tolerance}/{len(matcher)}/".encode())
+    sha.update("\0".join(str(name) for name in matcher.names).encode())
+    sha.update(np.ascontiguousarray(matcher.matrix).tobytes())
+    return sha.hexdigest()
+
+
+class HeadlessRecognizer:
+    """Recognition over image folders, video files and streams without Tk, writing JSONL or CSV"""
+
+    VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+    def __init__(self, settings, workers=0, stride=1, scale=0.5, upsample=1,
+                 output_format='jsonl', output=None, known_people_folder="./known_people", cache_folder=None,
+                 log=None):
+        self.settings = settings
+        self.workers = resolve_workers(workers)
+        self.stride = max(1, stride)
+        self.scale = scale
+        self.upsample = upsample
+        self.output_format = output_format
+        self.output = output or sys.stdout
+        self.log = log or sys.stderr  # progress and errors, kept off the results stream
+        self.known_people_folder = known_people_folder
+        self.matcher = create_matcher(settings)
+        self.cache = None
+        if cache_folder:
+            backend = get_backend(settings.get('recognition_backend', 'hog'), settings)
+            self.cache = ResultCache(cache_folder, f"{backend.model_tag}/scale={scale}/upsample={upsample}/stride={self.stride}")
+        self.csv_writer = None
+        self.current = None  # the file whose results are being written, see collect
+        self.gallery_version = None
+        self.stop_event = threading.Event()
+        # Progress, read by the GUI while run() is going
+        self.files_total = 0
+        self.files_done = 0
+        self.cached_files = 0
+        self.current_source = None
+        self.started = None
+        self.frames = 0
+        self.faces = 0
+
+    def load_gallery(self):
+        """Load the same known_people gallery the GUI uses"""
+        if not os.path.exists(self.known_people_folder):
+            print(f"Warning: '{self.known_people_folder}' does not exist, every face will be Unknown", file=self.log)
+            return
+        # Results may be streamed to stdout, keep the gallery log on the log stream
+        with contextlib.redirect_stdout(self.log):
+            encodings, names = load_gallery(self.known_people_folder, self.settings.get('enrollment_workers', 0),
+                                            settings=self.settings)
+        self.matcher.set_gallery(encodings, names)
+
+    def write_result(self, source, frame_index, face_locations, face_encodings, matches=None):
+        """Match the faces of one frame (unless matches are given) and write them to the output stream"""
+        if matches is None:
+            matches = self.matcher.match(face_encodings)
+        self.frames += 1
+        self.faces += len(matches)
+        if self.output_format == 'csv':
+            if self.csv_writer is None:
+                self.csv_writer = csv.writer(self.output)
+                self.csv_writer.writerow(['Source', 'Frame', 'Top', 'Right', 'Bottom', 'Left',
+                                          'Name', 'Distance', 'Confidence'])
+            for (top, right, bottom, left), (name, distance, confidence) in zip(face_locations, matches):
+                self.csv_writer.writerow([source, frame_index, top, right, bottom, left,
+                                          name, f"{distance:.4f}", f"{confidence:.4f}"])
+        else:
+            record = {
+                'source': source,
+                'frame': frame_index,
+                'faces': [{'box': [int(v) for v in box], 'name': str(name),
+                           'distance': round(distance, 4) if np.isfinite(distance) else None,
+                           'confidence': round(confidence, 4)}
+                          for box, (name, distance, confidence) in zip(face_locations, matches)]
+            }
+            self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+        return matches
+
+    def job_options(self):
+        """Arguments after the image/frame passed to the detect_and_encode worker functions"""
+        return (self.scale, self.upsample, self.settings.get('recognition_backend', 'hog'), self.settings)
+
+    def expand_sources(self, sources):
+        """Image and video files of every folder in sources, other sources as they are"""
+        files = []
+        for source in sources:
+            if os.path.isdir(source):
+                for root_dir, dirs, filenames in os.walk(source):
+                    dirs.sort()
+                    for filename in sorted(filenames):
+                        if filename.lower().endswith(self.IMAGE_EXTENSIONS + self.VIDEO_EXTENSIONS):
+                            files.append(os.path.join(root_dir, filename))
+            else:
+                files.append(source)
+        return files
+
+    def iter_jobs(self, sources):
+        """Yield (source, frame_index, callable, args) for every image and every stride-th video frame
+
+        Frames of files in the result cache are yielded with callable None and the cached
+        (locations, encodings, matches) as args; matches is None when the gallery changed.
+        """
+        for source in sources:
+            if self.stop_event.is_set():
+                return
+            entry = self.cache.get(source) if self.cache and os.path.isfile(source) else None
+            if entry is not None:
+                same_gallery = entry['gallery_version'] == self.gallery_version
+                for frame_index, locations, encodings, matches in entry['frames']:
+                    yield source, frame_index, None, (locations, encodings, matches if same_gallery else None)
+                continue
+            if source.lower().endswith(self.IMAGE_EXTENSIONS):
+                yield source, 0, detect_and_encode_image_file, (source,) + self.job_options()
+            else:
+                # Video files and stream URLs (rtsp://, http://) are both opened by VideoCapture
+                cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+                if not cap.isOpened():
+                    print(f"Error: could not open source {source}", file=self.log)
+                    continue
+                frame_index = 0
+                try:
+                    while not self.stop_event.is_set():
+                        if frame_index % self.stride:
+                            if not cap.grab():
+                                break
+                        else:
+                            ret, frame = cap.read()
+                            if not ret:
+                                break
+                            yield source, frame_index, detect_and_encode, (frame,) + self.job_options()
+                        frame_index += 1
+                finally:
+                    cap.release()
+
+    def run(self, sources):
+        """Process all sources through a process pool, writing results in input order
+
+        Decoding (in the workers for images, here for videos), detection and encoding of
+        up to two jobs per worker overlap, and results are written as each frame completes.
+        """
+        start = self.started = time.perf_counter()
+        sources = self.expand_sources(sources)
+        self.files_total = len(sources)
+        if self.cache:
+            self.gallery_version = gallery_version(self.matcher)
+        max_in_flight = self.workers * 2
+        in_flight = deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for source, frame_index, func, args in self.iter_jobs(sources):
+                if func is None:
+                    future = Future()
+                    future.set_result(args)
+                else:
+                    future = executor.submit(func, *args)
+                in_flight.append((source, frame_index, future))
+                while len(in_flight) >= max_in_flight or (in_flight and in_flight[0][2].done()):
+                    self.collect(*in_flight.popleft())
+            while in_flight:
+                self.collect(*in_flight.popleft())
+        self.finish_file()
+        if self.cache:
+            self.cache.save()
+        elapsed = time.perf_counter() - start
+        summary = {
+            'files': self.files_done,
+            'cached_files': self.cached_files,
+            'frames': self.frames,
+            'faces': self.faces,
+            'seconds': round(elapsed, 3),
+            'frames_per_second': round(self.frames / elapsed, 2) if elapsed > 0 else 0,
+            'faces_per_second': round(self.faces / elapsed, 2) if elapsed > 0 else 0
+        }
+        print(f"Processed {summary['files']} files ({summary['cached_files']} from the result cache), "
+              f"{summary['frames']} frames, {summary['faces']} faces in {summary['seconds']}s: "
+              f"{summary['frames_per_second']} frames/sec, {summary['faces_per_second']} faces/sec", file=self.log)
+        return summary
+
+    def collect(self, source, frame_index, future):
+        """Wait for one job and write its result, skipping sources that failed"""
+        if self.current is None or self.current['source'] != source:
+            self.finish_file()
+            self.current = {'source': source, 'frames': [], 'from_cache': False, 'rematched': False}
+            self.current_source = source
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error processing {source} frame {frame_index}: {e}", file=self.log)
+            self.current['frames'] = None  # never cache a file with failed frames
+            return
+        face_locations, face_encodings = result[:2]
+        matches = None
+        if len(result) > 2:  # from the result cache, matches is None when the gallery changed since
+            matches = result[2]
+            self.current['from_cache'] = True
+            self.current['rematched'] |= matches is None
+        matches = self.write_result(source, frame_index, face_locations, face_encodings, matches)
+        if self.current['frames'] is not None:
+            self.current['frames'].append((frame_index, face_locations, face_encodings, matches))
+
+    def finish_file(self):
+        """Count the file whose frames were just written and store its results in the cache"""
+        if self.current is None:
+            return
+        current, self.current = self.current, None
+        self.files_done += 1
+        self.cached_files += current['from_cache']
+        # Cached files are only written back when their matches were redone against a changed gallery
+        changed = not current['from_cache'] or current['rematched']
+        if (self.cache and changed and current['frames'] and os.path.isfile(current['source'])
+                and not self.stop_event.is_set()):
+            try:
+                self.cache.put(current['source'], current['frames'], self.gallery_version)
+            except Exception as e:
+                print(f"Error caching results of {current['source']}: {e}", file=self.log)
+
+    def progress(self):
+        """One line of progress and throughput for the GUI"""
+        elapsed = time.perf_counter() - self.started if self.started else 0
+        rate = self.frames / elapsed if elapsed > 0 else 0
+        current = f" - {os.path.basename(self.current_source)}" if self.current_source else ""
+        return (f"Bulk: {self.files_done}/{self.files_total} files ({self.cached_files} cached), "
+                f"{self.frames} frames, {self.faces} faces, {rate:.1f} frames/sec{current}")
+
+
+def encode_image(image, quality=90):
+    """JPEG + base64 text of a BGR image, as sent to the recognition service"""
+    ok, data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("could not encode image")
+    return base64.b64encode(data.tobytes()).decode('ascii')
+
+
+def decode_image(text):
+    image = cv2.imdecode(np.frombuffer(base64.b64decode(text), np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("could not decode image")
+    return image
+
+
+class EncodeBatcher:
+    """Encodes and matches faces from every client of the service in shared micro-batches
+
+    The first face to arrive opens a window of window_ms; everything submitted until it
+    closes (or until max_batch faces are waiting) is encoded and matched in one pass, so
+    the matcher does one search for many clients instead of one per request. Submissions
+    beyond max_pending waiting faces are refused with queue.Full so overload shows up at
+    the clients instead of as growing latency.
+    """
+
+    def __init__(self, backend, get_matcher, window_ms=10, max_batch=32, max_pending=128):
+        self.backend = backend
+        self.get_matcher = get_matcher
+        self.window_seconds = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.jobs = deque()
+        self.pending = 0
+        self.condition = threading.Condition()
+        self.stopped = False
+        # Statistics
+        self.batches = 0
+        self.batched_faces = 0
+        self.rejected = 0
+
+    def submit(self, items):
+        """Queue (image, box) pairs, returns a Future with their (name, distance, confidence) matches"""
+        future = Future()
+        if not items:
+            future.set_result([])
+            return future
+        with self.condition:
+            if self.pending + len(items) > self.max_pending:
+                self.rejected += 1
+                raise queue.Full(f"{self.pending} faces already waiting")
+            self.jobs.append((items, future, time.perf_counter()))
+            self.pending += len(items)
+            self.condition.notify()
+        return future
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    break
+                deadline = self.jobs[0][2] + self.window_seconds
+                while self.pending < self.max_batch and not self.stopped:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = [self.jobs.popleft()]
+                faces = len(batch[0][0])
+                while self.jobs and faces + len(self.jobs[0][0]) <= self.max_batch:
+                    batch.append(self.jobs.popleft())
+                    faces += len(batch[-1][0])
+                self.pending -= faces
+            self.process(batch, faces)
+
+    def process(self, batch, faces):
+        start = time.perf_counter()
+        for _, _, submitted in batch:
+            METRICS.observe('service_queue_wait', start - submitted)
+        try:
+            items = [item for job_items, _, _ in batch for item in job_items]
+            with METRICS.timer('encode'):
+                encodings = embed_items(self.backend, items)
+            with METRICS.timer('match'):
+                matches = self.get_matcher().match(encodings)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        position = 0
+        for job_items, future, _ in batch:
+            future.set_result(matches[position:position + len(job_items)])
+            position += len(job_items)
+        self.batches += 1
+        self.batched_faces += faces
+        METRICS.observe('service_batch', time.perf_counter() - start)
+        METRICS.set_gauge('service_mean_batch_faces', self.batched_faces / self.batches)
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        # Nobody will encode what is still queued
+        while self.jobs:
+            self.jobs.popleft()[1].set_exception(queue.Full("service stopped"))
+
+
+class RecognitionService:
+    """Local HTTP recognition service shared by thin clients
+
+    POST /detect     {"client", "image", "upsample"} -> {"boxes"}
+    POST /recognize  {"client", "faces": [{"image", "box"}]} -> {"faces": [{"box", "name", "distance", "confidence"}]}
+                     or {"client", "image"} to detect and recognize a whole frame in one call
+    GET  /stats      per-client request latencies, batch sizes and rejections
+
+    Images are base64 JPEG (see encode_image). Connections are kept alive so clients can
+    reuse them, and a busy batcher answers 503 with Retry-After.
+    """
+
+    def __init__(self, settings, host='127.0.0.1', port=9200, known_people_folder="./known_people"):
+        self.settings = settings
+        self.host = host
+        self.port = port
+        self.known_people_folder = known_people_folder
+        self.backend = get_backend(settings.get('recognition_backend', 'hog'), settings)
+        self.matcher = create_matcher(settings)
+        self.batcher = EncodeBatcher(self.backend, lambda: self.matcher,
+                                     window_ms=float(settings.get('service_batch_window_ms', 10)),
+                                     max_batch=int(settings.get('service_max_batch', 32)),
+                                     max_pending=int(settings.get('service_max_pending', 128)))
+        # Detection runs on the request threads, bounded so many clients cannot oversubscribe the CPU
+        self.detect_slots = threading.Semaphore(max(1, int(settings.get('service_detect_workers', 0)) or os.cpu_count() or 1))
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def load_gallery(self):
+        if not os.path.exists(self.known_people_folder):
+            print(f"Warning: '{self.known_people_folder}' does not exist, every face will be Unknown")
+            return
+        settings = self.settings
+        encodings, names = load_gallery(self.known_people_folder, settings.get('enrollment_workers', 0), settings=settings)
+        per_identity = int(settings.get('identity_prototypes', 0))
+        if per_identity:
+            encodings, names, _ = identity_prototypes(
+                encodings, names, per_identity=per_identity,
+                min_cluster_fraction=float(settings.get('prototype_min_cluster_fraction', 0.1)))
+        matcher = create_matcher(settings)
+        matcher.set_gallery(encodings, names)
+        self.matcher = matcher
+
+    def record(self, client, endpoint, seconds, faces=0, rejected=False):
+        with self.lock:
+            stats = self.clients.get(client)
+            if stats is None:
+                stats = self.clients[client] = {'requests': 0, 'faces': 0, 'rejected': 0, 'latency': {}}
+            stats['requests'] += 1
+            stats['faces'] += faces
+            stats['rejected'] += int(rejected)
+            if not rejected:
+                histogram = stats['latency'].get(endpoint)
+                if histogram is None:
+                    histogram = stats['latency'][endpoint] = RollingHistogram()
+                histogram.observe(seconds)
+
+    def stats(self):
+        with self.lock:
+            clients = {client: {'requests': stats['requests'], 'faces': stats['faces'], 'rejected': stats['rejected'],
+                                'latency_ms': {endpoint: histogram.percentiles()
+                                               for endpoint, histogram in stats['latency'].items()}}
+                       for client, stats in self.clients.items()}
+        batcher = self.batcher
+        return {
+            'gallery_size': len(self.matcher),
+            'pending_faces': batcher.pending,
+            'batches': batcher.batches,
+            'mean_batch_faces': round(batcher.batched_faces / batcher.batches, 2) if batcher.batches else 0,
+            'rejected': batcher.rejected,
+            'clients': clients
+        }
+
+    def detect(self, image, upsample):
+        """Boxes in a prepared image"""
+        with self.detect_slots:
+            return [[int(v) for v in box] for box in self.backend.detect(image, upsample)]
+
+    def handle(self, path, request):
+        """Answer one POST, returns the response object"""
+        upsample = int(request.get('upsample', self.backend.default_upsample))
+        if path == '/detect':
+            return {'boxes': self.detect(self.backend.prepare(decode_image(request['image'])), upsample)}
+        if path != '/recognize':
+            return None
+        if 'faces' in request:
+            boxes, items = [], []
+            for face in request['faces']:
+                boxes.append([int(v) for v in face['box']])
+                items.append((self.backend.prepare(decode_image(face['image'])), tuple(boxes[-1])))
+        else:
+            image = self.backend.prepare(decode_image(request['image']))
+            boxes = self.detect(image, upsample)
+            items = [(image, tuple(box)) for box in boxes]
+        matches = self.batcher.submit(items).result(timeout=float(self.settings.get('service_timeout_seconds', 10)))
+        return {'faces': [{'box': box, 'name': str(name),
+                           'distance': round(distance, 4) if np.isfinite(distance) else None,
+                           'confidence': round(confidence, 4)}
+                          for box, (name, distance, confidence) in zip(boxes, matches)]}
+
+    def start(self):
+        service = self
+        
+        class RecognitionHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, clients pool their connections
+            
+            def send_json(self, status, body, headers=()):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def do_GET(self):
+                if self.path.startswith('/stats'):
+                    self.send_json(200, service.stats())
+                elif self.path.startswith('/health'):
+                    self.send_json(200, {'status': 'ok', 'gallery_size': len(service.matcher)})
+                else:
+                    self.send_json(404, {'error': 'not found'})
+            
+            def do_POST(self):
+                start = time.perf_counter()
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                except ValueError:
+                    self.send_json(400, {'error': 'invalid JSON'})
+                    return
+                client = str(request.get('client') or self.client_address[0])
+                try:
+                    response = service.handle(self.path, request)
+                except queue.Full as e:
+                    service.record(client, self.path, time.perf_counter() - start, rejected=True)
+                    self.send_json(503, {'error': f"busy: {e}"}, [('Retry-After', '1')])
+                    return
+                except (KeyError, ValueError) as e:
+                    self.send_json(400, {'error': str(e)})
+                    return
+                except Exception as e:
+                    self.send_json(500, {'error': str(e)})
+                    return
+                if response is None:
+                    self.send_json(404, {'error': 'not found'})
+                    return
+                service.record(client, self.path, time.perf_counter() - start, faces=len(response.get('faces', [])))
+                self.send_json(200, response)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        threading.Thread(target=self.batcher.run, name="service-batcher", daemon=True).start()
+        self.server = ThreadingHTTPServer((self.host, self.port), RecognitionHandler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        print(f"Recognition service on http://{self.host}:{self.port} ({len(self.matcher)} known faces)")
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.batcher.stop()
+        if self.server:
+            self.server.server_close()
+
+
+class RecognitionClient:
+    """Thin client for RecognitionService, usable as a CameraStream backend
+
+    Detection and recognition run in the service; the stream keeps motion gating, tracking
+    and quality gating locally and sends only padded crops of the faces that need a name.
+    HTTP connections are kept alive in a small pool shared by every thread of the client.
+    """
+
+    name = 'remote'
+    default_upsample = 0
+
+    def __init__(self, url, client_id=None, timeout=5.0, pool_size=4):
+        parts = urlsplit(url if '://' in url else f"http://{url}")
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 9200
+        self.client_id = client_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.timeout = timeout
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        # Statistics
+        self.requests = 0
+        self.busy = 0
+        self.errors = 0
+        self.latency_ms = 0.0
+
+    def request(self, path, body):
+        """POST a JSON body, returns the decoded response or None when the service is busy"""
+        data = json.dumps(dict(body, client=self.client_id)).encode()
+        start = time.perf_counter()
+        for attempt in range(2):
+            try:
+                connection = self.pool.get_nowait()
+            except queue.Empty:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request('POST', path, data, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                payload = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if attempt:
+                    self.errors += 1
+                    raise
+                continue  # a pooled connection the server already closed, retry on a fresh one
+            try:
+                self.pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+            break
+        self.requests += 1
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.latency_ms = latency_ms if not self.latency_ms else self.latency_ms * 0.8 + latency_ms * 0.2
+        if response.status == 503:
+            self.busy += 1
+            return None
+        if response.status != 200:
+            self.errors += 1
+            raise ValueError(f"recognition service error {response.status}: {payload[:200]!r}")
+        return json.loads(payload)
+
+    def prepare(self, frame):
+        return frame
+
+    def to_bgr(self, image):
+        return image
+
+    def detect(self, image, upsample=0):
+        """Boxes in the image, or None when the service is busy (which is not the same as no faces)"""
+        with METRICS.timer('remote_detect'):
+            response = self.request('/detect', {'image': encode_image(image), 'upsample': upsample})
+        return [tuple(box) for box in response['boxes']] if response is not None else None
+
+    def landmarks(self, image, box):
+        return None
+
+    def crop(self, image, box):
+        return crop_face(image, box)
+
+    def recognize(self, items):
+        """Matches for (image, box) pairs, or None when the service refused the batch"""
+        faces = []
+        for image, box in items:
+            crop, crop_box = crop_face(image, box)
+            faces.append({'image': encode_image(crop), 'box': [int(v) for v in crop_box]})
+        with METRICS.timer('remote_recognize'):
+            response = self.request('/recognize', {'faces': faces})
+        if response is None:
+            return None
+        return self.parse_matches(response['faces'])
+
+    def recognize_image(self, image):
+        """(boxes, matches) of every face in a whole BGR image, or None when the service is busy"""
+        with METRICS.timer('remote_recognize'):
+            response = self.request('/recognize', {'image': encode_image(image)})
+        if response is None:
+            return None
+        return [tuple(face['box']) for face in response['faces']], self.parse_matches(response['faces'])
+
+    @staticmethod
+    def parse_matches(faces):
+        return [(face['name'], float('inf') if face['distance'] is None else face['distance'], face['confidence'])
+                for face in faces]
+
+    def health(self):
+        """The service's /health response: status and gallery size"""
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request('GET', '/health')
+            response = connection.getresponse()
+            payload = response.read()
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise ValueError(f"recognition service error {response.status}: {payload[:200]!r}")
+        return json.loads(payload)
+
+    def describe(self):
+        return (f"service {self.host}:{self.port}: {self.latency_ms:.0f} ms, {self.busy} busy, "
+                f"{self.errors} errors")
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class CameraStream:
+    """One video source with its own capture thread, inference workers, tracker and scheduler
+
+    All streams share the app's read-only gallery through get_matcher, so each extra
+    camera only costs its own frame buffers and tracking state.
+    """
+
+    def __init__(self, source, settings, get_matcher, index=0):
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        self.source = source
+        self.settings = settings
+        self.get_matcher = get_matcher
+        self.name = f"Cam {index + 1}"
+        self.backend = get_backend(settings.get('recognition_backend', 'hog'), settings)
+        self.remote = None
+        if settings.get('recognition_service_url'):
+            self.remote = self.backend = RecognitionClient(
+                settings['recognition_service_url'], client_id=f"{socket.gethostname()}/{self.name}",
+                timeout=float(settings.get('recognition_service_timeout', 5.0)))
+        self.cap = None
+        self.is_device = isinstance(source, int)
+        self.threads = []
+        self.stop_event = threading.Event()
+        # GUI stage state
+        self.last_result_id = -1
+        self.face_locations = []
+        self.face_encodings = []
+        self.face_names = []
+        self.last_frame = None
+        # Counters
+        self.capture_fps = 0.0
+        self.display_fps = 0.0
+        self.latency_ms = 0.0
+        self.display_frames = 0
+        self.display_window_start = time.perf_counter()
+        self.motion = None
+        self.quality = None
+        self.motion_skips = 0
+        self.roi_detections = 0
+        self.full_detections = 0
+
+    def open(self):
+        """Open the capture device or file, returns False if it is not available"""
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            self.cap.release()
+            self.cap = None
+            return False
+        if self.is_device:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 800)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 600)
+            self.cap.set(cv2.CAP_PROP_FPS, 30)
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return True
+
+    def start(self):
+        """Start the capture thread and inference workers of this stream"""
+        # Every stage hands over through a small drop-oldest queue so latency never builds up
+        self.capture_queue = DropOldestQueue(maxsize=1)
+        self.display_queue = DropOldestQueue(maxsize=1)
+        self.result_queue = DropOldestQueue(maxsize=1)
+        self.last_result_id = -1
+        self.stop_event = threading.Event()
+        self.scheduler = AdaptiveScheduler(
+            enabled=bool(self.settings.get('adaptive_scheduler', True)),
+            target_latency_ms=float(self.settings.get('target_latency_ms', 150)),
+            target_fps=float(self.settings.get('target_fps', 15)),
+            fixed_point={
+                'scale': float(self.settings.get('detection_scale', 0.5)),
+                'upsample': int(self.settings.get('detection_upsample', 1)),
+                'interval': max(1, int(self.settings.get('detection_interval', 3)))
+            }
+        )
+        print(f"{self.name} scheduler: {self.scheduler.describe()}")
+        self.tracker = FaceTracker(
+            iou_threshold=float(self.settings.get('tracker_iou_threshold', 0.3)),
+            max_missed=int(self.settings.get('tracker_max_missed', 5)),
+            reverify_seconds=float(self.settings.get('reverify_seconds', 2.0)),
+            optical_flow=bool(self.settings.get('tracker_optical_flow', True))
+        )
+        self.motion = None
+        if self.settings.get('motion_gating', True):
+            self.motion = MotionDetector(threshold=int(self.settings.get('motion_threshold', 25)),
+                                         min_area=float(self.settings.get('motion_min_area', 0.002)))
+        self.last_full_detection = 0.0
+        self.motion_skips = self.roi_detections = self.full_detections = 0
+        self.quality = None
+        if self.settings.get('quality_gating', True):
+            self.quality = QualityGate(min_face_px=int(self.settings.get('quality_min_face_px', 32)),
+                                       min_sharpness=float(self.settings.get('quality_min_sharpness', 50)),
+                                       min_brightness=float(self.settings.get('quality_min_brightness', 40)),
+                                       max_brightness=float(self.settings.get('quality_max_brightness', 220)),
+                                       max_yaw=float(self.settings.get('quality_max_yaw', 0.35)),
+                                       max_defer_seconds=float(self.settings.get('quality_max_defer_seconds', 2.0)))
+        
+        self.threads = [threading.Thread(target=self.capture_loop, args=(self.cap, self.stop_event),
+                                         name=f"{self.name} capture", daemon=True)]
+        workers = max(1, int(self.settings.get('inference_workers', 1)))
+        for i in range(workers):
+            self.threads.append(threading.Thread(target=self.inference_worker, args=(self.stop_event,),
+                                                 name=f"{self.name} inference-{i+1}", daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """Signal the threads to stop, wait for them and release the capture"""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.threads = []
+        if self.remote is not None:
+            self.remote.close()
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+        self.face_locations = []
+        self.face_names = []
+        self.last_frame = None
+
+    def capture_loop(self, cap, stop_event):
+        """Capture stage: read frames as fast as the source delivers them, keeping only the newest"""
+        frame_id = 0
+        frame_interval = 0
+        if not self.is_device:
+            # Play files at their own frame rate instead of as fast as they decode
+            frame_interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30)
+        window_start = time.perf_counter()
+        window_frames = 0
+        while not stop_event.is_set():
+            read_start = time.perf_counter()
+            ret, frame = cap.read()
+            METRICS.observe('capture_read', time.perf_counter() - read_start)
+            if not ret:
+                if not self.is_device:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # loop video files
+                time.sleep(0.01)
+                continue
+            if self.is_device:
+                # Mirror in place, read() just allocated this frame and nothing else holds it yet
+                cv2.flip(frame, 1, dst=frame)
+            captured_at = time.perf_counter()
+            # Frames are read-only after capture (the GUI blends overlays into its own buffers),
+            # so inference and display share the same array
+            self.capture_queue.put((frame_id, frame, captured_at))
+            self.display_queue.put((frame_id, frame, captured_at))
+            frame_id += 1
+            
+            window_frames += 1
+            elapsed = captured_at - window_start
+            if elapsed >= 1.0:
+                self.capture_fps = window_frames / elapsed
+                window_start = captured_at
+                window_frames = 0
+            if frame_interval:
+                remaining = frame_interval - (time.perf_counter() - read_start)
+                if remaining > 0:
+                    stop_event.wait(remaining)
+
+    def inference_worker(self, stop_event):
+        """Inference stage: detect, encode and match the newest captured frame"""
+        while not stop_event.is_set():
+            item = self.capture_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            frame_id, frame, captured_at = item
+            try:
+                result = self.track_faces(frame, frame_id)
+            except Exception as e:
+                print(f"Error in {self.name} inference worker: {e}")
+                continue
+            if result is not None:
+                result['captured_at'] = captured_at
+                self.result_queue.put(result)
+
+    def track_faces(self, frame, frame_id):
+        """Detect on the scheduled cadence, track in between and encode only new or stale tracks"""
+        tracker = self.tracker
+        point = self.scheduler.current()
+        scale = point['scale']
+        with tracker.lock:
+            if frame_id <= tracker.last_frame_id:
+                return None  # another worker already handled a newer frame
+            tracker.last_frame_id = frame_id
+            run_detection = frame_id - tracker.last_detection_frame >= point['interval'] or tracker.last_detection_frame < 0
+            if run_detection:
+                tracker.last_detection_frame = frame_id
+        
+        frame_start = time.perf_counter()
+        small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+        gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY) if tracker.optical_flow else None
+        face_encodings = []
+        detect_seconds = None
+        
+        if run_detection:
+            backend = self.backend
+            regions = self.detection_regions(frame, scale)
+            detect_start = time.perf_counter()
+            # Tracks live in full frame coordinates so the scale can change between frames;
+            # sources remembers which image and box each detection has to be embedded from
+            detections = []
+            sources = {}
+            if regions is None:
+                image = backend.prepare(small_frame)
+                found = backend.detect(image, point['upsample'])
+                if found is None:
+                    detections = None
+                for raw in found or []:
+                    box = tuple(int(round(v / scale)) for v in raw)
+                    detections.append(box)
+                    sources[box] = (image, raw)
+            else:
+                roi_scale = float(self.settings.get('roi_detection_scale', 1.0))
+                for top, right, bottom, left in regions:
+                    crop = frame[top:bottom, left:right]
+                    if roi_scale != 1.0:
+                        crop = cv2.resize(crop, (0, 0), fx=roi_scale, fy=roi_scale)
+                    image = backend.prepare(np.ascontiguousarray(crop))
+                    found = backend.detect(image, point['upsample'])
+                    if found is None:
+                        detections = None
+                        break
+                    for raw in found:
+                        r_top, r_right, r_bottom, r_left = raw
+                        box = (top + int(round(r_top / roi_scale)), left + int(round(r_right / roi_scale)),
+                               top + int(round(r_bottom / roi_scale)), left + int(round(r_left / roi_scale)))
+                        detections.append(box)
+                        sources[box] = (image, raw)
+            detect_seconds = time.perf_counter() - detect_start
+            METRICS.observe('detect', detect_seconds)
+            if detections is None:
+                # Thin client and the service is busy: carry the tracks over this frame
+                # instead of reporting that every face is gone
+                run_detection = False
+        
+        if run_detection:
+            with tracker.lock:
+                stale_tracks = tracker.update(detections, gray)
+            items = [sources[track.detection_box] for track in stale_tracks]
+            if stale_tracks and self.quality is not None:
+                with METRICS.timer('quality'):
+                    stale_tracks, items = self.quality.select(backend, stale_tracks, sources)
+            if stale_tracks and self.remote is not None:
+                # Thin client: the service encodes and matches, batched with its other clients
+                matches = self.remote.recognize(items)
+                if matches is not None:  # None = service busy, the tracks stay stale and are retried
+                    with tracker.lock:
+                        for track, match in zip(stale_tracks, matches):
+                            tracker.set_identity(track, match)
+            elif stale_tracks:
+                encode_start = time.perf_counter()
+                with METRICS.timer('encode'):
+                    face_encodings = embed_items(backend, items)
+                if self.quality is not None:
+                    self.quality.record_encode(len(face_encodings), time.perf_counter() - encode_start)
+                    METRICS.set_gauge(f'{self.name} quality_skipped', self.quality.skipped)
+                    METRICS.set_gauge(f'{self.name} encoder_seconds_saved', self.quality.saved_seconds())
+                with METRICS.timer('match'):
+                    matches = self.get_matcher().match(face_encodings)
+                self.scheduler.record('encode', time.perf_counter() - encode_start)
+                with tracker.lock:
+                    tracker.encoder_calls += len(face_encodings)
+                    for track, match in zip(stale_tracks, matches):
+                        tracker.set_identity(track, match)
+        else:
+            track_start = time.perf_counter()
+            with tracker.lock:
+                tracker.propagate(gray, scale)
+            track_seconds = time.perf_counter() - track_start
+            METRICS.observe('track', track_seconds)
+            self.scheduler.record('track', track_seconds)
+        
+        with tracker.lock:
+            tracks = [track for track in tracker.tracks if track.missed == 0]
+            face_locations = [track.int_box() for track in tracks]
+            matches = [(track.name, track.distance, track.confidence) for track in tracks]
+            track_ids = [track.track_id for track in tracks]
+        
+        frame_seconds = time.perf_counter() - frame_start
+        METRICS.observe('inference_frame', frame_seconds)
+        if self.scheduler.record_frame(frame_seconds, detect_seconds):
+            print(f"{self.name} scheduler: {self.scheduler.describe()}")
+        return {
+            'frame_id': frame_id,
+            'face_locations': face_locations,
+            'face_encodings': face_encodings,
+            'matches': matches,
+            'track_ids': track_ids
+        }
+    
+    def detection_regions(self, frame, scale):
+        """Where to run the detector on this frame
+
+        Returns None for a full-frame pass, otherwise the padded regions around motion and
+        live tracks (an empty list when the scene is static and nobody is being tracked).
+        The full frame is used whenever the regions would not be cheaper than it, and at
+        least every motion_full_detection_seconds to pick up faces that entered without motion.
+        """
+        if self.motion is None:
+            return None
+        with METRICS.timer('motion'):
+            motion_boxes = self.motion.update(frame)
+        now = time.perf_counter()
+        height, width = frame.shape[:2]
+        full_every = float(self.settings.get('motion_full_detection_seconds', 5.0))
+        with self.tracker.lock:
+            track_boxes = [track.int_box() for track in self.tracker.tracks]
+            if motion_boxes is None or (full_every and now - self.last_full_detection >= full_every):
+                self.last_full_detection = now
+                self.full_detections += 1
+                return None
+            regions = detection_regions(motion_boxes + track_boxes, height, width,
+                                        float(self.settings.get('roi_padding', 0.5)))
+            if not regions:
+                self.motion_skips += 1
+                return regions
+            # Detector cost grows with the pixels it scans
+            roi_scale = float(self.settings.get('roi_detection_scale', 1.0))
+            roi_pixels = sum((bottom - top) * (right - left) for top, right, bottom, left in regions) * roi_scale ** 2
+            if roi_pixels >= height * width * scale ** 2:
+                self.last_full_detection = now
+                self.full_detections += 1
+                return None
+            self.roi_detections += 1
+            return regions
+
+    def poll_result(self):
+        """GUI stage: take the newest recognition result if there is one newer than the last"""
+        result = self.result_queue.get_latest()
+        if result is None or result['frame_id'] <= self.last_result_id:
+            return None
+        self.last_result_id = result['frame_id']
+        self.face_locations = result['face_locations']
+        self.face_encodings = result['face_encodings']
+        self.face_names = [(name, confidence) for name, distance, confidence in result['matches']]
+        latency_ms = (time.perf_counter() - result['captured_at']) * 1000
+        METRICS.observe('capture_to_result', latency_ms / 1000)
+        self.latency_ms = latency_ms if not self.latency_ms else self.latency_ms * 0.8 + latency_ms * 0.2
+        return result
+
+    def poll_frame(self):
+        """GUI stage: take the newest captured frame, or None if nothing new arrived"""
+        item = self.display_queue.get_latest()
+        if item is None:
+            return None
+        self.display_frames += 1
+        now = time.perf_counter()
+        if now - self.display_window_start >= 1.0:
+            self.display_fps = self.display_frames / (now - self.display_window_start)
+            self.display_window_start = now
+            self.display_frames = 0
+        return item[1]
+
+    def describe(self):
+        """Per-stream counters for the status label"""
+        text = (f"{self.name}: {self.capture_fps:.0f} fps capture, {self.scheduler.fps:.1f} fps inference, "
+                f"{self.latency_ms:.0f} ms latency | {self.scheduler.describe()}")
+        if self.motion is not None:
+            text += (f" | detect: {self.roi_detections} roi, {self.full_detections} full, "
+                     f"{self.motion_skips} skipped")
+        if self.quality is not None:
+            text += f" | {self.quality.describe()}"
+        if self.remote is not None:
+            text += f" | {self.remote.describe()}"
+        return text
+
 
 class FaceRecognitionApp:
-    def __init__(self, root):
+    def __init__(self, root, settings_overrides=None):
         self.root = root
         self.root.title("Multi-Face Recognition with Keyboard Auto-Input")
         self.root.geometry("1100x950")
-        self.cap = None
+        self.streams = []
         self.is_camera_running = False
         self.known_encodings = []
         self.known_names = []
+        self.matcher = FaceMatcher()
         self.last_logged = {}  
+        self.known_people_folder = "./known_people"
+        self.gallery_loader = None
+        self.gallery_progress = None
+        self.gallery_watcher = None
+        self.gallery_reload_timer = None
+        self.gallery_reload_lock = threading.Lock()
+        self.gallery_lock = threading.Lock()
+        self.gallery_ids_by_path = {}  # image path -> matcher ids of its faces
+        self.gallery_store = None
+        self.first_frame_time = None
+        self.upload_thread = None
+        self.upload_result = None
+        self.upload_executor = None  # worker pool for tiled uploads, created on first use
+        self.recognition_client = None  # thin client mode: uploads are recognized by the service
+        self.service_gallery_size = None
+        self.bulk_thread = None
+        self.bulk_recognizer = None
+        self.bulk_summary = None
         
         # Performance optimization variables
         self.process_this_frame = True 
         self.frame_count = 0
-        self.face_locations = []
-        self.face_encodings = []
-        self.face_names = []
         
         # Detection statistics
         self.total_faces_detected = 0
@@ -49,12 +4173,61 @@ class FaceRecognitionApp:
             'target_window': ''  
         }
         
+        # Performance settings
+        self.performance_settings = dict(DEFAULT_PERFORMANCE_SETTINGS)
+        
+        # Rendering reuses its buffers and PhotoImage; overlays are cached per stream
+        self.renderer = FrameRenderer()
+        self.stream_overlays = {}
+        self.show_metrics_overlay = False
+        self.metrics_overlay = None
+        self.metrics_overlay_updated = 0.0
         
         # Create GUI elements first
         self.create_gui()
         self.load_configs()
-        self.load_known_faces()
+        self.performance_settings.update(settings_overrides or {})
+        self.keyboard_dispatcher = KeyboardDispatcher(self.keyboard_settings)
+        self.attendance_writer = AttendanceWriter(
+            batch_size=int(self.performance_settings.get('attendance_batch_size', 50)),
+            flush_seconds=float(self.performance_settings.get('attendance_flush_seconds', 1.0)),
+            rotate=self.performance_settings.get('attendance_rotate', 'day'),
+            max_bytes=int(self.performance_settings.get('attendance_max_bytes', 10 * 1024 * 1024)),
+            db_file=self.performance_settings.get('attendance_db', 'attendance.db'),
+            recent_seconds=float(self.performance_settings.get('cooldown_seconds', 30))
+        )
+        self.last_cooldown_eviction = time.time()
+        METRICS.enabled = bool(self.performance_settings.get('metrics_enabled', True))
+        self.metrics_exporter = None
+        if METRICS.enabled:
+            self.metrics_exporter = MetricsExporter(
+                METRICS,
+                prometheus_file=self.performance_settings.get('metrics_prometheus_file', 'metrics.prom'),
+                interval_seconds=float(self.performance_settings.get('metrics_export_seconds', 10)),
+                http_port=int(self.performance_settings.get('metrics_http_port', 9109))
+            )
+            self.metrics_exporter.start()
+        # The preview starts right away, the gallery follows in the background
         self.start_camera()
+        service_url = self.performance_settings.get('recognition_service_url')
+        if service_url:
+            # Thin client: the recognition service owns the gallery
+            print(f"Recognizing through the service at {service_url}")
+            self.recognition_client = RecognitionClient(
+                service_url, client_id=f"{socket.gethostname()}/upload",
+                timeout=float(self.performance_settings.get('upload_service_timeout', 60.0)))
+            # Bulk runs encode in local worker processes and match against a local gallery, which is empty here
+            self.bulk_button.config(state=tk.DISABLED)
+            threading.Thread(target=self.run_service_health, name="service-health", daemon=True).start()
+        else:
+            self.load_known_faces()
+
+    def run_service_health(self):
+        """Health thread: fetch the size of the service's gallery for the status bar"""
+        try:
+            self.service_gallery_size = self.recognition_client.health()['gallery_size']
+        except (OSError, http.client.HTTPException, ValueError, KeyError) as e:
+            print(f"Recognition service health check failed: {e}")
 
     def upload_image(self):
         """Allow user to upload an image and recognize faces in it."""
@@ -64,84 +4237,403 @@ class FaceRecognitionApp:
         )
         if not file_path:
             return
-
+        if self.upload_thread is not None and self.upload_thread.is_alive():
+            messagebox.showinfo("Busy", "Still processing the previous image.")
+            return
+        
+        # Large photos take seconds, keep the preview running while they are processed
+        self.upload_result = None
+        self.upload_button.config(text="Processing...", state=tk.DISABLED)
+        self.upload_thread = threading.Thread(target=self.run_upload, args=(file_path,), name="upload", daemon=True)
+        self.upload_thread.start()
+        self.root.after(100, self.poll_upload)
+    
+    def run_upload(self, file_path):
+        """Upload thread: detect, encode and match one image, tiled across worker processes when it is large"""
         try:
-            image = face_recognition.load_image_file(file_path)
-            face_locations = face_recognition.face_locations(image)
-            face_encodings = face_recognition.face_encodings(image, face_locations)
+            settings = self.performance_settings
+            backend_name = settings.get('recognition_backend', 'hog')
+            start = time.perf_counter()
+            image = cv2.imread(file_path)
+            if image is None:
+                raise ValueError(f"could not read image {file_path}")
+            decode_seconds = time.perf_counter() - start
+            tile_size = int(settings.get('upload_tile_size', 1024))
+            if self.recognition_client is not None:
+                # Thin client: the service detects and matches against its gallery
+                detect_start = time.perf_counter()
+                response = self.recognition_client.recognize_image(image)
+                if response is None:
+                    raise ValueError("the recognition service is busy, try again")
+                face_locations, matches = response
+                stats = {'tiles': 1, 'scales': 1, 'detect_seconds': time.perf_counter() - detect_start,
+                         'encode_seconds': 0.0}
+            elif max(image.shape[:2]) > tile_size:
+                workers = resolve_workers(settings.get('upload_workers', 0))
+                # One pool for the session, worker start-up and model loading are paid once
+                if self.upload_executor is None:
+                    self.upload_executor = ProcessPoolExecutor(max_workers=workers)
+                try:
+                    face_locations, face_encodings, stats = detect_and_encode_tiled(
+                        image, self.upload_executor, backend_name, settings, tile_size=tile_size,
+                        overlap=int(settings.get('upload_tile_overlap', 256)),
+                        upsample=int(settings.get('upload_tile_upsample', -1)))
+                except BrokenProcessPool:
+                    # A crashed worker breaks the pool for good, start a fresh one next time
+                    self.upload_executor = None
+                    raise
+                stats['workers'] = workers
+                matches = self.matcher.match(face_encodings)
+            else:
+                backend = get_backend(backend_name, settings)
+                detect_start = time.perf_counter()
+                prepared = backend.prepare(image)
+                face_locations = backend.detect(prepared, backend.default_upsample)
+                encode_start = time.perf_counter()
+                face_encodings = backend.embed(prepared, face_locations)
+                stats = {'tiles': 1, 'scales': 1, 'detect_seconds': encode_start - detect_start,
+                         'encode_seconds': time.perf_counter() - encode_start}
+                matches = self.matcher.match(face_encodings)
+            stats['decode_seconds'] = decode_seconds
+            stats['total_seconds'] = time.perf_counter() - start
+            self.upload_result = (image, face_locations, matches, stats)
+        except Exception as e:
+            self.upload_result = e
+    
+    def poll_upload(self):
+        """Show the upload result window once the upload thread is done"""
+        if self.upload_thread.is_alive():
+            self.root.after(100, self.poll_upload)
+            return
+        self.upload_button.config(text="Upload Image", state=tk.NORMAL)
+        if isinstance(self.upload_result, Exception):
+            messagebox.showerror("Error", f"Failed to process image: {self.upload_result}")
+            return
+        image_bgr, face_locations, matches, stats = self.upload_result
+        if not face_locations:
+            messagebox.showinfo("Result", f"No faces detected in the selected image ({stats['total_seconds']:.1f} s).")
+            return
 
-            if not face_encodings:
-                messagebox.showinfo("Result", "No faces detected in the selected image.")
-                return
+        # Draw rectangles and names on the image, thick enough to survive the thumbnail
+        thickness = max(2, round(max(image_bgr.shape[:2]) / 600))
+        for (top, right, bottom, left), (name, distance, confidence) in zip(face_locations, matches):
+            cv2.rectangle(image_bgr, (left, top), (right, bottom), (0, 255, 0), thickness)
+            cv2.putText(image_bgr, name, (left, top - 5 * thickness), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.4 * thickness, (0, 255, 0), thickness)
 
-            # Draw rectangles and names on the image
-            image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-            for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                matches = face_recognition.compare_faces(self.known_encodings, face_encoding, tolerance=0.5)
-                name = "Unknown"
-                if True in matches:
-                    face_distances = face_recognition.face_distance(self.known_encodings, face_encoding)
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index] and face_distances[best_match_index] < 0.6:
-                        name = self.known_names[best_match_index]
-                cv2.rectangle(image_bgr, (left, top), (right, bottom), (0, 255, 0), 2)
-                cv2.putText(image_bgr, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-
-            # Show the result in a new window
-            image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(image_rgb)
-            img.thumbnail((600, 600))
-            photo = ImageTk.PhotoImage(img)
-
-            top_window = tk.Toplevel(self.root)
-            top_window.title("Recognition Result")
-            label = tk.Label(top_window, image=photo)
-            label.image = photo
-            label.pack()
+        # Show the result in a new window
+        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        img = Image.fromarray(image_rgb)
+        img.thumbnail((600, 600))
+        photo = ImageTk.PhotoImage(img)
+
+        top_window = tk.Toplevel(self.root)
+        top_window.title(f"Recognition Result - {len(face_locations)} faces in {stats['total_seconds']:.1f} s")
+        label = tk.Label(top_window, image=photo)
+        label.image = photo
+        label.pack()
+        timing = (f"{len(face_locations)} faces, {image_bgr.shape[1]}x{image_bgr.shape[0]} in "
+                  f"{stats['total_seconds']:.2f} s: decode {stats['decode_seconds']:.2f} s, "
+                  f"detect {stats['detect_seconds']:.2f} s")
+        if stats['tiles'] > 1:
+            timing += f" ({stats['tiles']} tiles, {stats['scales']} scales, {stats['workers']} workers)"
+        timing += f", encode {stats['encode_seconds']:.2f} s"
+        tk.Label(top_window, text=timing, font=("Arial", 9)).pack(pady=5)
+    
+    def bulk_recognize(self):
+        """Recognize every image and video of a folder or a selection of files into a JSONL results file"""
+        if self.bulk_thread is not None and self.bulk_thread.is_alive():
+            if messagebox.askyesno("Bulk Recognition", "Stop the running bulk recognition?"):
+                self.bulk_recognizer.stop_event.set()
+            return
+        choice = messagebox.askyesnocancel("Bulk Recognition",
+                                           "Process a whole folder?\n\nYes: choose a folder\nNo: choose image or video files")
+        if choice is None:
+            return
+        if choice:
+            folder = tkinter.filedialog.askdirectory(title="Select Folder")
+            sources = [folder] if folder else []
+        else:
+            extensions = " ".join(f"*{ext}" for ext in HeadlessRecognizer.IMAGE_EXTENSIONS + HeadlessRecognizer.VIDEO_EXTENSIONS)
+            sources = list(tkinter.filedialog.askopenfilenames(title="Select Images or Videos",
+                                                               filetypes=[("Images and Videos", extensions)]))
+        if not sources:
+            return
+        
+        settings = self.performance_settings
+        results_folder = settings.get('bulk_results_folder', 'bulk_results')
+        os.makedirs(results_folder, exist_ok=True)
+        output_path = os.path.join(results_folder, f"bulk_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        self.bulk_recognizer = HeadlessRecognizer(settings, workers=settings.get('bulk_workers', 0),
+                                                  stride=int(settings.get('bulk_stride', 1)),
+                                                  scale=float(settings.get('bulk_scale', 0.5)),
+                                                  upsample=int(settings.get('bulk_upsample', 1)),
+                                                  cache_folder=settings.get('bulk_cache_folder', 'bulk_results_cache'),
+                                                  log=sys.stdout)
+        # Match against the gallery the camera uses right now
+        self.bulk_recognizer.matcher = self.matcher
+        self.bulk_summary = None
+        self.bulk_button.config(text="Stop Bulk")
+        self.bulk_thread = threading.Thread(target=self.run_bulk, args=(sources, output_path),
+                                            name="bulk-recognition", daemon=True)
+        self.bulk_thread.start()
+        self.root.after(250, self.poll_bulk)
+    
+    def run_bulk(self, sources, output_path):
+        """Bulk thread: stream results into output_path as the recognizer produces them"""
+        try:
+            with open(output_path, 'w') as output:
+                self.bulk_recognizer.output = output
+                summary = self.bulk_recognizer.run(sources)
+            self.bulk_summary = (output_path, summary)
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to process image: {e}")
+            self.bulk_summary = e
+    
+    def poll_bulk(self):
+        """Show bulk progress and throughput, and the summary once it finished"""
+        if self.bulk_thread.is_alive():
+            self.bulk_label.config(text=self.bulk_recognizer.progress())
+            self.root.after(250, self.poll_bulk)
+            return
+        self.bulk_button.config(text="Bulk Recognize")
+        if isinstance(self.bulk_summary, Exception):
+            self.bulk_label.config(text=f"Bulk recognition failed: {self.bulk_summary}")
+            return
+        output_path, summary = self.bulk_summary
+        self.bulk_label.config(
+            text=(f"Bulk: {summary['files']} files ({summary['cached_files']} cached), {summary['frames']} frames, "
+                  f"{summary['faces']} faces in {summary['seconds']:.1f} s "
+                  f"({summary['frames_per_second']} frames/sec) -> {output_path}"))
     
     def load_known_faces(self):
-        """Load known faces from the known_people folder including subfolders"""
-        known_people_folder = "./known_people"
+        """Load known faces from the known_people folder including subfolders
+
+        Loading runs in the background: recognition starts with the cached identities and
+        picks up new ones as they are encoded while the preview keeps running.
+        """
+        known_people_folder = self.known_people_folder
         if not os.path.exists(known_people_folder):
             os.makedirs(known_people_folder)
             messagebox.showwarning("Warning", f"Created '{known_people_folder}' folder. Please add known face images there.")
             return
+        if self.gallery_loader is not None and self.gallery_loader.is_alive():
+            print("Known faces are already being loaded")
+            return
         
-        self.known_encodings = []
-        self.known_names = []
+        self.gallery_loader = threading.Thread(target=self.run_gallery_loader, args=(known_people_folder,),
+                                               name="gallery-loader", daemon=True)
+        self.gallery_loader.start()
+        self.root.after(200, self.poll_gallery_loader)
+    
+    def run_gallery_loader(self, known_people_folder):
+        """Loader thread: encode the gallery and publish it whenever more identities are ready"""
+        # Snapshot the folder before loading so edits made while loading are applied afterwards
+        watcher = None
+        if self.gallery_watcher is None and self.performance_settings.get('watch_known_people', True):
+            watcher = GalleryWatcher(known_people_folder, self.apply_gallery_changes,
+                                     poll_seconds=float(self.performance_settings.get('watch_poll_seconds', 2.0)))
+        settings = self.performance_settings
+        try:
+            store = None
+            if settings.get('gallery_index') == 'mmap':
+                # A mapped store serves recognition right away, the folder is checked against it afterwards
+                store = open_gallery_store(settings)
+                if store is not None:
+                    self.publish_store(store)
+                    METRICS.set_gauge('gallery_store_open_seconds', time.perf_counter() - STARTUP_TIME)
+            signature = gallery_signature(watcher.snapshot if watcher else scan_gallery(known_people_folder))
+            per_identity = int(settings.get('identity_prototypes', 0))
+            if per_identity:
+                signature += f"/prototypes={per_identity}"  # a store of prototypes is stale when the count changes
+            if store is not None and store.meta.get('signature') == signature:
+                known_paths = store.paths()
+            else:
+                with METRICS.timer('load_known_faces'):
+                    known_encodings, known_names, known_paths = load_gallery(
+                        known_people_folder, settings.get('enrollment_workers', 0),
+                        progress=self.show_enrollment_progress, settings=settings,
+                        partial=self.publish_partial_gallery, return_paths=True)
+                if per_identity:
+                    full_size = len(known_names)
+                    known_encodings, known_names, known_paths = self.reduce_gallery(
+                        known_encodings, known_names, known_paths)
+                    print(f"Reduced {full_size} known faces to {len(known_names)} prototypes "
+                          f"of {len(set(known_names))} people")
+                if settings.get('gallery_index') == 'mmap':
+                    store = create_gallery_store(settings, known_encodings, known_names, known_paths, signature)
+            with self.gallery_lock:
+                if store is not None:
+                    self.publish_store(store)
+                else:
+                    self.publish_gallery(known_encodings, known_names)
+                # Gallery ids are store rows or list positions, in the order of known_paths either way
+                removed_rows = set(store.removed.tolist()) if store is not None else set()
+                self.gallery_ids_by_path = {}
+                for gallery_id, image_path in enumerate(known_paths):
+                    if gallery_id not in removed_rows:
+                        self.gallery_ids_by_path.setdefault(image_path, []).append(gallery_id)
+            METRICS.set_gauge('gallery_ready_seconds', time.perf_counter() - STARTUP_TIME)
+        except Exception as e:
+            print(f"Error loading known faces: {e}")
+        self.gallery_progress = None
+        if watcher is not None:
+            self.gallery_watcher = watcher
+            watcher.start()
+    
+    def schedule_gallery_reload(self):
+        """Watcher thread: (re)start the countdown to a full gallery rebuild"""
+        if self.gallery_reload_timer is not None:
+            self.gallery_reload_timer.cancel()
+        self.gallery_reload_timer = threading.Timer(
+            float(self.performance_settings.get('watch_reload_delay_seconds', 2.0)), self.reload_gallery)
+        self.gallery_reload_timer.daemon = True
+        self.gallery_reload_timer.start()
+    
+    def reload_gallery(self):
+        """Timer thread: rebuild the whole gallery from the warm encoding cache, one rebuild at a time"""
+        with self.gallery_reload_lock:
+            loader = self.gallery_loader
+            if loader is not None and loader.is_alive():
+                loader.join()
+            self.run_gallery_loader(self.known_people_folder)
+    
+    def reduce_gallery(self, known_encodings, known_names, known_paths=None):
+        """Per-person prototypes of a gallery when identity_prototypes is set, otherwise the gallery itself"""
+        per_identity = int(self.performance_settings.get('identity_prototypes', 0))
+        if not per_identity:
+            return known_encodings, known_names, known_paths
+        return identity_prototypes(known_encodings, known_names, known_paths, per_identity,
+                                   float(self.performance_settings.get('prototype_min_cluster_fraction', 0.1)))
+    
+    def publish_partial_gallery(self, known_encodings, known_names):
+        """Loader callback: publish the part of the gallery encoded so far, reduced like the final one"""
+        known_encodings, known_names, _ = self.reduce_gallery(known_encodings, known_names)
+        self.publish_gallery(known_encodings, known_names)
+    
+    def publish_gallery(self, known_encodings, known_names):
+        """Build a matcher for a complete gallery (already reduced to prototypes if enabled) and swap it in"""
+        matcher = create_matcher(self.performance_settings)
+        matcher.set_gallery(known_encodings, known_names)
+        self.swap_matcher(matcher)
+    
+    def publish_store(self, store):
+        """Swap in a matcher that works directly on a memory-mapped GalleryStore"""
+        matcher = create_matcher(self.performance_settings)
+        matcher.set_store(store)
+        self.gallery_store = store
+        self.swap_matcher(matcher)
+    
+    def swap_matcher(self, matcher):
+        """Swap a new matcher in with a single assignment so inference workers never see a half-built gallery"""
+        self.matcher = matcher
+        self.known_encodings = matcher.matrix
+        self.known_names = matcher.names
+        METRICS.set_gauge('gallery_size', len(matcher.index))
+        # Faces already tracked as Unknown get another chance against the changed gallery
+        for stream in self.streams:
+            if hasattr(stream, 'tracker'):
+                stream.tracker.invalidate()
+    
+    def apply_gallery_changes(self, changed, removed):
+        """Watcher thread: encode just the changed images and swap in a matcher with them replaced"""
+        settings = self.performance_settings
+        if int(settings.get('identity_prototypes', 0)):
+            # Prototypes depend on all of a person's photos, so the whole gallery is rebuilt,
+            # once per burst of changes and off the watcher thread
+            self.schedule_gallery_reload()
+            return
+        loader = self.gallery_loader
+        if loader is not None and loader.is_alive():
+            loader.join()
+        backend_name = settings.get('recognition_backend', 'hog')
+        backend = get_backend(backend_name, settings)
+        cache = EncodingCache(backend.cache_file, backend.model_tag)
+        encodings_by_path = {}
+        pending = []
+        for image_path in changed:
+            try:
+                encodings = cache.get(image_path)
+            except OSError:
+                continue  # removed again before it could be read
+            if encodings is None:
+                pending.append(image_path)
+            else:
+                encodings_by_path[image_path] = encodings
+        if pending:
+            # Encode in worker processes so the GUI and inference threads keep the GIL
+            workers = min(resolve_workers(settings.get('enrollment_workers', 0)), len(pending))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for image_path, encodings, error in executor.map(encode_image_file, pending,
+                                                                 [backend_name] * len(pending),
+                                                                 [settings] * len(pending)):
+                    if error:
+                        print(f"Error loading {os.path.basename(image_path)}: {error}")
+                        continue
+                    cache.put(image_path, encodings)
+                    encodings_by_path[image_path] = encodings
+        cache.prune(self.gallery_watcher.snapshot)  # the scan that reported these changes
+        cache.save()
         
-        for root_dir, dirs, files in os.walk(known_people_folder):
-            for filename in files:
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    image_path = os.path.join(root_dir, filename)
+        with self.gallery_lock:
+            remove_ids = []
+            for image_path in list(changed) + list(removed):
+                remove_ids.extend(self.gallery_ids_by_path.get(image_path, []))
+            new_encodings, new_names, new_paths = [], [], []
+            for image_path, encodings in encodings_by_path.items():
+                for encoding, name in zip(encodings, gallery_face_names(self.known_people_folder, image_path,
+                                                                        len(encodings))):
+                    new_encodings.append(encoding)
+                    new_names.append(name)
+                    new_paths.append(image_path)
+            store = self.gallery_store
+            mapping = None
+            if store is not None and getattr(self.matcher.index, 'store', None) is store:
+                # Store rows and matcher ids stay aligned because both only ever grow at the end.
+                # A failed write raises before the path -> id map below is touched.
+                store.remove(remove_ids)
+                store.append(new_encodings, new_names, new_paths)
+                if self.gallery_watcher is not None:
+                    store.set_signature(gallery_signature(self.gallery_watcher.snapshot))
+                if store.removed_fraction() > float(settings.get('gallery_store_compact_ratio', 0.25)):
                     try:
-                        image = face_recognition.load_image_file(image_path)
-                        encodings = face_recognition.face_encodings(image)
-                        if encodings:
-                            for i, encoding in enumerate(encodings):
-                                self.known_encodings.append(encoding)
-                                # Extract name from folder structure or filename
-                                relative_path = os.path.relpath(root_dir, known_people_folder)
-                                name = os.path.splitext(filename)[0]
-                                if relative_path != ".":
-                                    name = f"{relative_path}"
-                                if len(encodings) > 1:
-                                    name = f"{name}_{i+1}"
-                                self.known_names.append(name)
-                                print(f"Loaded face: {name}")
-                        else:
-                            print(f"Warning: No face detected in {filename}")
-                    except Exception as e:
-                        print(f"Error loading {filename}: {e}")
+                        mapping = store.compact()
+                    except OSError as e:
+                        print(f"Error compacting gallery store: {e}")  # the uncompacted store stays valid
+            
+            for image_path in list(changed) + list(removed):
+                self.gallery_ids_by_path.pop(image_path, None)
+            first_id = len(self.matcher.names)
+            for offset, image_path in enumerate(new_paths):
+                self.gallery_ids_by_path.setdefault(image_path, []).append(first_id + offset)
+            if mapping is not None:
+                self.gallery_ids_by_path = {image_path: [int(mapping[i]) for i in ids]
+                                            for image_path, ids in self.gallery_ids_by_path.items()}
+                self.publish_store(store)
+                print(f"Compacted gallery store to {len(store)} rows")
+                matcher = self.matcher
+            else:
+                matcher = self.matcher.updated(remove_ids, new_encodings, new_names)
+                self.swap_matcher(matcher)
+        print(f"Gallery updated: {len(encodings_by_path)} images added or changed, {len(removed)} removed, "
+              f"{len(matcher.index)} known faces")
+    
+    def show_enrollment_progress(self, done, total):
+        """Record enrollment progress, the GUI thread shows it from poll_gallery_loader"""
+        self.gallery_progress = (done, total)
+    
+    def poll_gallery_loader(self):
+        """Show loading progress in the status labels and warn once loading finished with no faces"""
+        if self.gallery_loader.is_alive():
+            if self.gallery_progress:
+                done, total = self.gallery_progress
+                self.faces_count_label.config(
+                    text=f"Encoding known faces: {done}/{total} ({len(self.matcher)} faces ready)")
+            self.root.after(200, self.poll_gallery_loader)
+            return
         
-        print(f"Loaded {len(self.known_encodings)} known faces")
-        if len(self.known_encodings) == 0:
+        if len(self.matcher) == 0:
             messagebox.showwarning("Warning", "No valid face images found in 'known_people' folder!")
-        
-        if hasattr(self, 'faces_count_label'):
-            self.update_status()
+        self.update_status()
     
     def create_gui(self):
         """Create the GUI elements"""
@@ -192,43 +4684,80 @@ class FaceRecognitionApp:
         self.keyboard_status_label = tk.Label(status_frame, text="Keyboard Auto-Input: Disabled", 
                                             font=("Arial", 10), fg="gray")
         self.keyboard_status_label.pack()
+        
+        self.scheduler_label = tk.Label(status_frame, text="Operating point: -", 
+                                       font=("Arial", 9), fg="gray")
+        self.scheduler_label.pack()
+        
+        self.bulk_label = tk.Label(status_frame, text="", font=("Arial", 9), fg="purple")
+        self.bulk_label.pack()
 
         instructions = tk.Label(self.root, 
                                text="✓ Place known face images in the 'known_people' folder or subfolders\n✓ Configure keyboard auto-input to automatically type data when face is recognized\n✓ Multiple faces will be detected simultaneously\n✓ Use clear, front-facing photos with good lighting for best results",
                                font=("Arial", 10), fg="gray", justify="left")
         instructions.pack(pady=5)
-        upload_button = tk.Button(button_frame, text="Upload Image",
-                                  command=self.upload_image,
-                                  bg="purple", fg="white", font=("Arial", 12))
-        upload_button.pack(side=tk.LEFT, padx=5)
+        self.upload_button = tk.Button(button_frame, text="Upload Image",
+                                       command=self.upload_image,
+                                       bg="purple", fg="white", font=("Arial", 12))
+        self.upload_button.pack(side=tk.LEFT, padx=5)
+        
+        self.bulk_button = tk.Button(button_frame, text="Bulk Recognize",
+                                     command=self.bulk_recognize,
+                                     bg="purple", fg="white", font=("Arial", 12))
+        self.bulk_button.pack(side=tk.LEFT, padx=5)
+        
+        self.metrics_button = tk.Button(button_frame, text="Show Metrics",
+                                        command=self.toggle_metrics_overlay,
+                                        bg="gray", fg="white", font=("Arial", 12))
+        self.metrics_button.pack(side=tk.LEFT, padx=5)
+        
+        self.profile_button = tk.Button(button_frame, text="Profile",
+                                        command=self.start_profiler,
+                                        bg="gray", fg="white", font=("Arial", 12))
+        self.profile_button.pack(side=tk.LEFT, padx=5)
     
     def update_status(self):
         """Update the status information"""
-        self.faces_count_label.config(text=f"Known faces: {len(self.known_encodings)}")
+        if self.recognition_client is not None:
+            known = '?' if self.service_gallery_size is None else self.service_gallery_size
+            self.faces_count_label.config(text=f"Known faces: {known} (recognition service)")
+        else:
+            self.faces_count_label.config(text=f"Known faces: {len(self.matcher)}")
         self.current_faces_label.config(text=f"Current faces detected: {self.current_faces_count}")
         
         # Update keyboard status
         if self.keyboard_settings['enabled']:
-            self.keyboard_status_label.config(text="Keyboard Auto-Input: Enabled", fg="green")
+            self.keyboard_status_label.config(
+                text=f"Keyboard Auto-Input: Enabled ({self.keyboard_dispatcher.describe()})", fg="green")
         else:
             self.keyboard_status_label.config(text="Keyboard Auto-Input: Disabled", fg="gray")
+        
+        if self.is_camera_running and self.streams:
+            self.scheduler_label.config(text="\n".join(stream.describe() for stream in self.streams))
     
     def start_camera(self):
-        """Start the webcam"""
+        """Open every configured source and start its capture/inference pipeline"""
         try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
+            sources = self.performance_settings.get('camera_sources', [0])
+            if not isinstance(sources, list):
+                sources = [sources]
+            self.streams = []
+            self.stream_overlays = {}
+            for index, source in enumerate(sources):
+                stream = CameraStream(source, self.performance_settings, lambda: self.matcher, index)
+                if stream.open():
+                    self.streams.append(stream)
+                else:
+                    print(f"Error: could not open camera source {source}")
+            if not self.streams:
                 messagebox.showerror("Error", "Could not open webcam")
                 return
             
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 800)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 600)
-            self.cap.set(cv2.CAP_PROP_FPS, 30)
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            
+            for stream in self.streams:
+                stream.start()
             self.is_camera_running = True
             self.camera_button.config(text="Stop Camera", bg="red")
-            self.status_label.config(text="Camera: Running", fg="green")
+            self.status_label.config(text=f"Camera: Running ({len(self.streams)} sources)", fg="green")
             self.update_frame()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to start camera: {e}")
@@ -236,8 +4765,8 @@ class FaceRecognitionApp:
     def stop_camera(self):
         """Stop the webcam"""
         self.is_camera_running = False
-        if self.cap:
-            self.cap.release()
+        for stream in self.streams:
+            stream.stop()
         self.camera_button.config(text="Start Camera", bg="green")
         self.status_label.config(text="Camera: Stopped", fg="red")
         self.current_faces_count = 0
@@ -254,158 +4783,171 @@ class FaceRecognitionApp:
     
     def get_face_color(self, index, is_known=False):
         """Get a unique color for each face"""
-        if is_known:
-            colors = [(0, 255, 0), (0, 200, 50), (50, 255, 50), (0, 255, 100), (100, 255, 0)]
-        else:
-            colors = [(0, 0, 255), (50, 0, 200), (100, 0, 255), (0, 50, 255), (200, 0, 100)]
-        
-        return colors[index % len(colors)]
+        return face_color(index, is_known)
     
     def update_frame(self):
-        """Update the video frame with enhanced multi-face processing"""
-        if not self.is_camera_running or not self.cap:
+        """GUI stage: render the newest frame of every source with its newest recognition result"""
+        if not self.is_camera_running or not self.streams:
             return
         
-        ret, frame = self.cap.read()
-        if ret:
-            frame = cv2.flip(frame, 1)
-            
-            if self.frame_count % 3 == 0:
-                small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                
-                self.face_locations = face_recognition.face_locations(rgb_small_frame, 
-                                                                    model="hog", 
-                                                                    number_of_times_to_upsample=1)
-                self.face_encodings = face_recognition.face_encodings(rgb_small_frame, self.face_locations)
-                
-                self.current_faces_count = len(self.face_locations)
-                
-                self.face_names = []
-                for face_encoding in self.face_encodings:
-                    matches = face_recognition.compare_faces(self.known_encodings, face_encoding, tolerance=0.5)
-                    name = "Unknown"
-                    confidence = 0
-                    
-                    if True in matches:
-                        face_distances = face_recognition.face_distance(self.known_encodings, face_encoding)
-                        best_match_index = np.argmin(face_distances)
-                        
-                        if matches[best_match_index] and face_distances[best_match_index] < 0.6:
-                            name = self.known_names[best_match_index]
-                            confidence = 1 - face_distances[best_match_index]
-                            self.log_match_with_cooldown(name)
-                    
-                    self.face_names.append((name, confidence))
-                
-                self.update_status()
-            
-            # Display results
-            for i, ((top, right, bottom, left), (name, confidence)) in enumerate(zip(self.face_locations, self.face_names)):
-                top *= 2
-                right *= 2
-                bottom *= 2
-                left *= 2
-                
-                # Always use red for unknown faces, other colors for known faces
-                if name == "Unknown":
-                    color = (0, 0, 255)  # Red for unknown faces
-                else:
-                    color = self.get_face_color(i, is_known=True)  # Other colors for known faces
-                
-                cv2.rectangle(frame, (left, top), (right, bottom), color, 3)
-                
-                label_height = 40
-                cv2.rectangle(frame, (left, bottom - label_height), (right, bottom), color, cv2.FILLED)
-                
-                display_text = f"{name}"
-                if name != "Unknown" and confidence > 0:
-                    display_text = f"{name} ({confidence:.2f})"
-                
-                if len(self.face_locations) > 1:
-                    display_text = f"#{i+1} {display_text}"
-                
-                font = cv2.FONT_HERSHEY_DUPLEX
-                cv2.putText(frame, display_text, (left + 6, bottom - 10), font, 0.6, (255, 255, 255), 2)
-                cv2.putText(frame, display_text, (left + 6, bottom - 10), font, 0.6, (0, 0, 0), 1)
-            
-            if self.current_faces_count > 0:
-                count_text = f"Faces: {self.current_faces_count}"
-                cv2.putText(frame, count_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 3)
-                cv2.putText(frame, count_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+        frame_start = time.perf_counter()
+        results_changed = False
+        frames_changed = False
+        for stream in self.streams:
+            result = stream.poll_result()
+            if result is not None:
+                results_changed = True
+                for name, distance, confidence in result['matches']:
+                    if name != "Unknown":
+                        self.log_match_with_cooldown(name)
             
-            if self.keyboard_settings['enabled']:
-                status_text = "Keyboard: ON"
-                cv2.putText(frame, status_text, (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(rgb_frame)
-            photo = ImageTk.PhotoImage(image=img)
-            
-            self.video_label.config(image=photo)
-            self.video_label.image = photo
+            frame = stream.poll_frame()
+            if frame is not None:
+                stream.last_frame = frame
+                frames_changed = True
+        
+        if results_changed:
+            self.current_faces_count = sum(len(stream.face_locations) for stream in self.streams)
+            self.update_status()
+        
+        if frames_changed:
+            with METRICS.timer('gui_overlay'):
+                overlays = [self.get_stream_overlay(stream) for stream in self.streams]
+            captions = None
+            if len(self.streams) > 1:
+                # Counters change every frame, so they are drawn per frame instead of rebuilding the overlays
+                captions = [f"{stream.name} {stream.display_fps:.0f} fps {stream.latency_ms:.0f} ms"
+                            for stream in self.streams]
+            render_start = time.perf_counter()
+            rgb_frame = self.renderer.compose([stream.last_frame for stream in self.streams], overlays, captions)
+            if self.show_metrics_overlay:
+                self.get_metrics_overlay(*rgb_frame.shape[:2]).apply(rgb_frame)
+            photo, created = self.renderer.present()
+            if created:
+                self.video_label.config(image=photo)
+                self.video_label.image = photo
+            METRICS.observe('gui_render', time.perf_counter() - render_start)
+            if self.first_frame_time is None:
+                self.record_first_frame()
+            METRICS.observe('gui_frame', time.perf_counter() - frame_start)
             
             self.frame_count += 1
         
         if self.is_camera_running:
-            self.root.after(33, self.update_frame)
+            self.root.after(10, self.update_frame)
+    
+    def record_first_frame(self):
+        """Measure time-to-first-frame from process start and compare it to the configured budget"""
+        self.first_frame_time = time.perf_counter() - STARTUP_TIME
+        METRICS.set_gauge('time_to_first_frame_seconds', self.first_frame_time)
+        budget = float(self.performance_settings.get('first_frame_budget_seconds', 2.0))
+        if self.first_frame_time > budget:
+            print(f"First frame after {self.first_frame_time:.2f} s, over the {budget:.2f} s budget")
+        else:
+            print(f"First frame after {self.first_frame_time:.2f} s")
+    
+    def get_stream_overlay(self, stream):
+        """Overlay layer of a stream, redrawn only when its results or tile size changed"""
+        if stream.last_frame is None:
+            return None
+        frame_height, frame_width = stream.last_frame.shape[:2]
+        if len(self.streams) == 1:
+            height, width = frame_height, frame_width
+        else:
+            width, height = self.renderer.layout(len(self.streams))[:2]
+        key = (stream.last_result_id, self.keyboard_settings['enabled'], height, width)
+        cached = self.stream_overlays.get(stream)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        overlay = OverlayLayer(height, width, lambda layer: self.draw_overlays(
+            layer, stream, width / frame_width, height / frame_height))
+        self.stream_overlays[stream] = (key, overlay)
+        return overlay
+    
+    def draw_overlays(self, frame, stream, scale_x=1.0, scale_y=1.0):
+        """Draw face boxes and names onto a frame scaled from the source size"""
+        face_locations = stream.face_locations
+        if scale_x != 1.0 or scale_y != 1.0:
+            face_locations = [(int(top * scale_y), int(right * scale_x), int(bottom * scale_y), int(left * scale_x))
+                              for top, right, bottom, left in face_locations]
+        draw_face_boxes(frame, face_locations, stream.face_names)
+        
+        if self.keyboard_settings['enabled']:
+            status_text = "Keyboard: ON"
+            cv2.putText(frame, status_text, (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    
+    def get_metrics_overlay(self, height, width):
+        """Overlay layer with the per-stage p50/p95 timings, redrawn at most twice a second"""
+        now = time.perf_counter()
+        overlay = self.metrics_overlay
+        if overlay is not None and overlay.shape == (height, width) and now - self.metrics_overlay_updated < 0.5:
+            return overlay
+        self.metrics_overlay_updated = now
+        stages = METRICS.snapshot()['stages']
+        lines = [f"{stage}: {values.get('p50_ms', 0):.1f}/{values.get('p95_ms', 0):.1f} ms"
+                 for stage, values in stages.items()]
+        
+        def draw(layer):
+            for i, line in enumerate(lines):
+                y = 100 + i * 18
+                cv2.putText(layer, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 3)
+                cv2.putText(layer, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+        
+        self.metrics_overlay = OverlayLayer(height, width, draw)
+        return self.metrics_overlay
+    
+    def toggle_metrics_overlay(self):
+        """Show or hide the p50/p95 stage timings on the video"""
+        self.show_metrics_overlay = not self.show_metrics_overlay
+        self.metrics_button.config(text="Hide Metrics" if self.show_metrics_overlay else "Show Metrics")
+    
+    def start_profiler(self):
+        """Sample every thread for a few seconds and write a top-functions report"""
+        seconds = float(self.performance_settings.get('profile_seconds', 10))
+        profiler = SamplingProfiler(seconds=seconds)
+        
+        def on_done(report_path):
+            text = f"Profile written to {report_path}" if report_path else "Profiling failed"
+            self.root.after(0, lambda: self.profile_button.config(text="Profile", state=tk.NORMAL))
+            self.root.after(0, lambda: self.scheduler_label.config(text=text))
+        
+        if profiler.start(on_done):
+            self.profile_button.config(text=f"Profiling {seconds:.0f}s...", state=tk.DISABLED)
     
     def log_match_with_cooldown(self, name):
         """Log a match with cooldown to prevent spam logging"""
         current_time = datetime.now()
+        cooldown = float(self.performance_settings.get('cooldown_seconds', 30))
+        self.evict_cooldowns(cooldown)
         
-        if name in self.last_logged:
-            time_diff = (current_time - self.last_logged[name]).total_seconds()
-            if time_diff < 30:
-                return
+        # Names not logged by this run fall back to the times the writer read from the database
+        # at start, so a restart does not double-log everyone; the GUI thread never touches the disk
+        if name not in self.last_logged:
+            self.last_logged[name] = self.attendance_writer.recent.get(name, datetime.min)
+        time_diff = (current_time - self.last_logged[name]).total_seconds()
+        if time_diff < cooldown:
+            return
         
-        self.log_match(name)
+        self.log_match(name, current_time)
         self.last_logged[name] = current_time
         
         # Trigger keyboard auto-input if enabled
         if self.keyboard_settings['enabled']:
             self.auto_type_data(name, current_time)
     
+    def evict_cooldowns(self, cooldown):
+        """Drop cooldown entries that have expired, the database still has the full history"""
+        now = time.time()
+        if now - self.last_cooldown_eviction < cooldown:
+            return
+        self.last_cooldown_eviction = now
+        cutoff = datetime.now() - timedelta(seconds=cooldown)
+        for name in [name for name, logged in self.last_logged.items() if logged < cutoff]:
+            del self.last_logged[name]
+    
     def auto_type_data(self, name, timestamp):
-        """Automatically type data to keyboard"""
-        def type_data():
-            try:
-                # Wait for the specified delay
-                time.sleep(self.keyboard_settings['delay_seconds'])
-                
-                # Prepare the data to type
-                now = timestamp
-                date_str = now.strftime('%Y-%m-%d')
-                time_str = now.strftime('%H:%M:%S')
-                timestamp_str = now.strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Format the text according to template
-                text_to_type = self.keyboard_settings['format_template'].format(
-                    name=name,
-                    timestamp=timestamp_str,
-                    date=date_str,
-                    time=time_str
-                )
-                
-                # Type the text
-                pyautogui.typewrite(text_to_type, interval=0.05)
-                
-                # Add additional keys if configured
-                if self.keyboard_settings['add_tab']:
-                    pyautogui.press('tab')
-                
-                if self.keyboard_settings['add_enter']:
-                    pyautogui.press('enter')
-                
-                print(f"Auto-typed: {text_to_type}")
-                
-            except Exception as e:
-                print(f"Error in auto-typing: {e}")
-        
-        # Run in background thread
-        thread = threading.Thread(target=type_data)
-        thread.daemon = True
-        thread.start()
+        """Hand a recognized person to the keyboard dispatcher"""
+        self.keyboard_dispatcher.submit(name, timestamp)
     
     def open_keyboard_config(self):
         """Open keyboard configuration dialog"""
@@ -503,26 +5045,8 @@ class FaceRecognitionApp:
                     'add_tab': add_tab_var.get()
                 })
                 
-                def test_type():
-                    try:
-                        time.sleep(temp_settings['delay_seconds'])
-                        text_to_type = temp_settings['format_template'].format(
-                            name=test_name,
-                            timestamp=test_time.strftime('%Y-%m-%d %H:%M:%S'),
-                            date=test_time.strftime('%Y-%m-%d'),
-                            time=test_time.strftime('%H:%M:%S')
-                        )
-                        pyautogui.typewrite(text_to_type, interval=0.05)
-                        if temp_settings['add_tab']:
-                            pyautogui.press('tab')
-                        if temp_settings['add_enter']:
-                            pyautogui.press('enter')
-                    except Exception as e:
-                        print(f"Test typing error: {e}")
-                
-                thread = threading.Thread(target=test_type)
-                thread.daemon = True
-                thread.start()
+                # Same dispatcher as live recognition, so a test never interleaves with real typing
+                self.keyboard_dispatcher.submit(test_name, test_time, temp_settings)
         
         tk.Button(config_window, text="Test Typing", command=test_typing, 
                  bg="orange", fg="white").pack(pady=10)
@@ -563,24 +5087,11 @@ class FaceRecognitionApp:
                                font=("Arial", 9), fg="gray", justify="left")
         instructions.pack(pady=10, padx=20)
     
-    def log_match(self, name):
-        """Log the matched person and timestamp to CSV"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_data = [name, timestamp]
-        
-        # Log to CSV file
-        log_file = 'Attendance_log.csv'
-        file_exists = os.path.isfile(log_file)
-        
-        try:
-            with open(log_file, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                if not file_exists:
-                    writer.writerow(['Name', 'Timestamp'])
-                writer.writerow(log_data)
-                print(f"Logged to CSV: {name} at {timestamp}")
-        except Exception as e:
-            print(f"Error logging to CSV: {e}")
+    def log_match(self, name, when=None):
+        """Queue the matched person and timestamp for the background CSV writer"""
+        timestamp = (when or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+        with METRICS.timer('log_match'):
+            self.attendance_writer.write(name, timestamp)
     
     def load_configs(self):
         """Load all configurations"""
@@ -593,6 +5104,9 @@ class FaceRecognitionApp:
                     self.keyboard_settings.update(json.load(f))
             except Exception as e:
                 print(f"Error loading keyboard config: {e}")
+        
+        # Load performance config
+        self.performance_settings = load_performance_settings()
     
     def save_configs(self):
         """Save all configurations"""
@@ -607,23 +5121,126 @@ class FaceRecognitionApp:
     def on_closing(self):
         """Handle window closing"""
         self.stop_camera()
+        if self.bulk_recognizer is not None:
+            self.bulk_recognizer.stop_event.set()
+        if self.upload_executor is not None:
+            self.upload_executor.shutdown(wait=False, cancel_futures=True)
+        # Drain pending attendance rows before exiting
+        self.attendance_writer.close()
+        self.keyboard_dispatcher.close()
+        if self.gallery_watcher:
+            self.gallery_watcher.stop()
+        if self.gallery_reload_timer is not None:
+            self.gallery_reload_timer.cancel()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
         self.root.destroy()
 
 if __name__ == "__main__":
-    try:
-        import pyautogui
-    except ImportError:
-        print("Installing pyautogui...")
-        import subprocess
-        import sys
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "pyautogui"])
-        import pyautogui
-
-    pyautogui.FAILSAFE = True  
-    pyautogui.PAUSE = 0.1    
+    import argparse
+    parser = argparse.ArgumentParser(description="Multi-face recognition with keyboard auto-input")
+    parser.add_argument('--bench-index', type=int, metavar='GALLERY_SIZE',
+                        help="benchmark the gallery index backends on a synthetic gallery and exit")
+    parser.add_argument('--bench-queries', type=int, default=1000,
+                        help="number of queries used by --bench-index")
+    parser.add_argument('--prototype-report', action='store_true',
+                        help="compare matching on per-person prototypes with matching on every known face and exit")
+    parser.add_argument('--bench', nargs='?', const='', metavar='CLIP',
+                        help="time every pipeline stage on a recorded clip (or synthetic frames) and exit")
+    parser.add_argument('--bench-frames', type=int, default=100,
+                        help="number of frames timed by --bench")
+    parser.add_argument('--bench-output', metavar='JSON_FILE',
+                        help="also write the --bench results to this file for comparison across commits")
+    parser.add_argument('--headless', nargs='+', metavar='SOURCE',
+                        help="recognize faces in image folders, image files, video files or stream URLs without the GUI")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="worker processes for --headless (0 = one per CPU)")
+    parser.add_argument('--stride', type=int, default=1,
+                        help="process every N-th video frame in --headless mode")
+    parser.add_argument('--scale', type=float, default=0.5,
+                        help="downscale factor applied before detection in --headless mode")
+    parser.add_argument('--upsample', type=int, default=1,
+                        help="detector upsample count in --headless mode")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl',
+                        help="output format for --headless results")
+    parser.add_argument('--output', help="write --headless results to this file instead of stdout")
+    parser.add_argument('--cache', nargs='?', const='bulk_results_cache', metavar='DIR',
+                        help="reuse --headless results of unchanged files, re-matching them only when the gallery changed")
+    parser.add_argument('--serve', nargs='?', const=0, type=int, metavar='PORT',
+                        help="run the recognition service for thin clients on localhost (default port from service_port)")
+    parser.add_argument('--connect', metavar='URL',
+                        help="run the GUI as a thin client of a recognition service, e.g. http://127.0.0.1:9200")
+    parser.add_argument('--present', nargs='?', const='today', metavar='YYYY-MM-DD',
+                        help="list everyone in the attendance database for a day (default today) and exit")
+    parser.add_argument('--history', metavar='NAME',
+                        help="show the attendance history of one person and exit")
+    parser.add_argument('--import-attendance', metavar='CSV_FILE',
+                        help="import an existing attendance CSV into the attendance database and exit")
+    args = parser.parse_args()
+    
+    if args.present or args.history or args.import_attendance:
+        store = AttendanceStore(load_performance_settings().get('attendance_db', 'attendance.db'))
+        start = time.perf_counter()
+        if args.import_attendance:
+            store.import_csv(args.import_attendance)
+        if args.present:
+            day = None if args.present == 'today' else args.present
+            rows = store.present(day)
+            for name, first, last, count in rows:
+                print(f"{name}\tfirst {first}\tlast {last}\t{count} logs")
+            print(f"{len(rows)} people present")
+        if args.history:
+            for ts in store.history(args.history):
+                print(f"{args.history}\t{ts}")
+        print(f"Query took {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+        store.close()
+        sys.exit(0)
+    
+    if args.bench_index:
+        results = benchmark_gallery_index(args.bench_index, args.bench_queries)
+        print(json.dumps(results, indent=2))
+        sys.exit(0)
+    
+    if args.prototype_report:
+        settings = load_performance_settings()
+        with contextlib.redirect_stdout(sys.stderr):
+            encodings, names = load_gallery("./known_people", settings.get('enrollment_workers', 0), settings=settings)
+        per_identity = int(settings.get('identity_prototypes', 0)) or 3
+        results = prototype_report(encodings, names, per_identity, create_matcher(settings).tolerance)
+        print(json.dumps(results, indent=2))
+        sys.exit(0)
+    
+    if args.bench is not None:
+        results = benchmark_pipeline(args.bench or None, args.bench_frames, load_performance_settings())
+        print(json.dumps(results, indent=2))
+        if args.bench_output:
+            with open(args.bench_output, 'w') as f:
+                json.dump(results, f, indent=2)
+        sys.exit(0)
+    
+    if args.headless:
+        output = open(args.output, 'w', newline='') if args.output else None
+        try:
+            recognizer = HeadlessRecognizer(load_performance_settings(), workers=args.workers,
+                                            stride=args.stride, scale=args.scale, upsample=args.upsample,
+                                            output_format=args.format, output=output, cache_folder=args.cache)
+            recognizer.load_gallery()
+            recognizer.run(args.headless)
+        finally:
+            if output:
+                output.close()
+        sys.exit(0)
+    
+    if args.serve is not None:
+        settings = load_performance_settings()
+        service = RecognitionService(settings, port=args.serve or int(settings.get('service_port', 9200)))
+        service.load_gallery()
+        service.start()
+        service.serve_forever()
+        sys.exit(0)
     
     root = tk.Tk()
-    app = FaceRecognitionApp(root)
+    app = FaceRecognitionApp(root, {'recognition_service_url': args.connect} if args.connect else None)
     
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
@@ -0,0 +1,15 @@
+import importlib.util
+import os
+
+import pytest
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.py")
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The application module; test.py would clash with the standard library's test package on import"""
+    spec = importlib.util.spec_from_file_location("face_app", APP_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,25 @@
+def test_slow_detection_moves_to_a_cheaper_point(app):
+    scheduler = app.AdaptiveScheduler(target_latency_ms=150, window_seconds=0)
+    assert scheduler.record_frame(0.5, detect_seconds=0.5)
+    assert scheduler.level == app.AdaptiveScheduler.DEFAULT_LEVEL - 1
+
+
+def test_fast_detection_moves_to_a_more_accurate_point(app):
+    scheduler = app.AdaptiveScheduler(target_latency_ms=150, target_fps=15, window_seconds=0)
+    assert scheduler.record_frame(0.01, detect_seconds=0.01)
+    assert scheduler.current() == app.AdaptiveScheduler.OPERATING_POINTS[app.AdaptiveScheduler.DEFAULT_LEVEL + 1]
+
+
+def test_level_stays_within_the_operating_points(app):
+    scheduler = app.AdaptiveScheduler(target_latency_ms=150, window_seconds=0)
+    for _ in range(20):
+        scheduler.record_frame(1.0, detect_seconds=1.0)
+    assert scheduler.level == 0
+    assert not scheduler.record_frame(1.0, detect_seconds=1.0)
+
+
+def test_disabled_scheduler_keeps_the_fixed_point(app):
+    fixed = {'scale': 0.5, 'upsample': 0, 'interval': 1}
+    scheduler = app.AdaptiveScheduler(enabled=False, fixed_point=fixed, window_seconds=0)
+    assert not scheduler.record_frame(1.0, detect_seconds=1.0)
+    assert scheduler.current() == fixed
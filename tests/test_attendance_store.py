@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+ROWS = [("alice", "2026-10-16 09:00:00"), ("alice", "2026-10-17 08:55:00"),
+        ("bob", "2026-10-17 09:10:00"), ("alice", "2026-10-17 17:30:00")]
+
+
+def test_queries(app, tmp_path):
+    store = app.AttendanceStore(str(tmp_path / "attendance.db"))
+    store.add_many(ROWS)
+    assert store.last_seen("alice") == datetime(2026, 10, 17, 17, 30)
+    assert store.last_seen("carol") is None
+    assert store.first_seen("alice", "2026-10-17") == datetime(2026, 10, 17, 8, 55)
+    assert store.present("2026-10-17") == [("alice", "2026-10-17 08:55:00", "2026-10-17 17:30:00", 2),
+                                           ("bob", "2026-10-17 09:10:00", "2026-10-17 09:10:00", 1)]
+    assert store.history("alice", limit=2) == ["2026-10-17 17:30:00", "2026-10-17 08:55:00"]
+    assert store.last_seen_since(datetime(2026, 10, 17, 9, 0)) == {
+        "alice": datetime(2026, 10, 17, 17, 30), "bob": datetime(2026, 10, 17, 9, 10)}
+    store.close()
+
+
+def test_csv_is_imported_once(app, tmp_path):
+    csv_file = tmp_path / "log.csv"
+    csv_file.write_text("Name,Timestamp\n" + "".join(f"{name},{ts}\n" for name, ts in ROWS))
+    store = app.AttendanceStore(str(tmp_path / "attendance.db"))
+    assert store.import_csv(str(csv_file), batch_size=3) == 4
+    assert store.import_csv(str(csv_file)) == 0
+    assert store.history("bob") == ["2026-10-17 09:10:00"]
+    store.close()
+
+
+def test_writer_fills_the_store_and_reads_recent_logs(app, tmp_path):
+    db_file = str(tmp_path / "attendance.db")
+    recent = (datetime.now() - timedelta(seconds=5)).strftime(app.AttendanceStore.TIMESTAMP_FORMAT)
+    writer = app.AttendanceWriter(str(tmp_path / "log.csv"), db_file=db_file)
+    writer.write("alice", recent)
+    writer.write("bob", "2026-01-01 09:00:00")
+    writer.close()
+
+    writer = app.AttendanceWriter(str(tmp_path / "log.csv"), db_file=db_file, recent_seconds=60)
+    writer.close()
+    assert writer.recent == {"alice": datetime.strptime(recent, app.AttendanceStore.TIMESTAMP_FORMAT)}
@@ -0,0 +1,46 @@
+import csv
+import os
+from datetime import date
+
+
+def read_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_close_flushes_queued_rows_after_one_header(app, tmp_path):
+    log_file = str(tmp_path / "log.csv")
+    writer = app.AttendanceWriter(log_file, batch_size=100, flush_seconds=60)
+    writer.write("alice", "2026-10-17 09:00:00")
+    writer.write("bob", "2026-10-17 09:00:05")
+    writer.close()
+    assert read_rows(log_file) == [['Name', 'Timestamp'], ['alice', '2026-10-17 09:00:00'],
+                                   ['bob', '2026-10-17 09:00:05']]
+    assert writer.rows_written == 2 and writer.pending() == 0
+
+
+def test_full_batch_is_written_without_waiting(app, tmp_path):
+    log_file = str(tmp_path / "log.csv")
+    writer = app.AttendanceWriter(log_file, batch_size=2, flush_seconds=60)
+    writer.write("alice", "2026-10-17 09:00:00")
+    writer.write("bob", "2026-10-17 09:00:05")
+    try:
+        for _ in range(200):
+            if writer.rows_written == 2:
+                break
+            writer.thread.join(0.01)
+        assert writer.rows_written == 2
+    finally:
+        writer.close()
+
+
+def test_log_of_an_earlier_day_is_rotated(app, tmp_path):
+    log_file = tmp_path / "log.csv"
+    log_file.write_text("Name,Timestamp\nalice,2026-10-16 09:00:00\n")
+    writer = app.AttendanceWriter(str(log_file), rotate='day')
+    writer.file_date = date(2026, 10, 16)
+    writer.write("bob", "2026-10-17 09:00:00")
+    writer.close()
+    assert read_rows(tmp_path / "log_2026-10-16.csv")[1] == ['alice', '2026-10-16 09:00:00']
+    assert read_rows(log_file) == [['Name', 'Timestamp'], ['bob', '2026-10-17 09:00:00']]
+    assert sorted(os.listdir(tmp_path)) == ["log.csv", "log_2026-10-16.csv"]
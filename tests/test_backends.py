@@ -0,0 +1,35 @@
+import gc
+
+import numpy as np
+
+
+def test_backends_are_shared_per_process(app):
+    assert app.get_backend('hog') is app.get_backend('hog')
+    assert app.get_backend('no-such-backend') is app.get_backend('hog')
+    assert app.get_backend('cnn').cache_file != app.get_backend('hog').cache_file
+
+
+def test_yunet_tolerance_is_the_cosine_threshold(app):
+    backend = app.YuNetSFaceBackend({'sface_cosine_threshold': 0.4})
+    a = np.zeros(128, dtype=np.float32)
+    a[0] = 1
+    b = np.zeros(128, dtype=np.float32)
+    b[:2] = (0.4, np.sqrt(1 - 0.4 ** 2))
+    assert np.isclose(np.linalg.norm(a - b), backend.tolerance)
+    assert np.isclose(backend.confidence(backend.tolerance), 0.4)
+
+
+def test_yunet_landmarks_belong_to_one_image_object(app):
+    backend = app.YuNetSFaceBackend()
+    backend.local.detections = {}  # normally created with the models
+    box = (10, 60, 60, 10)
+    face = np.arange(15, dtype=np.float32)
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    backend.remember(image, box, face)
+    assert backend.detection(image, box) is face
+    assert backend.detection(image.copy(), box) is None
+    # A later frame may get the freed frame's id and buffer, it must not get its landmarks
+    del image
+    gc.collect()
+    frames = [np.zeros((120, 160, 3), dtype=np.uint8) for _ in range(64)]
+    assert all(backend.detection(frame, box) is None for frame in frames)
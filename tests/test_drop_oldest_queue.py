@@ -0,0 +1,28 @@
+import threading
+
+
+def test_full_queue_drops_the_oldest_item(app):
+    queue = app.DropOldestQueue(maxsize=2)
+    for item in range(5):
+        queue.put(item)
+    assert queue.dropped == 3
+    assert [queue.get(timeout=0), queue.get(timeout=0)] == [3, 4]
+
+
+def test_get_times_out_when_empty(app):
+    assert app.DropOldestQueue().get(timeout=0.01) is None
+
+
+def test_get_latest_discards_older_items(app):
+    queue = app.DropOldestQueue(maxsize=3)
+    for item in range(3):
+        queue.put(item)
+    assert queue.get_latest() == 2
+    assert len(queue) == 0 and queue.dropped == 2
+    assert queue.get_latest() is None
+
+
+def test_get_wakes_up_on_put(app):
+    queue = app.DropOldestQueue()
+    threading.Timer(0.05, queue.put, args=("frame",)).start()
+    assert queue.get(timeout=5) == "frame"
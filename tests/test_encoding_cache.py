@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def write_image(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_round_trip_by_content(app, tmp_path):
+    cache_file = str(tmp_path / "cache.pkl")
+    image = write_image(tmp_path / "a.jpg", b"alice")
+    cache = app.EncodingCache(cache_file, "model-a")
+    assert cache.get(image) is None
+    cache.put(image, [np.ones(128)])
+    cache.save()
+
+    reloaded = app.EncodingCache(cache_file, "model-a")
+    encodings = reloaded.get(image)
+    assert len(encodings) == 1 and np.array_equal(encodings[0], np.ones(128))
+    assert (reloaded.hits, reloaded.misses) == (1, 0)
+
+
+def test_copy_with_same_content_is_a_hit(app, tmp_path):
+    cache = app.EncodingCache(str(tmp_path / "cache.pkl"), "model-a")
+    cache.put(write_image(tmp_path / "a.jpg", b"alice"), [])
+    assert cache.get(write_image(tmp_path / "b.jpg", b"alice")) == []
+
+
+def test_other_model_discards_cache(app, tmp_path):
+    cache_file = str(tmp_path / "cache.pkl")
+    image = write_image(tmp_path / "a.jpg", b"alice")
+    cache = app.EncodingCache(cache_file, "model-a")
+    cache.put(image, [np.ones(128)])
+    cache.save()
+    assert app.EncodingCache(cache_file, "model-b").get(image) is None
+
+
+def test_prune_drops_missing_files(app, tmp_path):
+    cache = app.EncodingCache(str(tmp_path / "cache.pkl"), "model-a")
+    kept = write_image(tmp_path / "a.jpg", b"alice")
+    gone = write_image(tmp_path / "b.jpg", b"bob")
+    cache.put(kept, [np.ones(128)])
+    cache.put(gone, [np.zeros(128)])
+    cache.prune([kept])
+    assert list(cache.files) == [kept]
+    assert len(cache.encodings) == 1
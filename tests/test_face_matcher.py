@@ -0,0 +1,26 @@
+import numpy as np
+
+
+def gallery(seed=0, count=20):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, 0.3, (count, 128)).astype(np.float32), [f"person{i}" for i in range(count)]
+
+
+def test_matches_every_face_of_a_frame(app):
+    encodings, names = gallery()
+    matcher = app.FaceMatcher(encodings, names, tolerance=0.5)
+    faces = [encodings[3] + 0.01, encodings[7] - 0.01]
+    assert [name for name, distance, confidence in matcher.match(faces)] == ["person3", "person7"]
+
+
+def test_faces_beyond_tolerance_are_unknown(app):
+    encodings, names = gallery()
+    matcher = app.FaceMatcher(encodings, names, tolerance=0.5)
+    name, distance, confidence = matcher.match([encodings[0] + 1.0])[0]
+    assert name == "Unknown" and distance > 0.5 and confidence == 0
+
+
+def test_empty_gallery_and_no_faces(app):
+    matcher = app.FaceMatcher()
+    assert matcher.match([]) == []
+    assert [name for name, _, _ in matcher.match([np.zeros(128)])] == ["Unknown"]
@@ -0,0 +1,38 @@
+def test_new_faces_start_tracks_that_need_encoding(app):
+    tracker = app.FaceTracker()
+    stale = tracker.update([(10, 60, 60, 10), (10, 200, 60, 150)])
+    assert [track.track_id for track in stale] == [1, 2]
+
+
+def test_verified_tracks_are_not_encoded_again(app):
+    tracker = app.FaceTracker(reverify_seconds=60)
+    for track in tracker.update([(10, 60, 60, 10)]):
+        tracker.set_identity(track, ("alice", 0.3, 0.7))
+    assert tracker.update([(12, 62, 62, 12)]) == []
+    assert [track.name for track in tracker.tracks] == ["alice"]
+
+
+def test_moving_face_keeps_its_track(app):
+    tracker = app.FaceTracker(smoothing=1.0)
+    tracker.update([(10, 60, 60, 10)])
+    # Too little overlap with the previous box, matched by centroid distance instead
+    tracker.update([(27, 77, 77, 27)])
+    assert len(tracker.tracks) == 1 and tracker.tracks[0].int_box() == (27, 77, 77, 27)
+
+
+def test_missed_tracks_are_dropped(app):
+    tracker = app.FaceTracker(max_missed=2)
+    tracker.update([(10, 60, 60, 10)])
+    for _ in range(2):
+        tracker.update([])
+    assert tracker.tracks[0].missed == 2
+    tracker.update([])
+    assert tracker.tracks == []
+
+
+def test_invalidate_forces_reencoding(app):
+    tracker = app.FaceTracker(reverify_seconds=60)
+    for track in tracker.update([(10, 60, 60, 10)]):
+        tracker.set_identity(track, ("alice", 0.3, 0.7))
+    tracker.invalidate()
+    assert len(tracker.update([(10, 60, 60, 10)])) == 1
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+
+def clustered_gallery(size=4000, queries=200, seed=0):
+    """Noisy copies of identity centres, like the encodings of several photos per person"""
+    rng = np.random.default_rng(seed)
+    identities = rng.normal(0, 0.1, (size // 4, 128)).astype(np.float32)
+    vectors = identities[rng.integers(0, len(identities), size)]
+    vectors = vectors + rng.normal(0, 0.03, vectors.shape).astype(np.float32)
+    picks = vectors[rng.integers(0, size, queries)]
+    return vectors, picks + rng.normal(0, 0.03, picks.shape).astype(np.float32)
+
+
+def test_exact_search_is_brute_force(app):
+    vectors, queries = clustered_gallery(500, 50)
+    index = app.ExactIndex()
+    index.build(vectors)
+    distances, ids = index.search(queries, k=3)
+    brute = np.linalg.norm(queries[:, None, :] - vectors[None, :, :], axis=2)
+    assert np.array_equal(ids, np.argsort(brute, axis=1)[:, :3])
+    assert np.allclose(distances, np.sort(brute, axis=1)[:, :3], atol=1e-4)
+
+
+@pytest.mark.parametrize("nprobe, min_recall", [(8, 0.9), (64, 0.99)])
+def test_ivf_recall_against_exact(app, nprobe, min_recall):
+    vectors, queries = clustered_gallery()
+    exact = app.ExactIndex()
+    exact.build(vectors)
+    ivf = app.IVFIndex(nprobe=nprobe)
+    ivf.build(vectors)
+    truth = exact.search(queries)[1][:, 0]
+    found = ivf.search(queries)[1][:, 0]
+    assert np.mean(found == truth) >= min_recall
+
+
+def test_ivf_probing_every_list_is_exact(app):
+    vectors, queries = clustered_gallery(1000, 100)
+    exact = app.ExactIndex()
+    exact.build(vectors)
+    ivf = app.IVFIndex(nlist=16, nprobe=16)
+    ivf.build(vectors)
+    assert np.array_equal(ivf.search(queries, k=5)[1], exact.search(queries, k=5)[1])
+
+
+@pytest.mark.parametrize("kind", ['exact', 'ivf'])
+def test_add_and_remove(app, kind):
+    vectors, _ = clustered_gallery(400, 1)
+    index = app.GALLERY_INDEX_BACKENDS[kind]()
+    index.build(vectors[:300])
+    index.add(vectors[300:], np.arange(300, 400))
+    index.remove([5, 350])
+    assert len(index) == 398
+    ids = index.search(vectors[[5, 6, 350, 351]])[1][:, 0]
+    assert ids[0] not in (5, -1) and ids[1] == 6 and ids[2] not in (350, -1) and ids[3] == 351
+
+
+@pytest.mark.parametrize("kind", ['exact', 'ivf'])
+def test_save_and_load(app, kind, tmp_path):
+    vectors, queries = clustered_gallery(1000, 50)
+    index = app.GALLERY_INDEX_BACKENDS[kind]()
+    index.build(vectors)
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = app.ExactIndex.load(path)
+    assert type(loaded) is type(index)
+    assert np.array_equal(loaded.search(queries)[1], index.search(queries)[1])
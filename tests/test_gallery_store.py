@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+
+def gallery(count=300, seed=0):
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.1, (count, 128)).astype(np.float32)
+    names = [f"person{i % 40}" for i in range(count)]
+    paths = [f"known_people/person{i % 40}/{i}.jpg" for i in range(count)]
+    return encodings, names, paths
+
+
+@pytest.mark.parametrize("dtype, atol", [('float32', 0), ('float16', 1e-3), ('int8', 5e-3)])
+def test_round_trip(app, tmp_path, dtype, atol):
+    encodings, names, paths = gallery()
+    path = str(tmp_path / "store")
+    app.GalleryStore.create(path, encodings, names, paths, dtype=dtype, model_tag="m", signature="sig")
+    store = app.GalleryStore(path)
+    assert len(store) == len(names) and store.meta['signature'] == "sig"
+    assert np.allclose(store.dequantize(store.vectors), encodings, atol=atol)
+    assert list(store.names()) == names
+    assert store.paths() == paths
+    # Names are interned, not stored per row
+    assert len(store.name_table) == 40
+
+
+def test_unknown_dtype_is_rejected(app, tmp_path):
+    encodings, names, paths = gallery(10)
+    with pytest.raises(ValueError):
+        app.GalleryStore.create(str(tmp_path / "store"), encodings, names, paths, dtype='float64')
+
+
+def test_append_remove_and_compact(app, tmp_path):
+    encodings, names, paths = gallery()
+    path = str(tmp_path / "store")
+    store = app.GalleryStore.create(path, encodings[:200], names[:200], paths[:200], signature="sig")
+    rows = store.append(encodings[200:], names[200:], paths[200:])
+    assert list(rows) == list(range(200, 300))
+    store.remove([3, 250])
+    assert store.meta['signature'] == ""
+
+    reopened = app.GalleryStore(path)
+    assert len(reopened) == 300 and sorted(reopened.removed) == [3, 250]
+    mapping = reopened.compact()
+    assert mapping[3] == -1 and mapping[250] == -1
+    assert mapping[4] == 3 and mapping[299] == 297
+    compacted = app.GalleryStore(path)
+    assert len(compacted) == 298 and len(compacted.removed) == 0
+    kept = np.delete(np.arange(300), [3, 250])
+    assert np.array_equal(np.asarray(compacted.vectors), encodings[kept])
+    assert list(compacted.names()) == [names[i] for i in kept]
+
+
+@pytest.mark.parametrize("dtype", ['float32', 'int8'])
+def test_mapped_index_matches_exact(app, tmp_path, dtype):
+    encodings, names, paths = gallery(1000)
+    store = app.GalleryStore.create(str(tmp_path / "store"), encodings, names, paths, dtype=dtype)
+    mapped = app.MappedIndex(store=store, chunk_size=128)
+    exact = app.ExactIndex()
+    exact.build(store.dequantize(store.vectors))
+    queries = encodings[::50] + 0.01
+    assert np.array_equal(mapped.search(queries, k=3)[1], exact.search(queries, k=3)[1])
+
+
+def test_mapped_index_add_and_remove(app, tmp_path):
+    encodings, names, paths = gallery(400)
+    store = app.GalleryStore.create(str(tmp_path / "store"), encodings[:300], names[:300], paths[:300])
+    index = app.MappedIndex(store=store, chunk_size=64)
+    index.add(encodings[300:], np.arange(300, 400))
+    index.remove([5, 350])
+    assert len(index) == 398
+    ids = index.search(encodings[[5, 6, 350, 351]])[1][:, 0]
+    assert ids[0] != 5 and ids[1] == 6 and ids[2] != 350 and ids[3] == 351
@@ -0,0 +1,47 @@
+import os
+import threading
+
+
+def test_face_names_come_from_folder_or_file(app, tmp_path):
+    folder = str(tmp_path)
+    top = os.path.join(folder, "alice.jpg")
+    nested = os.path.join(folder, "bob", "holiday.jpg")
+    assert app.gallery_face_names(folder, top, 1) == ["alice"]
+    assert app.gallery_face_names(folder, nested, 1) == ["bob"]
+    assert app.gallery_face_names(folder, nested, 2) == ["bob_1", "bob_2"]
+    assert app.gallery_face_names(folder, nested, 0) == []
+
+
+def test_scan_lists_images_only(app, tmp_path):
+    (tmp_path / "alice.jpg").write_bytes(b"a")
+    (tmp_path / "bob").mkdir()
+    (tmp_path / "bob" / "one.PNG").write_bytes(b"bb")
+    (tmp_path / "notes.txt").write_text("not an image")
+    snapshot = app.GalleryWatcher(str(tmp_path), on_change=None).scan()
+    assert sorted(snapshot) == [str(tmp_path / "alice.jpg"), str(tmp_path / "bob" / "one.PNG")]
+    assert snapshot[str(tmp_path / "bob" / "one.PNG")][0] == 2
+
+
+def test_watcher_reports_changed_and_removed(app, tmp_path):
+    (tmp_path / "alice.jpg").write_bytes(b"a")
+    (tmp_path / "bob.jpg").write_bytes(b"b")
+    changed, removed = set(), set()
+    expected = ({str(tmp_path / "alice.jpg"), str(tmp_path / "carol.jpg")}, {str(tmp_path / "bob.jpg")})
+    done = threading.Event()
+
+    def on_change(changed_paths, removed_paths):
+        # The edits may be picked up by more than one scan
+        changed.update(changed_paths)
+        removed.update(removed_paths)
+        if (changed, removed) == expected:
+            done.set()
+
+    watcher = app.GalleryWatcher(str(tmp_path), on_change, poll_seconds=0.05, settle_seconds=0)
+    watcher.start()
+    try:
+        (tmp_path / "carol.jpg").write_bytes(b"c")
+        (tmp_path / "alice.jpg").write_bytes(b"a longer file")
+        os.remove(tmp_path / "bob.jpg")
+        assert done.wait(5), (changed, removed)
+    finally:
+        watcher.stop()
@@ -0,0 +1,43 @@
+import io
+import json
+
+import pytest
+
+BOXES = [(10, 60, 60, 10), (100, 180, 180, 100)]
+MATCHES = [("alice", 0.31234, 0.68766), ("Unknown", float('inf'), 0)]
+
+
+@pytest.fixture
+def recognizer(app):
+    def create(output_format='jsonl'):
+        return app.HeadlessRecognizer(dict(app.DEFAULT_PERFORMANCE_SETTINGS), workers=1,
+                                      output_format=output_format, output=io.StringIO())
+    return create
+
+
+def test_jsonl_record_per_frame(recognizer):
+    headless = recognizer()
+    headless.write_result("clip.mp4", 12, BOXES, [], MATCHES)
+    record = json.loads(headless.output.getvalue())
+    assert record['source'] == "clip.mp4" and record['frame'] == 12
+    assert record['faces'][0] == {'box': [10, 60, 60, 10], 'name': "alice", 'distance': 0.3123, 'confidence': 0.6877}
+    assert record['faces'][1]['distance'] is None
+    assert (headless.frames, headless.faces) == (1, 2)
+
+
+def test_csv_row_per_face_after_one_header(recognizer):
+    headless = recognizer('csv')
+    headless.write_result("a.jpg", 0, BOXES, [], MATCHES)
+    headless.write_result("b.jpg", 0, BOXES[:1], [], MATCHES[:1])
+    lines = headless.output.getvalue().splitlines()
+    assert lines[0].startswith("Source,Frame,Top") and len(lines) == 4
+    assert lines[1] == "a.jpg,0,10,60,60,10,alice,0.3123,0.6877"
+
+
+def test_folders_expand_to_sorted_media_files(recognizer, tmp_path):
+    for name in ["b.jpg", "a.png", "notes.txt", "sub/c.mp4"]:
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_bytes(b"")
+    files = recognizer().expand_sources([str(tmp_path), "rtsp://camera/stream"])
+    assert files == [str(tmp_path / "a.png"), str(tmp_path / "b.jpg"), str(tmp_path / "sub" / "c.mp4"),
+                     "rtsp://camera/stream"]
@@ -0,0 +1,81 @@
+import time
+from datetime import datetime
+
+import pytest
+
+SETTINGS = {'delay_seconds': 0.2, 'format_template': '{name}', 'add_tab': False, 'add_enter': True}
+
+
+class FakeKeyboard:
+    """Records keystrokes instead of sending them to the focused window"""
+
+    def __init__(self):
+        self.keys = []
+
+    def typewrite(self, text, interval=0):
+        self.keys.append(text)
+
+    def press(self, key):
+        self.keys.append(f"<{key}>")
+
+
+@pytest.fixture
+def keyboard(app, monkeypatch):
+    fake = FakeKeyboard()
+    monkeypatch.setattr(app, 'pyautogui', fake)
+    return fake
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_waiting_name_is_merged(app, keyboard):
+    dispatcher = app.KeyboardDispatcher(SETTINGS)
+    try:
+        now = datetime.now()
+        assert dispatcher.submit("alice", now)
+        assert not dispatcher.submit("alice", now)
+        assert dispatcher.submit("bob", now)
+        assert wait_for(lambda: dispatcher.typed == 2)
+        assert keyboard.keys == ["alice", "<enter>", "bob", "<enter>"]
+        assert dispatcher.merged == 1
+        # Once typed the name may be queued again
+        assert dispatcher.submit("alice", now)
+    finally:
+        dispatcher.close()
+
+
+def test_full_queue_drops_entries(app, keyboard):
+    dispatcher = app.KeyboardDispatcher(dict(SETTINGS, delay_seconds=60), max_pending=2)
+    try:
+        now = datetime.now()
+        results = [dispatcher.submit(name, now) for name in ("a", "b", "c", "d")]
+        # The worker may already hold one entry while it waits out the delay
+        assert results[:2] == [True, True] and results.count(True) <= 3
+        assert dispatcher.dropped == results.count(False)
+    finally:
+        dispatcher.close()
+    assert keyboard.keys == []
+
+
+def test_test_entries_keep_their_own_settings(app, keyboard):
+    dispatcher = app.KeyboardDispatcher(SETTINGS)
+    try:
+        now = datetime.now()
+        dispatcher.submit("alice", now)
+        test_settings = dict(SETTINGS, delay_seconds=0, format_template='[{name}]', add_enter=False)
+        assert dispatcher.submit("alice", now, settings=test_settings)
+        assert wait_for(lambda: dispatcher.typed == 2)
+        assert keyboard.keys == ["alice", "<enter>", "[alice]"]
+    finally:
+        dispatcher.close()
+
+
+def test_format_keyboard_text(app):
+    timestamp = datetime(2024, 5, 6, 7, 8, 9)
+    text = app.format_keyboard_text('{name} {date} {time} | {timestamp}', "alice", timestamp)
+    assert text == "alice 2024-05-06 07:08:09 | 2024-05-06 07:08:09"
@@ -0,0 +1,41 @@
+def test_percentiles_of_recent_samples(app):
+    histogram = app.RollingHistogram(window=100)
+    assert histogram.percentiles() is None
+    for ms in range(1, 201):
+        histogram.observe(ms / 1000)
+    assert histogram.count == 200
+    assert histogram.percentiles()['p50_ms'] == 150.5  # only the last 100 samples
+
+
+def test_prometheus_buckets_are_cumulative(app):
+    metrics = app.Metrics()
+    for seconds in (0.0004, 0.003, 0.003, 7.0):
+        metrics.observe('detect', seconds)
+    metrics.set_gauge('Cam 1 fps', 14.5)
+    text = metrics.to_prometheus()
+    assert 'face_stage_seconds_bucket{stage="detect",le="0.0005"} 1' in text
+    assert 'face_stage_seconds_bucket{stage="detect",le="0.005"} 3' in text
+    assert 'face_stage_seconds_bucket{stage="detect",le="5"} 3' in text
+    assert 'face_stage_seconds_bucket{stage="detect",le="+Inf"} 4' in text
+    assert 'face_stage_seconds_count{stage="detect"} 4' in text
+    assert 'face_Cam_1_fps 14.5' in text
+
+
+def test_timer_and_disabled_registry(app):
+    metrics = app.Metrics()
+    with metrics.timer('match'):
+        pass
+    assert metrics.snapshot()['stages']['match']['count'] == 1
+    metrics.enabled = False
+    metrics.observe('match', 0.1)
+    assert metrics.snapshot()['stages']['match']['count'] == 1
+
+
+def test_prometheus_file_is_replaced_whole(app, tmp_path):
+    metrics = app.Metrics()
+    metrics.observe('encode', 0.01)
+    path = str(tmp_path / "metrics.prom")
+    metrics.write_prometheus(path)
+    with open(path) as f:
+        assert f.read() == metrics.to_prometheus()
+    assert not (tmp_path / "metrics.prom.tmp").exists()
@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def scene(block_left=None):
+    frame = np.full((480, 640, 3), 90, dtype=np.uint8)
+    frame[::40] = 60  # some texture that never moves
+    if block_left is not None:
+        frame[200:300, block_left:block_left + 80] = 230
+    return frame
+
+
+def test_first_frame_learns_background(app):
+    assert app.MotionDetector().update(scene()) is None
+
+
+def test_static_scene_has_no_motion(app):
+    detector = app.MotionDetector()
+    detector.update(scene())
+    for _ in range(3):
+        assert detector.update(scene()) == []
+    assert detector.motion_fraction == 0
+
+
+def test_moving_block_is_boxed(app):
+    detector = app.MotionDetector()
+    detector.update(scene())
+    boxes = detector.update(scene(block_left=300))
+    assert len(boxes) == 1
+    top, right, bottom, left = boxes[0]
+    assert top <= 200 and bottom >= 300 and left <= 300 and right >= 380
+    assert bottom - top < 240 and right - left < 240
+    assert detector.motion_fraction > 0
+
+
+def test_regions_are_padded_merged_and_clipped(app):
+    boxes = [(100, 200, 200, 100), (150, 260, 250, 160), (0, 640, 40, 600)]
+    regions = app.detection_regions(boxes, 480, 640)
+    assert regions == [(50, 310, 300, 50), (0, 640, 60, 580)]
+    assert app.detection_regions([], 480, 640) == []
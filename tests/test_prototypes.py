@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+
+
+def two_looks(rng, people=5, photos=12):
+    """Every person photographed in two distinct conditions, plus one stray face"""
+    encodings, names, paths = [], [], []
+    for person in range(people):
+        looks = rng.normal(0, 0.3, (2, 128))
+        for photo in range(photos):
+            encodings.append(looks[photo % 2] + rng.normal(0, 0.02, 128))
+            names.append(f"person{person}")
+            paths.append(f"person{person}/{photo}.jpg")
+        encodings.append(rng.normal(0, 0.3, 128))
+        names.append(f"person{person}")
+        paths.append(f"person{person}/group.jpg")
+    return np.asarray(encodings, dtype=np.float32), names, paths
+
+
+def test_at_most_per_identity_prototypes(app):
+    encodings, names, paths = two_looks(np.random.default_rng(0))
+    proto_encodings, proto_names, proto_paths = app.identity_prototypes(encodings, names, paths, per_identity=3)
+    for person in set(names):
+        assert 1 <= proto_names.count(person) <= 3
+    # The stray face in the group photo is an outlier, not a prototype
+    assert not any(path.endswith("group.jpg") for path in proto_paths)
+    assert all(path.startswith(name + "/") for name, path in zip(proto_names, proto_paths))
+
+
+def test_prototypes_still_match_new_photos(app):
+    rng = np.random.default_rng(1)
+    encodings, names, paths = two_looks(rng)
+    proto_encodings, proto_names, _ = app.identity_prototypes(encodings, names, paths)
+    matcher = app.FaceMatcher(proto_encodings, proto_names, tolerance=0.6)
+    queries = encodings[::13] + rng.normal(0, 0.02, encodings[::13].shape).astype(np.float32)
+    assert [match[0] for match in matcher.match(queries)] == names[::13]
+
+
+def test_small_identities_are_kept_as_is(app):
+    encodings = np.eye(4, 128, dtype=np.float32)
+    names = ["a", "a", "b", "c"]
+    proto_encodings, proto_names, proto_paths = app.identity_prototypes(encodings, names)
+    assert proto_names == names and proto_paths == [None] * 4
+    assert np.array_equal(np.asarray(proto_encodings), encodings)
+    assert app.identity_prototypes([], []) == ([], [], [])
+
+
+def test_subfolder_faces_share_one_identity(app, tmp_path):
+    folder = str(tmp_path)
+    nested = os.path.join(folder, "bob", "holiday.jpg")
+    assert app.gallery_face_names(folder, nested, 2, one_identity=True) == ["bob", "bob"]
+    # Top-level group photos still number their faces
+    top = os.path.join(folder, "team.jpg")
+    assert app.gallery_face_names(folder, top, 2, one_identity=True) == ["team_1", "team_2"]
@@ -0,0 +1,23 @@
+import pytest
+
+QUALITY = {'size': 60, 'sharpness': 80.0, 'brightness': 120.0, 'yaw': 0.1}
+
+
+@pytest.mark.parametrize("threshold", ['min_face_px', 'min_sharpness', 'max_yaw'])
+def test_zero_threshold_disables_check(app, threshold):
+    gate = app.QualityGate(**{threshold: 0})
+    score = gate.score(QUALITY)
+    assert 0.0 < score <= 1.0
+    assert gate.failures(QUALITY) == []
+
+
+def test_zero_max_brightness_disables_upper_bound(app):
+    gate = app.QualityGate(max_brightness=0)
+    assert gate.failures(dict(QUALITY, brightness=250.0)) == []
+
+
+def test_failures_name_each_check(app):
+    gate = app.QualityGate()
+    poor = {'size': 10, 'sharpness': 5.0, 'brightness': 10.0, 'yaw': 0.9}
+    assert gate.failures(poor) == ['size', 'blur', 'light', 'pose']
+    assert gate.score(poor) < gate.score(QUALITY)
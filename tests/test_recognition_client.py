@@ -0,0 +1,70 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+
+class StubService(BaseHTTPRequestHandler):
+    """Answers every POST with the status and body the test queued"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+    replies = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        status, body = self.replies.pop(0)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def client(app):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubService)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    client = app.RecognitionClient(f"127.0.0.1:{server.server_address[1]}", client_id="test")
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+IMAGE = np.zeros((64, 64, 3), dtype=np.uint8)
+
+
+def test_detect_returns_boxes(client):
+    StubService.replies = [(200, {'boxes': [[1, 20, 20, 2]]})]
+    assert client.detect(IMAGE) == [(1, 20, 20, 2)]
+
+
+def test_busy_service_is_not_no_faces(client):
+    StubService.replies = [(503, {'error': 'busy'}), (200, {'boxes': []})]
+    assert client.detect(IMAGE) is None
+    assert client.detect(IMAGE) == []
+    assert client.busy == 1 and client.requests == 2
+
+
+def test_errors_raise(client):
+    StubService.replies = [(500, {'error': 'broken'})]
+    with pytest.raises(ValueError):
+        client.detect(IMAGE)
+    assert client.errors == 1
+
+
+def test_recognize_parses_matches(client):
+    faces = [{'box': [0, 10, 10, 0], 'name': 'alice', 'distance': 0.3, 'confidence': 70},
+             {'box': [5, 30, 30, 5], 'name': 'Unknown', 'distance': None, 'confidence': 0}]
+    StubService.replies = [(200, {'faces': faces}), (503, {}), (200, {'faces': faces[:1]})]
+    boxes, matches = client.recognize_image(IMAGE)
+    assert boxes == [(0, 10, 10, 0), (5, 30, 30, 5)]
+    assert matches == [('alice', 0.3, 70), ('Unknown', float('inf'), 0)]
+    assert client.recognize([(IMAGE, (0, 10, 10, 0))]) is None
+    assert client.recognize([(IMAGE, (0, 10, 10, 0))]) == [('alice', 0.3, 70)]
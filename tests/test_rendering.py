@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+
+
+def frame(seed=0, height=120, width=160):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def draw_box(layer):
+    cv2.rectangle(layer, (20, 30), (60, 90), (0, 0, 255), cv2.FILLED)
+
+
+def test_overlay_keeps_only_drawn_pixels(app):
+    overlay = app.OverlayLayer(120, 160, draw_box)
+    assert len(overlay.indices) == 41 * 61
+    rgb = cv2.cvtColor(frame(), cv2.COLOR_BGR2RGB)
+    expected = rgb.copy()
+    expected[30:91, 20:61] = (255, 0, 0)  # red in RGB
+    overlay.apply(rgb)
+    assert np.array_equal(rgb, expected)
+
+
+def test_single_frame_is_converted_into_a_reused_buffer(app):
+    renderer = app.FrameRenderer()
+    first = renderer.compose([frame(0)])
+    assert np.array_equal(first, cv2.cvtColor(frame(0), cv2.COLOR_BGR2RGB))
+    assert renderer.compose([frame(1)]) is first
+
+
+def test_several_frames_are_tiled(app):
+    renderer = app.FrameRenderer(width=800, height=600)
+    tile_width, tile_height, rows, cols, corners = renderer.layout(3)
+    assert (rows, cols) == (2, 2) and corners[2] == (tile_height, 0)
+    overlay = app.OverlayLayer(tile_height, tile_width, draw_box)
+    rgb = renderer.compose([frame(0), None, frame(2)], [overlay, None, None])
+    assert rgb.shape == (600, 800, 3)
+    assert tuple(rgb[40, 40]) == (255, 0, 0)
+    assert not rgb[:tile_height, tile_width:].any()  # the missing source is black
+
+
+def test_captions_are_drawn_without_the_overlay(app):
+    renderer = app.FrameRenderer(width=800, height=600)
+    plain = renderer.compose([frame(0), frame(1)]).copy()
+    captioned = renderer.compose([frame(0), frame(1)], None, ["Cam 1 15 fps 40 ms", ""])
+    tile_width, tile_height = renderer.layout(2)[:2]
+    changed = np.any(captioned != plain, axis=2)
+    assert changed[tile_height - 40:tile_height, :tile_width].any()
+    assert not changed[:, tile_width:].any()
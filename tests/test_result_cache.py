@@ -0,0 +1,32 @@
+import numpy as np
+
+FRAMES = [(0, [(0, 10, 10, 0)], [np.ones(128, dtype=np.float32)], [("alice", 0.3, 70)])]
+
+
+def test_round_trip_across_instances(app, tmp_path):
+    media = tmp_path / "clip.mp4"
+    media.write_bytes(b"video")
+    directory = str(tmp_path / "cache")
+    cache = app.ResultCache(directory, tag="hog")
+    assert cache.get(str(media)) is None
+    cache.put(str(media), FRAMES, gallery_version=3)
+    cache.save()
+
+    entry = app.ResultCache(directory, tag="hog").get(str(media))
+    assert entry['gallery_version'] == 3
+    (index, locations, encodings, matches), = entry['frames']
+    assert (index, locations, matches) == (0, [(0, 10, 10, 0)], [("alice", 0.3, 70)])
+    assert np.array_equal(encodings[0], np.ones(128))
+
+
+def test_keyed_by_content_and_settings(app, tmp_path):
+    first, copy, other = tmp_path / "a.jpg", tmp_path / "b.jpg", tmp_path / "c.jpg"
+    first.write_bytes(b"same")
+    copy.write_bytes(b"same")
+    other.write_bytes(b"different")
+    cache = app.ResultCache(str(tmp_path / "cache"), tag="hog")
+    cache.put(str(first), FRAMES, gallery_version=1)
+    assert cache.get(str(copy)) is not None
+    assert cache.get(str(other)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert app.ResultCache(str(tmp_path / "cache"), tag="cnn").get(str(first)) is None
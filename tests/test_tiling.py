@@ -0,0 +1,44 @@
+import numpy as np
+
+
+def test_small_image_is_one_tile(app):
+    assert app.tile_plan(600, 800) == [(1.0, 0, 0, 600, 800)]
+
+
+def test_pyramid_halves_until_one_tile(app):
+    tiles = app.tile_plan(3000, 4000, tile_size=1024, overlap=256)
+    scales = sorted({tile[0] for tile in tiles}, reverse=True)
+    assert scales == [1.0, 0.5, 0.25]
+    assert [tile for tile in tiles if tile[0] == 0.25] == [(0.25, 0, 0, 750, 1000)]
+    for scale, top, left, bottom, right in tiles:
+        assert bottom - top <= 1024 and right - left <= 1024
+        assert bottom <= int(3000 * scale) and right <= int(4000 * scale)
+
+
+def test_faces_up_to_the_overlap_lie_inside_one_tile(app):
+    height, width, overlap = 3000, 4000, 256
+    full = [tile for tile in app.tile_plan(height, width, overlap=overlap) if tile[0] == 1.0]
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        size = int(rng.integers(10, overlap + 1))
+        top, left = int(rng.integers(0, height - size)), int(rng.integers(0, width - size))
+        assert any(t <= top and l <= left and top + size <= b and left + size <= r
+                   for _, t, l, b, r in full)
+
+
+def test_nms_keeps_best_of_overlapping_boxes(app):
+    boxes = [(0, 100, 100, 0), (5, 105, 105, 5), (300, 400, 400, 300)]
+    assert app.non_max_suppression(boxes, [0.5, 0.9, 0.7]) == [1, 2]
+
+
+def test_nms_drops_box_contained_in_a_better_one(app):
+    # The same face found whole at a coarse level and as a tight box at full resolution
+    boxes = [(0, 120, 120, 0), (30, 90, 90, 30)]
+    assert app.box_iou(boxes[0], boxes[1]) < 0.4
+    assert app.non_max_suppression(boxes, [0.9, 0.8]) == [0]
+    assert app.non_max_suppression(boxes, [0.9, 0.8], containment=1.1) == [0, 1]
+
+
+def test_nms_keeps_neighbours(app):
+    boxes = [(0, 100, 100, 0), (0, 190, 100, 90)]
+    assert sorted(app.non_max_suppression(boxes, [0.9, 0.8])) == [0, 1]